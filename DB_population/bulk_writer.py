@@ -0,0 +1,199 @@
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from bson.objectid import ObjectId
+import threading
+import time
+
+
+def load_ingested_urls(collection_metadados):
+    """
+    Loads every already ingested URL with a single projected query.
+
+    Args:
+        collection_metadados: MongoDB 'metadados' collection.
+
+    Returns:
+        dict: Url -> stored metadata fields ('Data_ultima_modificacao', 'db_ID', 'content_hash').
+    """
+    try:
+        cursor = collection_metadados.find(
+            {},
+            {"_id": 0, "Url": 1, "Data_ultima_modificacao": 1, "db_ID": 1, "content_hash": 1}
+        )
+        ingested = {}
+        for doc in cursor:
+            url = doc.pop("Url", None)
+            if url:
+                ingested[url] = doc
+        print(f"Loaded {len(ingested)} already ingested URLs.")
+        return ingested
+    except Exception as e:
+        print(f"Error loading ingested URLs: {e}")
+        return {}
+
+
+class BulkPageWriter:
+    """
+    Buffers parsed pages and writes them to 'dados' and 'metadados' in unordered bulk batches.
+
+    The 'dados' _id is generated client side so the matching 'metadados' entry can reference
+    it before either document reaches the database. A batch is flushed when `batch_size`
+    pages are buffered or when `flush_interval` seconds passed since the last flush.
+
+    After each flush `on_flush(written, failed)` is called with the Urls whose writes succeeded
+    and a {Url: error} dict of those that did not, so a caller only records a page as done once
+    it is in the database. Pages queued by `store_page` that failed are also taken back out of
+    `ingested_urls`, so fetching them again stores them again.
+
+    USAGE:
+    with BulkPageWriter(collection_dados, collection_metadados) as writer:
+        writer.add_page(result_data, result_metadata)
+    """
+
+    def __init__(self, collection_dados, collection_metadados, batch_size=100, flush_interval=30, on_flush=None):
+        self.collection_dados = collection_dados
+        self.collection_metadados = collection_metadados
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        # One (Url, 'dados' operation or None, 'metadados' operation) per queued page
+        self._pages = []
+        # Url -> (ingested_urls, its entry before `store_page` replaced it, None when it was new)
+        self._previous = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add_page(self, result_data, result_metadata):
+        data_object_id = result_data.setdefault("_id", ObjectId())
+        result_metadata["db_ID"] = data_object_id
+
+        with self._lock:
+            self._pages.append((result_metadata.get("Url"), InsertOne(result_data), InsertOne(result_metadata)))
+
+        self._flush_if_due()
+        return data_object_id
+
+    def upsert_page(self, data_object_id, result_data, result_metadata):
+        """
+        Queues an update of an already ingested page, inserting it if it disappeared meanwhile.
+        The original 'db_insertion_date' is preserved.
+        """
+        if data_object_id is None:
+            return self.add_page(result_data, result_metadata)
+
+        result_metadata["db_ID"] = data_object_id
+        data_insertion_date = result_data.pop("db_insertion_date", None)
+        metadata_insertion_date = result_metadata.pop("db_insertion_date", None)
+
+        with self._lock:
+            self._pages.append((
+                result_metadata["Url"],
+                UpdateOne(
+                    {"_id": data_object_id},
+                    {"$set": result_data, "$setOnInsert": {"db_insertion_date": data_insertion_date}},
+                    upsert=True
+                ),
+                UpdateOne(
+                    {"Url": result_metadata["Url"]},
+                    {"$set": result_metadata, "$setOnInsert": {"db_insertion_date": metadata_insertion_date}},
+                    upsert=True
+                )
+            ))
+
+        self._flush_if_due()
+        return data_object_id
+
+    def touch_page(self, url, date):
+        """Records a new sitemap 'lastmod' for a page whose content did not change."""
+        with self._lock:
+            self._pages.append((url, None, UpdateOne({"Url": url}, {"$set": {"Data_ultima_modificacao": date}})))
+
+        self._flush_if_due()
+
+    def store_page(self, url, date, result_data, result_metadata, ingested_urls):
+        """
+        Queues a parsed page as an insert, an upsert or a date-only update, depending on what is
+        already stored for its Url, and updates `ingested_urls` accordingly.
+
+        Returns:
+            str: 'stored' or 'unchanged'.
+        """
+        content_hash = result_metadata.get("content_hash")
+        stored = ingested_urls.get(url)
+        with self._lock:
+            self._previous.setdefault(url, (ingested_urls, stored))
+
+        if stored is None:
+            data_object_id = self.add_page(result_data, result_metadata)
+        elif stored.get("content_hash") == content_hash:
+            # Only the sitemap date moved, so the documents are left untouched
+            self.touch_page(url, date)
+            ingested_urls[url] = dict(stored, Data_ultima_modificacao=date)
+            return "unchanged"
+        else:
+            data_object_id = self.upsert_page(stored.get("db_ID"), result_data, result_metadata)
+
+        ingested_urls[url] = {"Data_ultima_modificacao": date, "db_ID": data_object_id, "content_hash": content_hash}
+        return "stored"
+
+    def _flush_if_due(self):
+        with self._lock:
+            pending = len(self._pages)
+            due = pending >= self.batch_size or (
+                pending and time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def _write(self, collection, operations, name):
+        """Returns {position: error} for the operations that failed."""
+        if not operations:
+            return {}
+        try:
+            collection.bulk_write(operations, ordered=False)
+            return {}
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            print(f"Error writing {len(errors)} of {len(operations)} documents into '{name}' collection: {errors[:1]}")
+            return {error["index"]: error.get("errmsg", "Write error") for error in errors}
+        except Exception as e:
+            print(f"Error writing batch into '{name}' collection: {e}")
+            return {position: str(e) for position in range(len(operations))}
+
+    def flush(self):
+        with self._lock:
+            pages, self._pages = self._pages, []
+            previous, self._previous = self._previous, {}
+            self._last_flush = time.monotonic()
+        if not pages:
+            return
+
+        # 'dados' first, so a metadados entry never points to a missing document
+        failed = {}
+        dados_pages = [page for page in pages if page[1] is not None]
+        for position, error in self._write(self.collection_dados, [page[1] for page in dados_pages], "dados").items():
+            failed[dados_pages[position][0]] = error
+        metadados_pages = [page for page in pages if page[0] not in failed]
+        for position, error in self._write(self.collection_metadados, [page[2] for page in metadados_pages], "metadados").items():
+            failed[metadados_pages[position][0]] = error
+
+        for url in failed:
+            if url in previous:
+                ingested_urls, stored = previous[url]
+                if stored is None:
+                    ingested_urls.pop(url, None)
+                else:
+                    ingested_urls[url] = stored
+        written = [url for url in dict.fromkeys(page[0] for page in pages) if url not in failed]
+        print(f"Flushed {len(written)} pages to the database" + (f", {len(failed)} failed." if failed else "."))
+        if self.on_flush is not None:
+            self.on_flush(written, failed)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
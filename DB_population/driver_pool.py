@@ -0,0 +1,140 @@
+from selenium import webdriver
+from selenium.webdriver.edge.service import Service
+from selenium.webdriver.edge.options import Options
+from webdriver_manager.microsoft import EdgeChromiumDriverManager
+from contextlib import contextmanager
+import threading
+import queue
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path():
+    """
+    Resolves the Edge driver binary once per process.
+
+    `EdgeChromiumDriverManager().install()` probes the installed browser version and may
+    download a new binary, so it is only called the first time a driver is needed.
+
+    Returns:
+        str: Path to the msedgedriver executable.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = EdgeChromiumDriverManager().install()
+            print(f"[DriverPool] Using Edge driver at {_driver_path}")
+        return _driver_path
+
+
+def create_edge_driver(headless=True):
+    edge_options = Options()
+    if headless:
+        edge_options.add_argument("--headless")
+        edge_options.add_argument("--disable-gpu")
+    return webdriver.Edge(service=Service(get_driver_path()), options=edge_options)
+
+
+class DriverPool:
+    """
+    Bounded pool of long-lived headless Edge drivers.
+
+    Drivers are created lazily up to `size`, health-checked when borrowed and recycled
+    after `max_pages` page loads or whenever the caller reports a crash.
+
+    USAGE:
+    pool = DriverPool(size=2, max_pages=200)
+    with pool.driver() as driver:
+        driver.get(url)
+    pool.close()
+    """
+
+    def __init__(self, size=2, max_pages=200, headless=True):
+        self.size = size
+        self.max_pages = max_pages
+        self.headless = headless
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _create(self):
+        driver = create_edge_driver(headless=self.headless)
+        with self._lock:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"[DriverPool] Error quitting driver: {e}")
+
+    def _is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("DriverPool is closed.")
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+                if self._is_healthy(driver):
+                    return driver
+                print("[DriverPool] Discarding unresponsive driver.")
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, crashed=False):
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                pages = self._pages[id(driver)]
+
+            if crashed or self._closed or pages >= self.max_pages:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        crashed = False
+        try:
+            yield driver
+        except Exception:
+            crashed = not self._is_healthy(driver)
+            raise
+        finally:
+            self.release(driver, crashed=crashed)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
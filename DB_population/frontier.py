@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+
+class CrawlFrontier:
+    """
+    Persistent crawl frontier backed by a local SQLite file.
+
+    Every sitemap entry is stored with its state, number of attempts and last error, so an
+    interrupted crawl resumes where it stopped and failed URLs are retried with exponential
+    backoff until `max_attempts` is reached.
+
+    USAGE:
+    frontier = CrawlFrontier("./DB_population/frontier.sqlite3")
+    frontier.add_many(sitemap_data)
+    entry = frontier.claim()  # (lastmod, url) or None
+    frontier.mark_done(url)
+    """
+
+    def __init__(self, db_file="./DB_population/frontier.sqlite3", max_attempts=5, base_backoff=30, max_backoff=3600):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                lastmod TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier (state, next_attempt_at)")
+        self._conn.commit()
+
+    def reset_in_progress(self):
+        """URLs left in progress by a crashed run are made available again."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE frontier SET state = ?, updated_at = ? WHERE state = ?",
+                (PENDING, time.time(), IN_PROGRESS)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            print(f"[Frontier] Resuming {cursor.rowcount} URLs left in progress.")
+
+    def add_many(self, entries):
+        """
+        Adds (lastmod, url) entries. Known URLs are only queued again when their lastmod changed.
+
+        Returns:
+            int: Number of entries received.
+        """
+        now = time.time()
+        rows = [(url, lastmod, PENDING, now) for lastmod, url in entries]
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO frontier (url, lastmod, state, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    lastmod = excluded.lastmod,
+                    state = excluded.state,
+                    attempts = 0,
+                    last_error = NULL,
+                    next_attempt_at = 0,
+                    updated_at = excluded.updated_at
+                WHERE frontier.lastmod IS NOT excluded.lastmod
+            """, rows)
+            self._conn.commit()
+        return len(rows)
+
+    def claim(self):
+        """Marks the next due URL as in progress and returns it as (lastmod, url), or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, lastmod FROM frontier WHERE state = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (PENDING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?",
+                (IN_PROGRESS, now, row[0])
+            )
+            self._conn.commit()
+        return row[1], row[0]
+
+    def seconds_until_next(self):
+        """Seconds until a pending URL becomes due, or None when nothing is left to retry."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM frontier WHERE state = ?", (PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def has_unfinished(self):
+        """Whether any URL is still pending or in progress, and so may yet need a (re)try."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM frontier WHERE state IN (?, ?) LIMIT 1", (PENDING, IN_PROGRESS)
+            ).fetchone()
+        return row is not None
+
+    def mark_done(self, url):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE frontier SET state = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+                (DONE, time.time(), url)
+            )
+            self._conn.commit()
+
+    def mark_failed(self, url, error):
+        """Records the error and schedules a retry with exponential backoff."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM frontier WHERE url = ?", (url,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if attempts >= self.max_attempts:
+                state, next_attempt_at = FAILED, now
+            else:
+                state = PENDING
+                next_attempt_at = now + min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            self._conn.execute(
+                "UPDATE frontier SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ? WHERE url = ?",
+                (state, attempts, str(error)[:1000], next_attempt_at, now, url)
+            )
+            self._conn.commit()
+        return state
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
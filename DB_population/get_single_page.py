@@ -1,7 +1,4 @@
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service
-from selenium.webdriver.edge.options import Options
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
+from driver_pool import create_edge_driver
 import time
 
 def fetch_html_and_save(url, filename):
@@ -14,11 +11,8 @@ def fetch_html_and_save(url, filename):
     """
     driver = None  # Initialize the driver variable
     try:
-        # Set up Edge browser options
-        edge_options = Options()
-
-        # Initialize Selenium WebDriver with Edge
-        driver = webdriver.Edge(service=Service(EdgeChromiumDriverManager().install()), options=edge_options)
+        # Initialize Selenium WebDriver with Edge (driver binary is resolved once per process)
+        driver = create_edge_driver(headless=False)
         
         # Navigate to the URL
         driver.get(url)
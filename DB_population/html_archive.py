@@ -0,0 +1,100 @@
+import zstandard as zstd
+import threading
+import hashlib
+import sqlite3
+import time
+import os
+
+
+class HTMLArchive:
+    """
+    Content-addressed archive of fetched pages, compressed with zstd.
+
+    Each page is stored once under the SHA-256 of its HTML (objects/ab/abcdef....html.zst) and an
+    SQLite index maps (Url, lastmod) to that hash, so identical republished pages share storage.
+
+    USAGE:
+    archive = HTMLArchive("./DB_population/html_archive")
+    archive.put(url, lastmod, driver.page_source)
+    for url, lastmod, content_hash in archive.iter_entries():
+        html = archive.get(content_hash)
+    """
+
+    def __init__(self, root="./DB_population/html_archive", level=10):
+        self.root = root
+        self.level = level
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                lastmod TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (url, lastmod)
+            )
+        """)
+        self._conn.commit()
+
+    # zstd (de)compressors are not thread safe, so each thread keeps its own
+    def _compressor(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstd.ZstdCompressor(level=self.level)
+        return self._local.compressor
+
+    def _decompressor(self):
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstd.ZstdDecompressor()
+        return self._local.decompressor
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.root, "objects", content_hash[:2], f"{content_hash}.html.zst")
+
+    def put(self, url, lastmod, html):
+        """
+        Stores a fetched page.
+
+        Returns:
+            str: SHA-256 of the HTML, used as the object key.
+        """
+        raw = html.encode("utf-8")
+        content_hash = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(content_hash)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(self._compressor().compress(raw))
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, lastmod, content_hash, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, lastmod or "", content_hash, time.time())
+            )
+            self._conn.commit()
+        return content_hash
+
+    def get(self, content_hash):
+        with open(self._object_path(content_hash), "rb") as file:
+            return self._decompressor().decompress(file.read()).decode("utf-8")
+
+    def iter_entries(self, latest_only=True):
+        """Yields (url, lastmod, content_hash), by default only the most recent version of each Url."""
+        with self._lock:
+            if latest_only:
+                rows = self._conn.execute("""
+                    SELECT url, MAX(lastmod), content_hash FROM pages GROUP BY url ORDER BY url
+                """).fetchall()
+            else:
+                rows = self._conn.execute("SELECT url, lastmod, content_hash FROM pages ORDER BY url, lastmod").fetchall()
+        for url, lastmod, content_hash in rows:
+            yield url, lastmod, content_hash
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
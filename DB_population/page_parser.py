@@ -0,0 +1,144 @@
+from selenium.webdriver.common.by import By
+from bs4 import BeautifulSoup
+from datetime import datetime
+import hashlib
+import json
+
+
+def _element_text(element):
+    if element is None:
+        return None
+    return element.get_text("\n", strip=True)
+
+
+def compute_content_hash(result_data, result_metadata):
+    hashed_fields = {
+        'TipoLegislacao': result_data.get('TipoLegislacao'),
+        'FragmentoDiploma': result_data.get('FragmentoDiploma'),
+        'AlteracoesGlobais': result_data.get('AlteracoesGlobais'),
+        'Content': result_data.get('Content'),
+        'Modificacao': result_metadata.get('Modificacao'),
+        'ID': result_metadata.get('ID'),
+        'Titulo': result_metadata.get('Titulo'),
+        'Sumario': result_metadata.get('Sumario')
+    }
+    serialized = json.dumps(hashed_fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _build_documents(fields, url, date):
+    """Assembles the 'dados' and 'metadados' documents (without 'db_ID') from the extracted fields."""
+    current_date = datetime.now().isoformat()
+
+    result_data = {
+        'TipoLegislacao': fields['legislation_type'],
+        'FragmentoDiploma': fields['fragmento_diploma'],
+        'AlteracoesGlobais': fields['global_alterations'],
+        'Content': fields['content'],
+        'db_insertion_date' : current_date,
+        'db_modification_date' : current_date
+    }
+
+    result_metadata = {
+        # Also kept here so search filters do not need to join 'dados'
+        'TipoLegislacao': fields['legislation_type'],
+        'Data_ultima_modificacao': date,
+        'Modificacao' : fields['modificado'],
+        'Url': url,
+        'ID': fields['legislation_id'],
+        'Titulo': fields['title'],
+        'Sumario': fields['sumario'],
+        'db_insertion_date' : current_date,
+        'db_modification_date' : current_date
+    }
+
+    result_metadata['content_hash'] = compute_content_hash(result_data, result_metadata)
+    return result_data, result_metadata
+
+
+def _driver_text(driver, by, value):
+    try:
+        return driver.find_element(by, value).text.strip()
+    except Exception:
+        return None
+
+
+def parse_driver(driver, url, date):
+    """
+    Extracts the 'dados' and 'metadados' documents from the page open in a Selenium driver,
+    using the rendered text of each element. This is what the live crawler stores.
+
+    Returns:
+        tuple[dict, dict]: (result_data, result_metadata), without 'db_ID'.
+    """
+    title = _driver_text(driver, By.XPATH, '//h1')
+    if title is None:
+        try:
+            title = driver.title.replace(" | DR", "").strip()
+        except Exception:
+            title = None
+
+    try:
+        legislation_type = json.loads(driver.find_element(By.XPATH, '//script[@type="application/ld+json"]').get_attribute('innerHTML')).get('legislationType', '')
+    except Exception:
+        legislation_type = None
+
+    try:
+        global_alterations = " ".join([elem.text.strip() for elem in driver.find_elements(By.XPATH, '//*[starts-with(@id, "b21-b6-")]')])
+    except Exception:
+        global_alterations = None
+
+    return _build_documents({
+        'title': title,
+        'legislation_id': _driver_text(driver, By.ID, "ConteudoTitle"),
+        'legislation_type': legislation_type,
+        'modificado': _driver_text(driver, By.ID, "Modificado"),
+        'sumario': _driver_text(driver, By.ID, "b21-b1-InjectHTMLWrapper"),
+        'fragmento_diploma': _driver_text(driver, By.ID, "b21-b4-InjectHTMLWrapper"),
+        'global_alterations': global_alterations,
+        'content': _driver_text(driver, By.ID, "$b3")
+    }, url, date)
+
+
+def parse_page(html, url, date):
+    """
+    Extracts the 'dados' and 'metadados' documents from archived page HTML, with the selectors
+    of `parse_driver`. Used by the offline re-parse of the HTML archive; text is taken from the
+    HTML rather than rendered, so whitespace and hidden elements can differ from the live crawl.
+
+    Args:
+        html (str): Rendered page HTML.
+        url (str): Page URL.
+        date (str): Sitemap 'lastmod' of the page.
+
+    Returns:
+        tuple[dict, dict]: (result_data, result_metadata), without 'db_ID'.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = _element_text(soup.find("h1"))
+    if not title and soup.title is not None:
+        title = soup.title.get_text().replace(" | DR", "").strip()
+
+    legislation_type = None
+    ld_json = soup.find("script", attrs={"type": "application/ld+json"})
+    if ld_json is not None:
+        try:
+            legislation_type = json.loads(ld_json.string or "").get('legislationType', '')
+        except (ValueError, AttributeError):
+            legislation_type = None
+
+    global_alterations = " ".join(
+        _element_text(elem) for elem in soup.find_all(id=lambda value: value and value.startswith("b21-b6-"))
+    )
+
+    return _build_documents({
+        'title': title,
+        'legislation_id': _element_text(soup.find(id="ConteudoTitle")),
+        'legislation_type': legislation_type,
+        'modificado': _element_text(soup.find(id="Modificado")),
+        'sumario': _element_text(soup.find(id="b21-b1-InjectHTMLWrapper")),
+        'fragmento_diploma': _element_text(soup.find(id="b21-b4-InjectHTMLWrapper")),
+        'global_alterations': global_alterations,
+        'content': _element_text(soup.find(id="$b3"))
+    }, url, date)
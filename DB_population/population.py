@@ -1,178 +1,219 @@
-import xml.etree.ElementTree as ET
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service
-from selenium.webdriver.edge.options import Options
-from selenium.webdriver.common.by import By
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
+import threading
 import time
-import json
+import sys
+import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
 from ..utils.mongo_conn import connect_to_mongo
+from ..utils.mongo_indexes import ensure_indexes
+from .driver_pool import DriverPool, create_edge_driver
+from .bulk_writer import BulkPageWriter, load_ingested_urls
+from .frontier import CrawlFrontier
+from .rate_limiter import AdaptiveRateLimiter
+from .html_archive import HTMLArchive
+from .page_parser import parse_driver
+from .sitemap_stream import iter_sitemap_entries, DR_SITEMAP_SERIES
+
+# Error pages served instead of the legislation when the site is overloaded
+THROTTLING_PATTERN = re.compile(r"^\s*(429|5\d\d)\b|too many requests|service unavailable|bad gateway|gateway time-?out|internal server error")
 
 def parse_sitemap(url):
-    try:
-        print(f"Fetching sitemap from {url}...")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        root = ET.fromstring(response.content)
-        ns = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-
-        sitemap_data = [
-            (url_element.find('ns:lastmod', ns).text, url_element.find('ns:loc', ns).text)
-            for url_element in root.findall('ns:url', ns)
-            if url_element.find('ns:lastmod', ns) is not None and url_element.find('ns:loc', ns) is not None
-        ]
-
-        print(f"Parsed {len(sitemap_data)} URLs from the sitemap.")
-        return sitemap_data
-    except (requests.RequestException, ET.ParseError) as e:
-        print(f"Error: {e}")
-        return []
+    """Parses a single sitemap (or sitemap index) into a list of (lastmod, loc) entries."""
+    sitemap_data = list(iter_sitemap_entries(sitemap_urls=[url]))
+    print(f"Parsed {len(sitemap_data)} URLs from the sitemap.")
+    return sitemap_data
 
 def setup_selenium_driver():
-    edge_options = Options()
-    edge_options.add_argument("--headless")
-    edge_options.add_argument("--disable-gpu")
-    driver = webdriver.Edge(service=Service(EdgeChromiumDriverManager().install()), options=edge_options)
-    return driver
-
-def insert_metadata(collection_metadados, result):
-    try:
-        collection_metadados.insert_one(result)
-    except Exception as e:
-        print(f"Error inserting metadata into 'metadados' collection: {e}")
-
-def insert_data(collection_dados, result):
+    return create_edge_driver(headless=True)
+
+def needs_refresh(date, url, ingested_urls, incremental=False):
+    """
+    Whether a sitemap entry has to be fetched.
+
+    New URLs are always fetched. Already ingested URLs are only fetched again in incremental
+    mode, when the sitemap 'lastmod' differs from the stored 'Data_ultima_modificacao'.
+    """
+    stored = ingested_urls.get(url)
+    if stored is None:
+        return True
+    return incremental and stored.get('Data_ultima_modificacao') != date
+
+def is_throttled(driver):
+    """Selenium does not expose HTTP status codes, so overload is detected from the error page title."""
     try:
-        result_data = collection_dados.insert_one(result)
-        return result_data.inserted_id
-    except Exception as e:
-        print(f"Error inserting data into 'dados' collection: {e}")
-        return None
-
-def process_data(driver, date, url, collection_dados, collection_metadados):
+        page_title = (driver.title or "").lower()
+    except Exception:
+        return False
+    return THROTTLING_PATTERN.search(page_title) is not None
+
+def process_data(driver, date, url, writer, ingested_urls, incremental=False, archive=None):
+    """
+    Fetches a page, stores its HTML in `archive` (when given) and queues its documents in `writer`.
+
+    Returns:
+        str: 'skipped', 'unchanged', 'stored' or 'throttled'. Other failures are raised.
+    """
     print(f"Fetching and processing URL: {url}...")
     try:
-        # Check if the URL was already processed
-        existing_metadata = collection_metadados.find_one({'Url': url})
-        if existing_metadata:
+        # Check if the URL was already processed (and, in incremental mode, is unchanged)
+        if not needs_refresh(date, url, ingested_urls, incremental):
             print(f"-> SKIPPING {url}")
-            return
+            return 'skipped'
 
         driver.get(url)
         time.sleep(3)
 
-        legislation_id, legislation_type, modificado =  None,  None, None
+        if is_throttled(driver):
+            print(f"-> THROTTLED {url}")
+            return 'throttled'
 
-        try:
-            title = driver.find_element(By.XPATH, '//h1').text.strip()
-        except Exception:
-            try:
-                page_title = driver.title
-                title = page_title.replace(" | DR", "").strip()
-            except:
-                title = None
-                
-        try:
-            legislation_id = driver.find_element(By.ID, "ConteudoTitle").text.strip()
-        except:
-            legislation_id = None
+        if archive is not None:
+            archive.put(url, date, driver.page_source)
 
-        try:
-            legislation_type = json.loads(driver.find_element(By.XPATH, '//script[@type="application/ld+json"]').get_attribute('innerHTML')).get('legislationType', '')
-        except:
-            legislation_type = None
-        
-        try:
-            modificado = driver.find_element(By.ID, "Modificado").text.strip()
-        except:
-            modificado = None
-        
-       # Optional fields with fallback
-        try:
-            sumario = driver.find_element(By.ID, "b21-b1-InjectHTMLWrapper").text.strip()
-        except Exception:
-            sumario = None
+        # Rendered element text, as before the archive existed, so content hashes stay stable
+        result_data, result_metadata = parse_driver(driver, url, date)
 
-        try:
-            fragmento_diploma = driver.find_element(By.ID, "b21-b4-InjectHTMLWrapper").text.strip()
-        except Exception:
-            fragmento_diploma = None
-
-        try:
-            global_alterations = " ".join([elem.text.strip() for elem in driver.find_elements(By.XPATH, '//*[starts-with(@id, "b21-b6-")]')])
-        except Exception:
-            global_alterations = None
-
-        try:
-            b3_content = driver.find_element(By.ID, "$b3").text.strip()
-        except Exception:
-            b3_content = None
-
-
-        current_date = datetime.now().isoformat()
-
-        result_data = {
-            'TipoLegislacao': legislation_type,
-            'FragmentoDiploma': fragmento_diploma,
-            'AlteracoesGlobais': global_alterations,
-            'Content': b3_content,
-            'db_insertion_date' : current_date,
-            'db_modification_date' : current_date
-        }
-
-        data_object_id = insert_data(collection_dados, result_data)
-
-        result_metadata = {
-            'db_ID': data_object_id,
-            'Data_ultima_modificacao': date,
-            'Modificacao' : modificado,
-            'Url': url,
-            'ID': legislation_id,
-            'Titulo': title,
-            'Sumario': sumario,
-            'db_insertion_date' : current_date,
-            'db_modification_date' : current_date
-        }
-
-        insert_metadata(collection_metadados, result_metadata)
+        if writer.store_page(url, date, result_data, result_metadata, ingested_urls) == 'unchanged':
+            print(f"-> UNCHANGED {url}")
+            return 'unchanged'
 
         print(f"Successfully processed URL: {url}")
+        return 'stored'
     except Exception as e:
         print(f"Error processing {url}: {e}")
+        raise
+
+def seed_frontier(frontier, sitemap_entries, ingested_urls, incremental=False, chunk_size=1000):
+    """Adds sitemap entries to the frontier in chunks, as they are parsed."""
+    chunk, n_entries, n_skipped = [], 0, 0
+    for date, url in sitemap_entries:
+        n_entries += 1
+        if not needs_refresh(date, url, ingested_urls, incremental):
+            n_skipped += 1
+            continue
+        chunk.append((date, url))
+        if len(chunk) >= chunk_size:
+            frontier.add_many(chunk)
+            chunk = []
+    if chunk:
+        frontier.add_many(chunk)
+    print(f"-> SKIPPING {n_skipped} of {n_entries} sitemap URLs already ingested")
+
+def crawl_worker(frontier, rate_limiter, driver_pool, writer, ingested_urls, incremental=False, archive=None, seeding_done=None):
+    """
+    Claims URLs from the frontier until the sitemaps are exhausted and nothing is left to fetch or retry.
+
+    Stored pages stay in progress until `writer` flushes them (see `frontier_flush_callback`), so
+    an interrupted run fetches again every page that had not reached the database.
+    """
+    while True:
+        # Read before claiming, so entries added right before seeding ended are still claimed
+        seeded = seeding_done is None or seeding_done.is_set()
+        entry = frontier.claim()
+        if entry is None:
+            # Pages still buffered would otherwise keep their URLs in progress indefinitely
+            writer.flush()
+            wait = frontier.seconds_until_next()
+            # URLs other workers hold in progress may still fail and be scheduled for a retry
+            if wait is None and seeded and not frontier.has_unfinished():
+                return
+            time.sleep(min(wait if wait is not None else 1, 5))
+            continue
+
+        date, url = entry
+        throttled = False
+        rate_limiter.acquire()
+        try:
+            with driver_pool.driver() as driver:
+                status = process_data(driver, date, url, writer, ingested_urls, incremental, archive)
+            if status == 'throttled':
+                throttled = True
+                frontier.mark_failed(url, "Throttled by the server")
+            elif status == 'skipped':
+                frontier.mark_done(url)
+        except Exception as e:
+            frontier.mark_failed(url, e)
+        finally:
+            rate_limiter.release(throttled=throttled)
+
+def frontier_flush_callback(frontier):
+    """`BulkPageWriter` callback that marks written URLs done and schedules failed ones for a retry."""
+    def on_flush(written, failed):
+        for url in written:
+            frontier.mark_done(url)
+        for url, error in failed.items():
+            frontier.mark_failed(url, error)
+    return on_flush
+
+def from_html_to_database_process(sitemap_data, collection_dados, collection_metadados, frontier_file="./DB_population/frontier.sqlite3",
+                                  max_concurrency=8, requests_per_second=1.0, max_pages_per_driver=200,
+                                  write_batch_size=100, write_flush_interval=30, incremental=False,
+                                  archive_dir="./DB_population/html_archive"):
+    """
+    Fetches the sitemap entries and stores them in 'dados' and 'metadados'.
+
+    `sitemap_data` may be a list or a generator such as `iter_sitemap_entries`; it is fed to the
+    frontier in a background thread, so crawling starts before every sitemap is parsed.
+
+    Progress is kept in a persistent frontier, so an interrupted run resumes and failed URLs are
+    retried with backoff. Requests are limited to `requests_per_second` overall, and concurrency
+    adapts between 1 and `max_concurrency` depending on server throttling.
+
+    With `incremental=True`, already ingested URLs whose sitemap 'lastmod' changed are fetched
+    again and upserted; pages whose content hash did not change only get their date updated.
+
+    Fetched pages are kept in a compressed HTML archive under `archive_dir` (None disables it),
+    which `reparse_archive` can turn back into documents without fetching anything.
+    """
+    print("Starting processing of URLs...")
+    ensure_indexes(collection_dados, collection_metadados)
+    ingested_urls = load_ingested_urls(collection_metadados)
+
+    frontier = CrawlFrontier(frontier_file)
+    frontier.reset_in_progress()
+    print(f"[Frontier] {frontier.stats()}")
+
+    seeding_done = threading.Event()
+
+    def seed():
+        try:
+            seed_frontier(frontier, sitemap_data, ingested_urls, incremental)
+        except Exception as e:
+            print(f"Sitemap seeding error: {e}")
+        finally:
+            seeding_done.set()
 
-def process_batch(batch, collection_dados, collection_metadados):
-    driver = setup_selenium_driver()
-    try:
-        for date, url in batch:
-            process_data(driver, date, url, collection_dados, collection_metadados)
-    finally:
-        driver.quit()
-
-def from_html_to_database_process(sitemap_data, collection_dados, collection_metadados, batch_size=5):
-    print("Starting batched processing of URLs...")
-    futures = []
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        for i in range(0, len(sitemap_data), batch_size):
-            batch = sitemap_data[i:i + batch_size]
-            futures.append(executor.submit(process_batch, batch, collection_dados, collection_metadados))
+    seeder = threading.Thread(target=seed, daemon=True)
+    seeder.start()
 
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Batch processing error: {e}")
+    rate_limiter = AdaptiveRateLimiter(rate=requests_per_second, max_concurrency=max_concurrency)
+    archive = HTMLArchive(archive_dir) if archive_dir else None
 
+    futures = []
+    with BulkPageWriter(collection_dados, collection_metadados, batch_size=write_batch_size, flush_interval=write_flush_interval,
+                        on_flush=frontier_flush_callback(frontier)) as writer, \
+            DriverPool(size=max_concurrency, max_pages=max_pages_per_driver) as driver_pool:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for _ in range(max_concurrency):
+                futures.append(executor.submit(crawl_worker, frontier, rate_limiter, driver_pool, writer, ingested_urls, incremental, archive, seeding_done))
+
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Crawl worker error: {e}")
+
+    seeder.join()
+    print(f"[Frontier] {frontier.stats()}")
+    frontier.close()
+    if archive is not None:
+        archive.close()
     print("Completed processing of all URLs.")
 
 # Main script
-sitemap_url = "https://files.diariodarepublica.pt/sitemap/legislacao-consolidada-sitemap-1.xml"
+incremental = "--incremental" in sys.argv  # daily refresh: only re-fetch pages whose lastmod changed
 client, db, collection_dados, collection_metadados = connect_to_mongo()
 
 if client:
     print("Starting the entire process...")
-    sitemap_data = parse_sitemap(sitemap_url)
-    from_html_to_database_process(sitemap_data, collection_dados, collection_metadados)
+    sitemap_data = iter_sitemap_entries(series_templates=[DR_SITEMAP_SERIES])
+    from_html_to_database_process(sitemap_data, collection_dados, collection_metadados, incremental=incremental)
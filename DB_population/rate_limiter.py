@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """
+    Global request rate limit combined with AIMD concurrency control.
+
+    `acquire` blocks until a concurrency slot is free and the token bucket allows another
+    request. Every `concurrency` successful requests raise the concurrency limit by one
+    (additive increase); a throttled response (429/5xx) halves it and pauses new requests
+    for `cooldown` seconds (multiplicative decrease).
+
+    USAGE:
+    limiter = AdaptiveRateLimiter(rate=2.0, max_concurrency=8)
+    limiter.acquire()
+    try:
+        ...
+    finally:
+        limiter.release(throttled=False)
+    """
+
+    def __init__(self, rate=1.0, burst=1, initial_concurrency=2, min_concurrency=1, max_concurrency=8,
+                 decrease_factor=0.5, cooldown=30):
+        self.rate = rate
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.concurrency = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self._active = 0
+        self._successes = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.concurrency:
+                self._condition.wait()
+            self._active += 1
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+                self._condition.wait(timeout=wait)
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._active -= 1
+            if throttled:
+                new_concurrency = max(self.min_concurrency, int(self.concurrency * self.decrease_factor))
+                if new_concurrency != self.concurrency:
+                    print(f"[RateLimiter] Throttled - concurrency {self.concurrency} -> {new_concurrency}")
+                self.concurrency = new_concurrency
+                self._successes = 0
+                self._paused_until = time.monotonic() + self.cooldown
+            else:
+                self._successes += 1
+                if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._condition.notify_all()
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+from utils.mongo_conn import connect_to_mongo
+from .bulk_writer import BulkPageWriter, load_ingested_urls
+from .html_archive import HTMLArchive
+from .page_parser import parse_page
+
+_worker_archive = None
+
+
+def _init_worker(archive_dir):
+    global _worker_archive
+    _worker_archive = HTMLArchive(archive_dir)
+
+
+def _parse_archived_page(entry):
+    url, lastmod, content_hash = entry
+    try:
+        html = _worker_archive.get(content_hash)
+        return url, lastmod, parse_page(html, url, lastmod), None
+    except Exception as e:
+        return url, lastmod, None, str(e)
+
+
+def iter_reparsed_pages(archive_dir, workers=None, chunksize=32):
+    """
+    Re-parses every archived page in a process pool, without any network access.
+
+    Yields:
+        tuple: (url, lastmod, (result_data, result_metadata) or None, error or None)
+    """
+    archive = HTMLArchive(archive_dir)
+    entries = list(archive.iter_entries())
+    archive.close()
+    print(f"Re-parsing {len(entries)} archived pages...")
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(archive_dir,)) as executor:
+        yield from executor.map(_parse_archived_page, entries, chunksize=chunksize)
+
+
+def reparse_to_database(archive_dir, collection_dados, collection_metadados, workers=None, write_batch_size=500):
+    """Re-parses the archive and upserts the results; pages whose content hash did not change are not rewritten."""
+    ingested_urls = load_ingested_urls(collection_metadados)
+    counts = {"stored": 0, "unchanged": 0, "errors": 0}
+
+    with BulkPageWriter(collection_dados, collection_metadados, batch_size=write_batch_size) as writer:
+        for url, lastmod, parsed, error in iter_reparsed_pages(archive_dir, workers):
+            if parsed is None:
+                print(f"Error re-parsing {url}: {error}")
+                counts["errors"] += 1
+                continue
+            result_data, result_metadata = parsed
+            counts[writer.store_page(url, lastmod, result_data, result_metadata, ingested_urls)] += 1
+
+    print(f"Completed re-parse: {counts}")
+    return counts
+
+
+def reparse_to_file(archive_dir, output_file, workers=None):
+    """Re-parses the archive into a JSON Lines file with one {'dados', 'metadados'} object per page."""
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    n_pages, n_errors = 0, 0
+    with open(output_file, "w", encoding="utf-8") as file:
+        for url, lastmod, parsed, error in iter_reparsed_pages(archive_dir, workers):
+            if parsed is None:
+                print(f"Error re-parsing {url}: {error}")
+                n_errors += 1
+                continue
+            result_data, result_metadata = parsed
+            file.write(json.dumps({"dados": result_data, "metadados": result_metadata}, ensure_ascii=False) + "\n")
+            n_pages += 1
+
+    print(f"Completed re-parse: {n_pages} pages written to {output_file}, {n_errors} errors.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-parse the archived Diário da República pages into 'dados'/'metadados'.")
+    parser.add_argument("--archive-dir", default="./DB_population/html_archive")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (defaults to all CPUs).")
+    parser.add_argument("--output", default=None, help="Write JSON Lines to this file instead of MongoDB.")
+    args = parser.parse_args()
+
+    if args.output:
+        reparse_to_file(args.archive_dir, args.output, args.workers)
+    else:
+        load_dotenv()
+        client, db, collection_dados, collection_metadados = connect_to_mongo(os.getenv("MONGO_USER"), os.getenv("MONGO_PASSWORD"))
+        if client:
+            reparse_to_database(args.archive_dir, collection_dados, collection_metadados, args.workers)
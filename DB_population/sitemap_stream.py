@@ -0,0 +1,146 @@
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import threading
+import queue
+import gzip
+import io
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+DR_SITEMAP_SERIES = "https://files.diariodarepublica.pt/sitemap/legislacao-consolidada-sitemap-{n}.xml"
+
+_DONE = object()
+
+
+def _open_stream(response):
+    """Returns a file object over the response body, transparently gunzipping .xml.gz sitemaps."""
+    response.raw.decode_content = True
+    # BufferedReader expects to see EOF itself, not a file closed underneath it by urllib3
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def iter_sitemap_document(stream):
+    """
+    Incrementally parses one sitemap or sitemap index, clearing elements as it goes.
+
+    Yields:
+        tuple: ('url', lastmod, loc) for page entries and ('sitemap', lastmod, loc) for index entries.
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end" or elem.tag not in (f"{SITEMAP_NS}url", f"{SITEMAP_NS}sitemap"):
+            continue
+
+        loc = elem.findtext(f"{SITEMAP_NS}loc")
+        lastmod = elem.findtext(f"{SITEMAP_NS}lastmod")
+        kind = "url" if elem.tag == f"{SITEMAP_NS}url" else "sitemap"
+        if loc:
+            yield kind, lastmod, loc.strip()
+        root.clear()
+
+
+def iter_sitemap_entries(sitemap_urls=(), series_templates=(), max_workers=4, timeout=(10, 60), max_buffered=10000):
+    """
+    Streams (lastmod, loc) entries from several sitemaps, fetched concurrently.
+
+    Sitemap index files are followed recursively. Each template in `series_templates` (with an
+    `{n}` placeholder) is read as a numbered series starting at 1, ending at the first missing
+    file. Entries without 'lastmod' are skipped, as in `parse_sitemap`. At most `max_buffered`
+    entries are held in memory, so parsing stays ahead of the consumer without growing unbounded.
+
+    USAGE:
+    for lastmod, url in iter_sitemap_entries(series_templates=[DR_SITEMAP_SERIES]):
+        ...
+    """
+    entries = queue.Queue(maxsize=max_buffered)
+    stopped = threading.Event()
+    # Starts at 1 so the stream cannot end while the initial sitemaps are still being submitted
+    pending_tasks = [1]
+    lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                entries.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def task_finished():
+        with lock:
+            pending_tasks[0] -= 1
+            finished = pending_tasks[0] == 0
+        if finished:
+            put(_DONE)
+
+    def submit(task, *args):
+        if stopped.is_set():
+            return
+        with lock:
+            pending_tasks[0] += 1
+        try:
+            executor.submit(run, task, *args)
+        except RuntimeError:
+            # The consumer closed the stream while this sitemap was being parsed
+            task_finished()
+
+    def run(task, *args):
+        try:
+            task(*args)
+        except Exception as e:
+            print(f"[Sitemap] Error: {e}")
+        finally:
+            task_finished()
+
+    def parse(url, response=None):
+        if response is None:
+            response = requests.get(url, timeout=timeout, stream=True)
+            response.raise_for_status()
+        print(f"Fetching sitemap from {url}...")
+        n_urls = 0
+        with response:
+            for kind, lastmod, loc in iter_sitemap_document(_open_stream(response)):
+                if kind == "sitemap":
+                    submit(parse, loc)
+                elif lastmod:
+                    if not put((lastmod, loc)):
+                        return
+                    n_urls += 1
+        print(f"Parsed {n_urls} URLs from {url}.")
+
+    def parse_series(template, n):
+        url = template.format(n=n)
+        response = requests.get(url, timeout=timeout, stream=True)
+        if response.status_code == 404:
+            response.close()
+            print(f"[Sitemap] Series ended before {url}.")
+            return
+        response.raise_for_status()
+        # Start downloading the next file of the series while this one is parsed
+        submit(parse_series, template, n + 1)
+        parse(url, response)
+
+    try:
+        for url in sitemap_urls:
+            submit(parse, url)
+        for template in series_templates:
+            submit(parse_series, template, 1)
+        task_finished()
+
+        while True:
+            entry = entries.get()
+            if entry is _DONE:
+                break
+            yield entry
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
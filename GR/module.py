@@ -1,5 +1,8 @@
 from utils.json_file_handler import JSONFileHandler
 from utils.mongo_conn import connect_to_mongo
+from utils.metrics import stage_timer
+from utils.request_profiler import profiled
+from utils.retriever.near_duplicates import drop_near_duplicate_texts
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 from dotenv import load_dotenv
@@ -29,26 +32,34 @@ class GRSystem:
         self.client, self.db, self.collection_dados, self.collection_metadados = self._connect_to_db()
         docs = []
 
-        for doc_id in self.list_doc_ids:
-            try:
-                object_id = ObjectId(doc_id)
-                result = self.collection_dados.find_one({"_id": object_id})
-                if result:
-                    content = result.get("Content")
-                    if content:
-                        docs.append(content)
+        with stage_timer("GR", "content_fetch"):
+            for doc_id in dict.fromkeys(self.list_doc_ids):
+                try:
+                    object_id = ObjectId(doc_id)
+                    result = self.collection_dados.find_one({"_id": object_id})
+                    if result:
+                        content = result.get("Content")
+                        if content:
+                            docs.append(content)
+                        else:
+                            print(f"[WARN] Document found but no 'Content' field in ID: {doc_id}")
                     else:
-                        print(f"[WARN] Document found but no 'Content' field in ID: {doc_id}")
-                else:
-                    print(f"[WARN] No document found for ID: {doc_id}")
-            except InvalidId:
-                print(f"[ERROR] Invalid ObjectId: {doc_id}")
-            except Exception as e:
-                print(f"[ERROR] Unexpected error for ID {doc_id}: {e}")
-
-        handler = JSONFileHandler("./GR/results/docs")
-        handler.delete_results()
-        handler.save_results(docs)
+                        print(f"[WARN] No document found for ID: {doc_id}")
+                except InvalidId:
+                    print(f"[ERROR] Invalid ObjectId: {doc_id}")
+                except Exception as e:
+                    print(f"[ERROR] Unexpected error for ID {doc_id}: {e}")
+
+        # Republished versions of a text add nothing but tokens to the LLM context
+        kept = drop_near_duplicate_texts(docs)
+        if len(kept) < len(docs):
+            print(f"[GR] Dropped {len(docs) - len(kept)} near-duplicate documents.")
+            docs = [docs[i] for i in kept]
+
+        with stage_timer("GR", "json_dump"):
+            handler = JSONFileHandler("./GR/results/docs")
+            handler.delete_results()
+            handler.save_results(docs)
         return docs
 
 
@@ -119,6 +130,7 @@ Estruture a resposta de forma clara, utilizando:
             return f"Error: {response.status_code} - {response.text}"
 
 
+    @profiled("GRSystem.get_summaries")
     def get_summaries(self, user_query):
         print("[GR] Preparing LLM response...")
 
@@ -154,7 +166,8 @@ Cumpre estas regras:
             "stream": False
         }
 
-        response = requests.post(self.LLM_url, json=data, headers=headers)
+        with stage_timer("GR", "llm_call"):
+            response = requests.post(self.LLM_url, json=data, headers=headers)
 
         if response.status_code == 200:
             return response.json()["choices"][0]["message"]["content"].strip()
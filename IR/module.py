@@ -3,12 +3,24 @@ from utils.retriever.retriever_word2vec import Word2VecRetriever
 from utils.retriever.retriever_tfidf import TfidfRetriever
 from utils.retriever.retriever_bm25 import BM25Retriever
 from utils.retriever.retriever_wiki_word2vec import WikiWord2VecRetriever
+from utils.retriever.retriever_passage import PassageRetriever
+from utils.retriever.metadata_index import MetadataBitmapIndex
+from utils.retriever.sharded_retrieval import get_shard_pool, IR_SHARDS, RESULT_FILES
+from utils.retriever.near_duplicates import refresh_near_duplicate_index, NEAR_DUPLICATE_THRESHOLD
+from utils.retriever.suggest_index import refresh_suggest_index
+from utils.retriever.spell_correction import get_spell_index, refresh_spell_index, SPELL_MAX_DISTANCE
 from utils.mongo_conn import connect_to_mongo
+from utils.mongo_indexes import ensure_indexes_once
 from utils.retriever.process_queries import preprocess_query
 from utils.IR_direct_querying.IR_mongo_query import mongo_text_search
 from utils.IR_direct_querying.IR_elastic_query import elastic_query_search
+from utils.metrics import stage_timer, MODEL_LOAD_SECONDS, CORPUS_DOCUMENTS
+from utils.request_profiler import profiled
+from pymongo import UpdateOne
 from dotenv import load_dotenv
 from enum import Enum
+import numpy as np
+import time
 import os
 
 from utils.json_file_handler import JSONFileHandler
@@ -18,6 +30,8 @@ from flask_sse import sse
 class IRSystem:
     def __init__(self):
         self.client, self.db, self.collection_dados, self.collection_metadados = self._connect_to_db()
+        if self.client:
+            ensure_indexes_once(self.collection_dados, self.collection_metadados)
         self.documents = self._prep_model()
         self.output_directory = "IR_analysis/parl_europeu" #IR/results
 
@@ -28,11 +42,38 @@ class IRSystem:
 
     def _fetch_documents(self):
         try:
-            return list(self.collection_metadados.find({}, {"_id": 1, "db_ID": 1, "Titulo": 1, "Sumario": 1}))
+            projection = {"_id": 1, "db_ID": 1, "Titulo": 1, "Sumario": 1, "Tema": 1,
+                          "TipoLegislacao": 1, "Modificacao": 1, "Data_ultima_modificacao": 1, "content_hash": 1}
+            documents = list(self.collection_metadados.find({}, projection))
+            self._fill_legislation_types(documents)
+            return documents
         except Exception as e:
             print(f"Error fetching documents: {e}")
             return []
 
+    def _fill_legislation_types(self, documents, batch_size=10000):
+        """
+        'TipoLegislacao' used to be stored in 'dados' only; it is looked up there for documents that
+        lack it and written back to 'metadados' (null when 'dados' has none either), so each
+        document is looked up once rather than on every request.
+        """
+        missing = [doc for doc in documents if "TipoLegislacao" not in doc and doc.get("db_ID") is not None]
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            types = {
+                data["_id"]: data.get("TipoLegislacao")
+                for data in self.collection_dados.find({"_id": {"$in": [doc["db_ID"] for doc in batch]}}, {"TipoLegislacao": 1})
+            }
+            for doc in batch:
+                doc["TipoLegislacao"] = types.get(doc["db_ID"])
+            try:
+                self.collection_metadados.bulk_write(
+                    [UpdateOne({"_id": doc["_id"]}, {"$set": {"TipoLegislacao": doc["TipoLegislacao"]}}) for doc in batch],
+                    ordered=False
+                )
+            except Exception as e:
+                print(f"[IR] Error storing 'TipoLegislacao': {e}")
+
     def _preprocess_documents(self, documents):
         processed_docs = []
         for doc in documents:
@@ -40,13 +81,46 @@ class IRSystem:
             processed_docs.append({
                 "id": str(doc["_id"]),
                 "db_ID": str(doc["db_ID"]),
-                "search_content": searchable_content
+                "search_content": searchable_content,
+                "Tema": doc.get("Tema"),
+                "TipoLegislacao": doc.get("TipoLegislacao"),
+                # Changes when the page is re-crawled with new content under the same _id
+                "content_hash": doc.get("content_hash")
             })
         return processed_docs
 
     def _prep_model(self):
-        raw_documents = self._fetch_documents()
-        return self._preprocess_documents(raw_documents)
+        with stage_timer("IR", "corpus_fetch"):
+            raw_documents = self._fetch_documents()
+        documents = self._preprocess_documents(raw_documents)
+        self.metadata_index = MetadataBitmapIndex(raw_documents)
+        self._cluster_near_duplicates(documents)
+        with stage_timer("IR", "suggest_index"):
+            refresh_suggest_index(raw_documents)
+        if SPELL_MAX_DISTANCE:
+            with stage_timer("IR", "spell_index"):
+                refresh_spell_index(documents)
+        CORPUS_DOCUMENTS.set(len(documents))
+        return documents
+
+    def _cluster_near_duplicates(self, documents):
+        """Retrievers index one representative per cluster of near-duplicate documents (self.index_documents)."""
+        self.near_duplicates = None
+        self.index_documents = documents
+        if not NEAR_DUPLICATE_THRESHOLD:
+            return
+        with stage_timer("IR", "near_duplicates"):
+            self.near_duplicates = refresh_near_duplicate_index(documents, self.collection_dados)
+        self.index_documents = self.near_duplicates.representatives(documents)
+        self._representative_rows = self.near_duplicates.representative_rows(documents)
+
+    def _cluster_mask(self, mask):
+        """A representative passes the filters when any document of its cluster does."""
+        if mask is None or self.index_documents is self.documents:
+            return mask
+        cluster_mask = np.zeros(len(mask), dtype=bool)
+        np.logical_or.at(cluster_mask, self._representative_rows, mask)
+        return cluster_mask
 
     def _init_retrievers(self, user_models):
         self.n_models = len(user_models)
@@ -61,7 +135,10 @@ class IRSystem:
 
         for model_type in user_models:
             retriever_class = model_to_retriever.get(model_type)
-            if retriever_class:
+            if model_type == ModelType.PASSAGE:
+                # Passages are split from the full 'Content' in 'dados'
+                retrievers[model_type] = PassageRetriever(self.collection_dados)
+            elif retriever_class:
                 retrievers[model_type] = retriever_class()
             else:
                 print(f"Invalid model: {model_type}. Skipping...")
@@ -70,52 +147,110 @@ class IRSystem:
 
     def _retrieve_or_create_models(self, retrievers):
         for model_type, retriever in retrievers.items():
-
-            retriever.load_model()
-            
-            if retriever.model is None:
-                print(f"Building model for {model_type}...")
-                retriever.build_model(self.documents)
-                retriever.save_model()
+            start = time.perf_counter()
+            with stage_timer("IR", "model_load"):
+                retriever.load_model()
+
+                if retriever.model is None:
+                    print(f"Building model for {model_type}...")
+                    retriever.build_model(self.index_documents)
+                    retriever.save_model()
+                elif hasattr(retriever, "update_model"):
+                    # Documents ingested since the model was saved are added incrementally
+                    if retriever.update_model(self.index_documents) != "unchanged":
+                        retriever.save_model()
+            MODEL_LOAD_SECONDS.labels(model=model_type.value).set(time.perf_counter() - start)
 
         return retrievers
 
-    def search(self, user_query, user_models, user_autokeywords, user_nres):
+    def _row_mask_for(self, retriever_documents, mask):
+        """Maps a mask over self.documents onto the rows of a retriever's own document list."""
+        if mask is None or retriever_documents is None or retriever_documents is self.documents:
+            return mask
+        if not hasattr(self, "_row_by_id"):
+            self._row_by_id = {doc["id"]: row for row, doc in enumerate(self.documents)}
+        rows = np.fromiter((self._row_by_id.get(doc["id"], -1) for doc in retriever_documents), dtype=np.int64, count=len(retriever_documents))
+        return (rows >= 0) & mask[rows]
+
+    @profiled("IRSystem.search")
+    def search(self, user_query, user_models, user_autokeywords, user_nres, user_themes=None, user_filters=None):
+        """
+        Args:
+            user_themes (list[str]): Only documents with one of these 'Tema' values are scored.
+            user_filters (dict): Keyword arguments of `MetadataBitmapIndex.mask`
+                (date_from, date_to, tipo_legislacao, modificacao).
+        """
         print("[IR] Selecting documents...")
         self.n_results = user_nres
 
-        retrievers = self._init_retrievers(user_models)
-        retrievers = self._retrieve_or_create_models(retrievers)
+        # The mask is applied to every retriever's scores before its top-n, so filtering costs no recall
+        mask = self.metadata_index.mask(themes=user_themes, **(user_filters or {}))
+        if mask is not None:
+            print(f"[IR] Filters {user_filters or {}} themes {user_themes or []}: {int(mask.sum())} of {len(self.documents)} documents.")
+            mask = self._cluster_mask(mask)
+
+        # With IR_SHARDS > 1 the indexes live in the shard worker processes instead of this thread
+        shard_pool = get_shard_pool(self.index_documents) if IR_SHARDS > 1 else None
+        if shard_pool is None:
+            retrievers = self._init_retrievers(user_models)
+            retrievers = self._retrieve_or_create_models(retrievers)
+        else:
+            # Models without shard support (the passage index) still run here
+            local_models = [model_type for model_type in user_models if ModelType(model_type) not in RESULT_FILES]
+            retrievers = self._retrieve_or_create_models(self._init_retrievers(local_models))
+            self.n_models = len(user_models)
+            for model_type in user_models:
+                if ModelType(model_type) in RESULT_FILES:
+                    with stage_timer("IR", "model_load"):
+                        shard_pool.prepare(model_type)
+                    retrievers[ModelType(model_type)] = None
 
         search_terms = set()
         search_terms.update(preprocess_query(user_query, user_autokeywords))
-        self.search_terms = list(set(search_terms))
+        self.search_terms = list(self._correct_terms(search_terms))
 
-        file_handler = JSONFileHandler(f"{self.output_directory}/search_terms.json")
-        file_handler.delete_results()
-        file_handler.save_results(results=self.search_terms)
+        with stage_timer("IR", "json_dump"):
+            file_handler = JSONFileHandler(f"{self.output_directory}/search_terms.json")
+            file_handler.delete_results()
+            file_handler.save_results(results=self.search_terms)
 
         results = []
 
         for model_type, retriever in retrievers.items():
             
-            if model_type == ModelType.TF_IDF:
-                temp_results = retriever.find_most_similar(self.search_terms, user_nres)
-            elif model_type == ModelType.BM25:
-                temp_results = retriever.find_most_similar(self.search_terms, user_nres)
-            elif model_type == ModelType.WORD2VEC:
-                temp_results = retriever.find_most_similar(self.search_terms, self.documents, user_nres)
-            elif model_type == ModelType.WIKI_WORD2VEC:
-                temp_results = retriever.find_most_similar(self.search_terms, self.documents, user_nres)
-            else:
-                print(f"Cannot handle model {model_type}")
-                continue
+            with stage_timer("IR", f"retriever_{model_type.value}"):
+                # TF-IDF and BM25 score the documents they were built with, the Word2Vec models score self.index_documents
+                if retriever is None:
+                    # Served by the shard workers
+                    temp_results = shard_pool.find_most_similar(model_type, self.search_terms, user_nres, self._row_mask_for(self.index_documents, mask))
+                    with stage_timer("IR", "json_dump"):
+                        file_handler = JSONFileHandler(f"{self.output_directory}/{RESULT_FILES[model_type]}")
+                        file_handler.delete_results()
+                        file_handler.save_results(results=temp_results)
+                elif model_type == ModelType.TF_IDF:
+                    temp_results = retriever.find_most_similar(self.search_terms, user_nres, row_mask=self._row_mask_for(retriever.documents, mask))
+                elif model_type == ModelType.BM25:
+                    temp_results = retriever.find_most_similar(self.search_terms, user_nres, row_mask=self._row_mask_for(retriever.documents, mask))
+                elif model_type == ModelType.WORD2VEC:
+                    temp_results = retriever.find_most_similar(self.search_terms, self.index_documents, user_nres, row_mask=self._row_mask_for(self.index_documents, mask))
+                elif model_type == ModelType.WIKI_WORD2VEC:
+                    temp_results = retriever.find_most_similar(self.search_terms, self.index_documents, user_nres, row_mask=self._row_mask_for(self.index_documents, mask))
+                elif model_type == ModelType.PASSAGE:
+                    temp_results = retriever.find_most_similar(self.search_terms, user_nres, row_mask=self._row_mask_for(retriever.documents, mask))
+                else:
+                    print(f"Cannot handle model {model_type}")
+                    continue
             
             # Aggregate results
-            results = self._add_results(results, temp_results, model_type)
+            with stage_timer("IR", "fusion"):
+                results = self._add_results(results, temp_results, model_type)
 
         # Balance results by average score and return the top results
-        self._global_balance_results(results)
+        with stage_timer("IR", "fusion"):
+            self._global_balance_results(results)
+            if self.near_duplicates is not None:
+                # Models saved before clustering can still return duplicates
+                results = self.near_duplicates.collapse(results, {doc["id"]: doc for doc in self.documents})
 
         #comparative searches
         self._mongo_direct_querying()
@@ -123,6 +258,26 @@ class IRSystem:
 
         return results
 
+    def _correct_terms(self, search_terms):
+        """
+        Misspelled terms match nothing in the in-process indexes, so terms that are not corpus words
+        are expanded with their closest corpus words. The original term is kept: it may be a valid
+        lemma missing from the surface vocabulary, and the Word2Vec, MongoDB and Elasticsearch
+        searches can still match it.
+        """
+        spell_index = get_spell_index() if SPELL_MAX_DISTANCE else None
+        if spell_index is None:
+            return set(search_terms)
+        corrected = set()
+        with stage_timer("IR", "spell_correction"):
+            for term in search_terms:
+                corrections = spell_index.correct(term)
+                if corrections != [term]:
+                    print(f"[IR] Expanded '{term}' with {corrections}")
+                corrected.add(term)
+                corrected.update(corrections)
+        return corrected
+
     def _add_results(self, results, temp_results, model_type):
         results_dict = {i["id"]: i for i in results}
         for temp in temp_results:
@@ -154,24 +309,28 @@ class IRSystem:
     def _mongo_direct_querying(self):
         print("[IR] Performing direct MongoDB search...")
 
-        mongo_results = mongo_text_search(
-            collection_metadados=self.collection_metadados,
-            search_terms=self.search_terms,
-            n_docs=self.n_results
-        )
+        with stage_timer("IR", "mongo_text_search"):
+            mongo_results = mongo_text_search(
+                collection_metadados=self.collection_metadados,
+                search_terms=self.search_terms,
+                n_docs=self.n_results
+            )
 
-        file_handler = JSONFileHandler(f"{self.output_directory}/mongo_direct_querying.json")
-        file_handler.delete_results()
-        file_handler.save_results(results=mongo_results)
+        with stage_timer("IR", "json_dump"):
+            file_handler = JSONFileHandler(f"{self.output_directory}/mongo_direct_querying.json")
+            file_handler.delete_results()
+            file_handler.save_results(results=mongo_results)
 
     def _elastic_direct_querying(self):
         print("[IR] Performing an Elastic search...")
 
-        elastic_results = elastic_query_search(
-            search_terms=self.search_terms,
-            n_docs=self.n_results
-        )
+        with stage_timer("IR", "elastic_search"):
+            elastic_results = elastic_query_search(
+                search_terms=self.search_terms,
+                n_docs=self.n_results
+            )
 
-        file_handler = JSONFileHandler(f"{self.output_directory}/elastic_direct_querying.json")
-        file_handler.delete_results()
-        file_handler.save_results(results=elastic_results)
+        with stage_timer("IR", "json_dump"):
+            file_handler = JSONFileHandler(f"{self.output_directory}/elastic_direct_querying.json")
+            file_handler.delete_results()
+            file_handler.save_results(results=elastic_results)
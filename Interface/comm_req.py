@@ -1,12 +1,21 @@
 from enum import Enum
+from datetime import date
 from pydantic import BaseModel
 from utils.retriever.model_type import ModelType
 
 class QueryResponse(BaseModel):
     answer: str
 
+class MetadataFilters(BaseModel):
+    date_from: date | None = None
+    date_to: date | None = None
+    tipo_legislacao: list[str] | None = None
+    modificacao: list[str] | None = None
+
 class QueryRequest(BaseModel):
     text: str
     models: list[ModelType]
     n_docs: int
-    auto_select_keywords: bool
\ No newline at end of file
+    auto_select_keywords: bool
+    themes: list[str] | None = None
+    filters: MetadataFilters | None = None
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Memory and latency budgets of the passage index over full 'Content' texts.
+
+Builds a `PassageRetriever` over synthetic article-structured contents drawn from a realistic
+vocabulary and checks the index size (arrays, vocabulary dict and document list) against the
+raw text size and the p95 query latency against fixed budgets. The vocabulary is a fixed cost,
+so the ratio is only meaningful from about 10000 documents up. Exits with status 1 when a
+budget is exceeded.
+
+USAGE:
+python -m benchmarks.bench_passage_index --n-docs 20000 --max-index-ratio 0.35 --max-p95-ms 50
+"""
+from contextlib import redirect_stdout
+import argparse
+import tempfile
+import shutil
+import json
+import sys
+import io
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.bench_retrievers import _peak_rss_mb, _disk_size_mb, _percentiles, _timed
+from benchmarks.synthetic_corpus import generate_documents, generate_contents, generate_queries, generate_vocabulary, to_ir_documents
+
+
+def run_benchmark(n_docs, n_queries, top_n, seed, vocabulary_size):
+    from utils.retriever.retriever_passage import PassageRetriever
+
+    raw_documents = generate_documents(n_docs, seed)
+    documents = to_ir_documents(raw_documents)
+    # Real legal text has 10^5+ distinct terms, which makes the vocabulary dict a large part of the index
+    contents = generate_contents(raw_documents, seed + 2, vocabulary=list(generate_vocabulary(vocabulary_size, seed + 3)))
+    queries = generate_queries(n_queries, seed + 1)
+    content_mb = sum(len(content.encode("utf-8")) for content in contents) / 2**20
+
+    workdir = tempfile.mkdtemp(prefix="dr_bench_passage_")
+    # The retriever writes its JSON results relative to the working directory
+    os.chdir(workdir)
+    try:
+        baseline_rss_mb = _peak_rss_mb()
+        retriever = PassageRetriever(model_file=os.path.join(workdir, "passage_index.pkl"))
+        with redirect_stdout(io.StringIO()):
+            _, build_s = _timed(retriever.build_model, documents, contents)
+            retriever.save_model()
+
+        n_postings = int(retriever.document_frequencies.sum())
+        memory = retriever.memory_usage()
+        latencies = []
+        for terms in queries:
+            _, elapsed = _timed(retriever.calculate_similarities, terms, top_n)
+            latencies.append(elapsed * 1000)
+
+        return {
+            "n_docs": n_docs,
+            "n_passages": len(retriever.passage_doc),
+            "n_terms": len(retriever.model),
+            "n_postings": n_postings,
+            "content_mb": content_mb,
+            "index_mb": sum(memory.values()) / 2**20,
+            "arrays_mb": memory["arrays"] / 2**20,
+            "vocabulary_mb": memory["vocabulary"] / 2**20,
+            "documents_mb": memory["documents"] / 2**20,
+            "postings_mb": retriever.postings.nbytes / 2**20,
+            # (passage id, frequency) as two int32 per posting
+            "uncompressed_postings_mb": n_postings * 8 / 2**20,
+            "disk_mb": _disk_size_mb(retriever.model_file),
+            "build_s": build_s,
+            **_percentiles(latencies),
+            "baseline_rss_mb": baseline_rss_mb,
+            "peak_rss_mb": _peak_rss_mb()
+        }
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the passage index against memory and latency budgets.")
+    parser.add_argument("--n-docs", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--vocabulary-size", type=int, default=100000, help="Distinct words of the synthetic contents.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-index-ratio", type=float, default=0.35, help="Index (arrays, vocabulary and documents) / raw 'Content' size.")
+    parser.add_argument("--max-p95-ms", type=float, default=50.0)
+    parser.add_argument("--output", default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    print(f"[Bench] Passage index on {args.n_docs} documents...")
+    result = run_benchmark(args.n_docs, args.queries, args.top_n, args.seed, args.vocabulary_size)
+    index_ratio = result["index_mb"] / result["content_mb"]
+    print(f"[Bench]   {result['n_passages']} passages, {result['n_terms']} terms, {result['n_postings']} postings, built in {result['build_s']:.1f}s")
+    print(f"[Bench]   content {result['content_mb']:.1f}MB | index {result['index_mb']:.1f}MB ({index_ratio:.1%} of content): "
+          f"arrays {result['arrays_mb']:.1f}MB, vocabulary {result['vocabulary_mb']:.1f}MB, documents {result['documents_mb']:.1f}MB")
+    print(f"[Bench]   "
+          f"postings {result['postings_mb']:.1f}MB vs {result['uncompressed_postings_mb']:.1f}MB uncompressed | disk {result['disk_mb']:.1f}MB")
+    print(f"[Bench]   p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms p99 {result['p99_ms']:.2f}ms | "
+          f"peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    failures = []
+    if index_ratio > args.max_index_ratio:
+        failures.append(f"index is {index_ratio:.1%} of the content, budget {args.max_index_ratio:.1%}")
+    if result["p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 latency {result['p95_ms']:.2f}ms, budget {args.max_p95_ms:.2f}ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({**result, "index_ratio": index_ratio, "failures": failures}, file, indent=4)
+
+    for failure in failures:
+        print(f"[Bench] Over budget: {failure}")
+    if failures:
+        sys.exit(1)
+    print("[Bench] Within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Retriever microbenchmarks over a synthetic corpus.
+
+Every (model, corpus size) pair runs in a fresh process, so peak RSS and cold load times are not
+polluted by earlier runs. Results are written as JSON, named after the current commit, and can be
+compared between commits with `benchmarks.compare`.
+
+USAGE:
+python -m benchmarks.bench_retrievers --sizes 10000 100000 --queries 200
+python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+import multiprocessing
+import subprocess
+import platform
+import logging
+import argparse
+import resource
+import tempfile
+import shutil
+import glob
+import json
+import time
+import sys
+import io
+import os
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS = ["TF-IDF", "BM25", "WORD2VEC", "WIKI_WORD2VEC", "IR_SYSTEM"]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _disk_size_mb(model_file):
+    return sum(os.path.getsize(path) for path in glob.glob(f"{model_file}*")) / (1024 * 1024)
+
+
+def _percentiles(latencies_ms):
+    values = np.array(latencies_ms)
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean())
+    }
+
+
+def _load_nlp(spacy_model):
+    import spacy
+    # A blank pipeline only tokenizes, which is all the retrievers need, and needs no download
+    return spacy.blank("pt") if spacy_model == "blank" else spacy.load(spacy_model)
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _make_retriever(model_name, workdir, nlp):
+    from utils.retriever.retriever_tfidf import TfidfRetriever
+    from utils.retriever.retriever_bm25 import BM25Retriever
+    from utils.retriever.retriever_word2vec import Word2VecRetriever
+    from utils.retriever.retriever_wiki_word2vec import WikiWord2VecRetriever
+
+    if model_name == "TF-IDF":
+        return TfidfRetriever(model_file=os.path.join(workdir, "tfidf_model.pkl"))
+    if model_name == "BM25":
+        return BM25Retriever(model_file=os.path.join(workdir, "bm25_model.pkl"))
+    if model_name == "WORD2VEC":
+        return Word2VecRetriever(model_file=os.path.join(workdir, "word2vec_model.model"), nlp=nlp)
+    if model_name == "WIKI_WORD2VEC":
+        return WikiWord2VecRetriever(model_file=os.path.join(workdir, "wiki_vectors.wv"), nlp=nlp)
+    raise ValueError(f"Unknown model {model_name}")
+
+
+def _query(retriever, model_name, terms, documents, top_n):
+    if model_name in ("WORD2VEC", "WIKI_WORD2VEC"):
+        return retriever.find_most_similar(terms, documents, top_n)
+    return retriever.find_most_similar(terms, top_n)
+
+
+def _bench_retriever(model_name, documents, queries, top_n, workdir, nlp):
+    from benchmarks.synthetic_corpus import write_stand_in_vectors
+
+    retriever = _make_retriever(model_name, workdir, nlp)
+    if model_name == "WIKI_WORD2VEC":
+        # Pretrained vectors are not built from the corpus; small stand-ins are generated instead
+        _, build_s = _timed(write_stand_in_vectors, retriever.model_file)
+    else:
+        _, build_s = _timed(retriever.build_model, documents)
+        retriever.save_model()
+    del retriever
+
+    cold = _make_retriever(model_name, workdir, nlp)
+    start = time.perf_counter()
+    cold.load_model()
+    if model_name in ("WORD2VEC", "WIKI_WORD2VEC"):
+        cold.documents = documents
+        cold._cache_document_vectors()
+    cold_load_s = time.perf_counter() - start
+
+    latencies = []
+    for terms in queries:
+        _, elapsed = _timed(_query, cold, model_name, terms, documents, top_n)
+        latencies.append(elapsed * 1000)
+
+    return {"build_s": build_s, "disk_mb": _disk_size_mb(cold.model_file), "cold_load_s": cold_load_s, "latencies": latencies}
+
+
+def _bench_ir_system(documents, queries, top_n, workdir, nlp, ir_models):
+    from utils.retriever.model_type import ModelType
+    from IR.module import IRSystem
+
+    class OfflineIRSystem(IRSystem):
+        """IRSystem over the synthetic corpus, without MongoDB or Elasticsearch."""
+
+        def _connect_to_db(self):
+            return None, None, None, None
+
+        def _fetch_documents(self):
+            return [{"_id": doc["id"], "db_ID": doc["db_ID"], "Sumario": doc["search_content"]} for doc in documents]
+
+        def _init_retrievers(self, user_models):
+            self.n_models = len(user_models)
+            return {model_type: _make_retriever(model_type.value, workdir, nlp) for model_type in user_models}
+
+        def _mongo_direct_querying(self):
+            pass
+
+        def _elastic_direct_querying(self):
+            pass
+
+    from benchmarks.synthetic_corpus import write_stand_in_vectors
+    import IR.module as ir_module
+
+    if nlp.pipe_names == []:
+        # A blank pipeline has no POS tags for preprocess_query, so the terms are used as they are
+        ir_module.preprocess_query = lambda query, use_yake=True: query.split()
+
+    user_models = [ModelType(name) for name in ir_models]
+    if ModelType.WIKI_WORD2VEC in user_models:
+        write_stand_in_vectors(os.path.join(workdir, "wiki_vectors.wv"))
+
+    start = time.perf_counter()
+    system = OfflineIRSystem()
+    system.output_directory = os.path.join(workdir, "IR_analysis")
+    # The first search builds and saves every model that does not exist yet
+    system.search(" ".join(queries[0]), user_models, False, top_n)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    for terms in queries:
+        _, elapsed = _timed(system.search, " ".join(terms), user_models, False, top_n)
+        latencies.append(elapsed * 1000)
+
+    disk_mb = sum(_disk_size_mb(_make_retriever(name, workdir, nlp).model_file) for name in ir_models)
+    return {"build_s": build_s, "disk_mb": disk_mb, "cold_load_s": None, "latencies": latencies,
+            "preprocess_query": bool(nlp.pipe_names)}
+
+
+def run_benchmark(model_name, n_docs, n_queries, top_n, spacy_model, seed, ir_models):
+    """Benchmarks one model on one corpus size. Meant to run in its own process."""
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic_corpus import generate_documents, generate_queries, to_ir_documents
+
+    # Word2Vec.build_model switches training logs on, which would flood the report
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix="dr_bench_")
+    # Retrievers write their JSON results relative to the working directory
+    os.chdir(workdir)
+    try:
+        nlp = _load_nlp(spacy_model)
+        documents = to_ir_documents(generate_documents(n_docs, seed))
+        queries = generate_queries(n_queries, seed + 1)
+        baseline_rss_mb = _peak_rss_mb()
+
+        with redirect_stdout(io.StringIO()):
+            if model_name == "IR_SYSTEM":
+                metrics = _bench_ir_system(documents, queries, top_n, workdir, nlp, ir_models)
+            else:
+                metrics = _bench_retriever(model_name, documents, queries, top_n, workdir, nlp)
+
+        latencies = metrics.pop("latencies")
+        return {
+            "model": model_name,
+            "n_docs": n_docs,
+            "n_queries": n_queries,
+            "top_n": top_n,
+            **metrics,
+            "first_query_ms": latencies[0],
+            **_percentiles(latencies),
+            "baseline_rss_mb": baseline_rss_mb,
+            "peak_rss_mb": _peak_rss_mb()
+        }
+    except Exception as e:
+        return {"model": model_name, "n_docs": n_docs, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retrievers on a synthetic Portuguese legal corpus.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000])
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--ir-models", nargs="+", default=["TF-IDF", "BM25", "WORD2VEC", "WIKI_WORD2VEC"],
+                        help="Retrievers used by the IR_SYSTEM benchmark.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--spacy-model", default="blank", help="'blank' (offline tokenizer) or an installed spaCy model name.")
+    parser.add_argument("--output", default=None, help="Defaults to benchmarks/results/<commit>.json")
+    args = parser.parse_args()
+
+    commit = _current_commit()
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"{commit}.json")
+    results = []
+
+    context = multiprocessing.get_context("spawn")
+    for n_docs in args.sizes:
+        for model_name in args.models:
+            print(f"[Bench] {model_name} on {n_docs} documents...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_benchmark, model_name, n_docs, args.queries, args.top_n,
+                                         args.spacy_model, args.seed, args.ir_models).result()
+            results.append(result)
+            if "error" in result:
+                print(f"[Bench]   failed: {result['error']}")
+            else:
+                print(f"[Bench]   build {result['build_s']:.2f}s | disk {result['disk_mb']:.1f}MB | "
+                      f"p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms p99 {result['p99_ms']:.2f}ms | "
+                      f"peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    report = {
+        "commit": commit,
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "spacy_model": args.spacy_model,
+        "results": results
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4)
+    print(f"[Bench] Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
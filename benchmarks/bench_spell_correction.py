@@ -0,0 +1,146 @@
+"""
+Symmetric-delete spelling correction versus brute-force edit distance over the vocabulary.
+
+Builds a `SymmetricDeleteIndex` over a synthetic vocabulary and corrects misspelled terms
+(random edits within the distance allowed by "fuzziness": "AUTO") and correct ones with both
+the index and a scan of every word, reporting latencies, the speedup and how often both return
+the same correction. Exits with status 1 when the p95 latency of the index exceeds the budget.
+
+USAGE:
+python -m benchmarks.bench_spell_correction --n-words 100000 --queries 1000 --max-p95-us 1000
+"""
+from contextlib import redirect_stdout
+import argparse
+import json
+import time
+import sys
+import io
+import os
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_corpus import generate_vocabulary, misspell
+
+
+def brute_force_lookup(term, words, frequencies, max_distance):
+    """Same result as `SymmetricDeleteIndex.lookup`, comparing the term with every word."""
+    from utils.retriever.spell_correction import auto_distance, edit_distance
+
+    distance = auto_distance(term, max_distance)
+    matches = []
+    for word, frequency in zip(words, frequencies):
+        word_distance = 0 if word == term else edit_distance(term, word, distance)
+        if word_distance <= distance:
+            matches.append((word, word_distance, int(frequency)))
+    closest = min((match[1] for match in matches), default=None)
+    return sorted((match for match in matches if match[1] == closest), key=lambda match: (-match[2], match[0]))
+
+
+def _latency_percentiles(latencies_us):
+    values = np.array(latencies_us)
+    return {
+        "p50_us": float(np.percentile(values, 50)),
+        "p95_us": float(np.percentile(values, 95)),
+        "p99_us": float(np.percentile(values, 99)),
+        "mean_us": float(values.mean())
+    }
+
+
+def _generate_terms(word_counts, n_queries, exact_ratio, max_distance, seed):
+    """(term, intended word) pairs, misspelled within the distance allowed for the word."""
+    from utils.retriever.spell_correction import auto_distance
+
+    rng = np.random.default_rng(seed)
+    words = list(word_counts)
+    terms = []
+    for row in rng.integers(len(words), size=n_queries):
+        word = words[row]
+        allowed = auto_distance(word, max_distance)
+        n_edits = 0 if not allowed or rng.random() < exact_ratio else int(rng.integers(1, allowed + 1))
+        terms.append((misspell(word, n_edits, rng), word))
+    return terms
+
+
+def run_benchmark(n_words, n_queries, exact_ratio, max_distance, seed):
+    from utils.retriever.spell_correction import SymmetricDeleteIndex
+
+    word_counts = generate_vocabulary(n_words, seed)
+    terms = _generate_terms(word_counts, n_queries, exact_ratio, max_distance, seed + 1)
+
+    index = SymmetricDeleteIndex(index_file=os.devnull, max_distance=max_distance)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        index.build(word_counts)
+    build_s = time.perf_counter() - start
+
+    # Separate passes, so the brute-force scans do not evict the index from the cache between lookups
+    index_matches, index_latencies = [], []
+    for term, _ in terms:
+        start = time.perf_counter()
+        index_matches.append(index.lookup(term))
+        index_latencies.append((time.perf_counter() - start) * 1e6)
+
+    n_agree, n_intended, brute_latencies = 0, 0, []
+    for (term, intended), matches in zip(terms, index_matches):
+        start = time.perf_counter()
+        expected = brute_force_lookup(term, index.words, index.frequencies, max_distance)
+        brute_latencies.append((time.perf_counter() - start) * 1e6)
+        n_agree += (matches == expected)
+        n_intended += any(word == intended for word, _, _ in matches)
+
+    index_stats = _latency_percentiles(index_latencies)
+    brute_stats = _latency_percentiles(brute_latencies)
+    return {
+        "n_words": len(index.words),
+        "n_deletes": len(index.delete_hashes),
+        "index_mb": (index.delete_hashes.nbytes + index.delete_rows.nbytes) / 2**20,
+        "build_s": build_s,
+        "index": index_stats,
+        "brute_force": brute_stats,
+        "speedup": brute_stats["mean_us"] / index_stats["mean_us"],
+        "agreement": n_agree / len(terms),
+        "intended_found": n_intended / len(terms)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare symmetric-delete spelling correction with brute force.")
+    parser.add_argument("--n-words", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--exact-ratio", type=float, default=0.3, help="Share of terms that are spelled correctly.")
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-p95-us", type=float, default=1000.0)
+    parser.add_argument("--output", default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    print(f"[Bench] Spelling correction over {args.n_words} words, {args.queries} terms...")
+    result = run_benchmark(args.n_words, args.queries, args.exact_ratio, args.max_distance, args.seed)
+    print(f"[Bench]   {result['n_deletes']} deletes ({result['index_mb']:.1f}MB), built in {result['build_s']:.1f}s")
+    for name in ("index", "brute_force"):
+        stats = result[name]
+        print(f"[Bench]   {name:<12} p50 {stats['p50_us']:.0f}us p95 {stats['p95_us']:.0f}us p99 {stats['p99_us']:.0f}us mean {stats['mean_us']:.0f}us")
+    print(f"[Bench]   speedup x{result['speedup']:.0f} | same correction as brute force {result['agreement']:.1%} | "
+          f"intended word found {result['intended_found']:.1%}")
+
+    failures = []
+    if result["index"]["p95_us"] > args.max_p95_us:
+        failures.append(f"p95 latency {result['index']['p95_us']:.0f}us, budget {args.max_p95_us:.0f}us")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({**result, "failures": failures}, file, indent=4)
+
+    for failure in failures:
+        print(f"[Bench] Over budget: {failure}")
+    if failures:
+        sys.exit(1)
+    print("[Bench] Within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+USAGE:
+python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = ["build_s", "cold_load_s", "disk_mb", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"]
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as file:
+        report = json.load(file)
+    return report, {(r["model"], r["n_docs"]): r for r in report["results"] if "error" not in r}
+
+
+def compare(old_path, new_path, threshold=10.0):
+    """
+    Prints the relative change of every metric and returns the list of regressions,
+    i.e. metrics that grew by more than `threshold` percent.
+    """
+    old_report, old_results = _load(old_path)
+    new_report, new_results = _load(new_path)
+    print(f"{old_report['commit']} -> {new_report['commit']}")
+
+    regressions = []
+    for key in sorted(set(old_results) & set(new_results)):
+        print(f"\n{key[0]} ({key[1]} docs)")
+        for metric in METRICS:
+            old_value, new_value = old_results[key].get(metric), new_results[key].get(metric)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  <-- REGRESSION"
+                regressions.append((key, metric, change))
+            print(f"  {metric:12} {old_value:12.3f} {new_value:12.3f} {change:+8.1f}%{flag}")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent increase reported as a regression.")
+    args = parser.parse_args()
+
+    sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
@@ -0,0 +1,281 @@
+"""
+End-to-end load test of `/send` and the GR path, with local stand-ins for MongoDB, Elasticsearch
+and the LLM (see benchmarks.load_test.stubs), so no Atlas, Elastic Cloud or remote LLM is needed.
+
+A query log is replayed open-loop at a target rate: request i is scheduled at start + i / rps and
+handed to a pool of `--concurrency` workers. Latencies are measured from the scheduled time, so
+queueing behind busy workers counts against the request, as it would for a real client.
+
+The query log is JSON Lines with one `QueryRequest` per line, e.g.
+{"text": "regime jurídico do arrendamento urbano", "models": ["TF-IDF", "BM25"], "n_docs": 10, "auto_select_keywords": false}
+Without `--query-log`, queries are generated from the synthetic corpus vocabulary.
+
+USAGE:
+python -m benchmarks.load_test.run_load_test --docs 20000 --rps 5 --requests 200 --concurrency 4
+python -m benchmarks.load_test.run_load_test --query-log queries.jsonl --gr --llm-latency 1.5 --llm-tokens-per-second 40
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+import functools
+import threading
+import argparse
+import tempfile
+import logging
+import shutil
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StageRecorder:
+    """Thread-safe collection of (duration, ok) samples per pipeline stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, duration_s, ok=True):
+        with self._lock:
+            self.samples[stage].append((duration_s * 1000, ok))
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+    def timed(self, stage, function, is_ok=None):
+        """Wraps `function` so every call is recorded under `stage`; exceptions count as errors and are re-raised."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                self.record(stage, time.perf_counter() - start, ok=False)
+                raise
+            self.record(stage, time.perf_counter() - start, ok=is_ok(result) if is_ok else True)
+            return result
+        return wrapper
+
+    def summary(self):
+        report = {}
+        for stage, samples in sorted(self.samples.items()):
+            latencies = np.array([latency for latency, _ in samples])
+            errors = sum(1 for _, ok in samples if not ok)
+            report[stage] = {
+                "count": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_ms": float(latencies.mean()),
+                "max_ms": float(latencies.max())
+            }
+        return report
+
+
+def load_query_log(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def synthetic_query_log(n_queries, models, n_docs, seed):
+    from benchmarks.synthetic_corpus import generate_queries
+    return [
+        {"text": " ".join(terms), "models": models, "n_docs": n_docs, "auto_select_keywords": False}
+        for terms in generate_queries(n_queries, seed)
+    ]
+
+
+def instrument(recorder, spacy_model):
+    """Wraps the IR and GR stages with timers. Returns a thread-local holding the ids of the last IR results."""
+    import IR.module as ir_module
+    import GR.module as gr_module
+    from utils.retriever.retriever_tfidf import TfidfRetriever
+    from utils.retriever.retriever_bm25 import BM25Retriever
+    from utils.retriever.retriever_word2vec import Word2VecRetriever
+    from utils.retriever.retriever_wiki_word2vec import WikiWord2VecRetriever
+
+    IRSystem, GRSystem = ir_module.IRSystem, gr_module.GRSystem
+    IRSystem.__init__ = recorder.timed("ir.init (corpus fetch)", IRSystem.__init__)
+    IRSystem._retrieve_or_create_models = recorder.timed("ir.model_load", IRSystem._retrieve_or_create_models)
+    IRSystem.search = recorder.timed("ir.search (total)", IRSystem.search)
+    for retriever_class in (TfidfRetriever, BM25Retriever, Word2VecRetriever, WikiWord2VecRetriever):
+        retriever_class.find_most_similar = recorder.timed(f"ir.retriever.{retriever_class.__name__}",
+                                                           retriever_class.find_most_similar)
+
+    if spacy_model == "blank":
+        # No POS tagger is available offline, so the query is split into terms as it is
+        ir_module.preprocess_query = lambda query, use_yake=True: query.split()
+    ir_module.preprocess_query = recorder.timed("ir.preprocess_query", ir_module.preprocess_query)
+    ir_module.mongo_text_search = recorder.timed("ir.mongo_text_search", ir_module.mongo_text_search)
+    ir_module.elastic_query_search = recorder.timed("ir.elastic_query_search", ir_module.elastic_query_search)
+
+    last_ids = threading.local()
+    get_result_ids = IRSystem.get_result_ids
+
+    def remember_result_ids(self, results):
+        last_ids.ids = get_result_ids(self, results)
+        return last_ids.ids
+    IRSystem.get_result_ids = remember_result_ids
+
+    GRSystem._get_contents = recorder.timed("gr.content_fetch", GRSystem._get_contents)
+    GRSystem.get_summaries = recorder.timed("gr.get_summaries (total)", GRSystem.get_summaries)
+    import requests
+    gr_module.requests = SimpleNamespace(
+        post=recorder.timed("gr.llm_call", requests.post, is_ok=lambda response: response.status_code == 200)
+    )
+    return last_ids
+
+
+def run_request(app, query, scheduled_at, recorder, last_ids, with_gr, gr_docs):
+    from GR.module import GRSystem
+
+    queue_wait = time.perf_counter() - scheduled_at
+    recorder.record("queue_wait", queue_wait)
+    ok = False
+    try:
+        with app.test_client() as client:
+            response = recorder.timed("send", client.post, is_ok=lambda r: r.status_code == 200)("/send", json=query)
+        ok = response.status_code == 200
+        if ok and with_gr:
+            ids = (getattr(last_ids, "ids", None) or [])[:gr_docs]
+            answer = GRSystem(list_doc_ids=ids).get_summaries(query["text"])
+            ok = not answer.startswith("Error:")
+    except Exception:
+        ok = False
+    finally:
+        recorder.record("end_to_end", time.perf_counter() - scheduled_at, ok=ok)
+
+
+def replay(app, queries, n_requests, rps, concurrency, recorder, last_ids, with_gr, gr_docs):
+    """Replays `queries` (cycled) open-loop at `rps`. Returns the wall-clock duration in seconds."""
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    start = time.perf_counter()
+    futures = []
+    for i in range(n_requests):
+        scheduled_at = start + i / rps
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(executor.submit(run_request, app, queries[i % len(queries)], scheduled_at,
+                                       recorder, last_ids, with_gr, gr_docs))
+    for future in futures:
+        future.result()
+    executor.shutdown()
+    return time.perf_counter() - start
+
+
+def print_report(report):
+    print(f"[LoadTest] {report['completed']} requests in {report['duration_s']:.1f}s "
+          f"-> {report['throughput_rps']:.2f} req/s (target {report['target_rps']:.2f}), "
+          f"{report['errors']} failed ({report['error_rate']:.1%})")
+    print(f"{'stage':36} {'count':>7} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:36} {stats['count']:7d} {stats['error_rate']:6.1%} {stats['p50_ms']:9.1f} "
+              f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /send and the GR path against local service stand-ins.")
+    parser.add_argument("--query-log", default=None, help="JSON Lines file of QueryRequest objects.")
+    parser.add_argument("--requests", type=int, default=100, help="Requests to send; the query log is cycled.")
+    parser.add_argument("--rps", type=float, default=2.0, help="Target request rate.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight.")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests sent first (the first one builds the models).")
+    parser.add_argument("--models", nargs="+", default=["TF-IDF", "BM25"], help="Models of generated queries.")
+    parser.add_argument("--n-docs", type=int, default=10, help="n_docs of generated queries.")
+    parser.add_argument("--docs", type=int, default=10000, help="Synthetic corpus size.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-uri", default=None, help="Use a local mongod instead of mongomock.")
+    parser.add_argument("--elastic-latency", type=float, default=0.0, help="Added latency of the fake Elasticsearch, in seconds.")
+    parser.add_argument("--gr", action="store_true", help="Also run GR on the ids returned by IR.")
+    parser.add_argument("--gr-docs", type=int, default=5, help="Documents sent to the LLM per request.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="LLM time to first token, in seconds.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--llm-completion-tokens", type=int, default=200)
+    parser.add_argument("--spacy-model", default="blank", help="'blank' skips preprocess_query's spaCy/YAKE step.")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic_corpus import generate_documents
+    from benchmarks.load_test.stubs import make_mongo_stand_in, FakeElasticsearch, FakeLLM
+
+    queries = load_query_log(args.query_log) if args.query_log else \
+        synthetic_query_log(max(args.requests, 1), args.models, args.n_docs, args.seed + 1)
+    query_log = os.path.abspath(args.query_log) if args.query_log else None
+    output = os.path.abspath(args.output) if args.output else None
+
+    print(f"[LoadTest] Preparing {args.docs} synthetic documents and local services...")
+    documents = generate_documents(args.docs, args.seed)
+    mongo = make_mongo_stand_in(documents, mongo_uri=args.mongo_uri)
+    elastic = FakeElasticsearch(documents, index_name="dr_load_test", latency_s=args.elastic_latency).start()
+    llm = FakeLLM(args.llm_latency, args.llm_tokens_per_second, args.llm_completion_tokens).start()
+
+    # load_dotenv does not override variables that are already set
+    os.environ["ELASTIC_URL"] = elastic.url
+    os.environ["ELASTICSEARCH_INDEXNAME"] = "dr_load_test"
+    os.environ["API_ENDPOINT"] = f"{llm.url}/v1/chat/completions"
+
+    import IR.module as ir_module
+    import GR.module as gr_module
+    ir_module.connect_to_mongo = lambda *args, **kwargs: mongo
+    gr_module.connect_to_mongo = lambda *args, **kwargs: mongo
+
+    recorder = StageRecorder()
+    last_ids = instrument(recorder, args.spacy_model)
+    from server import app
+
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix="dr_load_test_")
+    # Models and the JSON results of every request are written relative to the working directory
+    os.chdir(workdir)
+    try:
+        with redirect_stdout(open(os.devnull, "w")):
+            for i in range(args.warmup):
+                run_request(app, queries[i % len(queries)], time.perf_counter(), recorder, last_ids, args.gr, args.gr_docs)
+            recorder.reset()
+            duration_s = replay(app, queries, args.requests, args.rps, args.concurrency, recorder, last_ids, args.gr, args.gr_docs)
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+        elastic.stop()
+        llm.stop()
+
+    stages = recorder.summary()
+    end_to_end = stages.get("end_to_end", {"count": 0, "errors": 0})
+    report = {
+        "created": datetime.now().isoformat(),
+        "query_log": query_log,
+        "corpus_docs": args.docs,
+        "mongo": args.mongo_uri or "mongomock",
+        "gr": args.gr,
+        "target_rps": args.rps,
+        "concurrency": args.concurrency,
+        "completed": end_to_end["count"],
+        "errors": end_to_end["errors"],
+        "error_rate": end_to_end["errors"] / end_to_end["count"] if end_to_end["count"] else 0.0,
+        "duration_s": duration_s,
+        "throughput_rps": end_to_end["count"] / duration_s if duration_s else 0.0,
+        "stages": stages
+    }
+    print_report(report)
+
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"[LoadTest] Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Local stand-ins for the external services used by the IR and GR modules:
+- an in-memory MongoDB (mongomock) with the 'dados' and 'metadados' collections,
+- a fake Elasticsearch HTTP endpoint (info, index management, _search, _msearch, _bulk),
+- an OpenAI-compatible chat completions endpoint with configurable latency and token rate.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import Counter
+import threading
+import mongomock
+import json
+import time
+import re
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def make_mongo_stand_in(documents, contents=None, mongo_uri=None):
+    """
+    Fills an in-memory MongoDB (or a local mongod, when `mongo_uri` is given) with synthetic documents.
+
+    mongomock does not implement $text, so the direct MongoDB text search only returns real
+    results, and realistic timings, against a local mongod.
+
+    Args:
+        documents (list[dict]): 'metadados'-shaped documents (see benchmarks.synthetic_corpus).
+        contents (list[str]): Optional 'Content' for each document.
+        mongo_uri (str): e.g. "mongodb://localhost:27017". Its 'DiarioRepublica_load_test' database is overwritten.
+
+    Returns:
+        tuple: (client, db, collection_dados, collection_metadados), like `connect_to_mongo`.
+    """
+    from bson.objectid import ObjectId
+
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+        db = client["DiarioRepublica_load_test"]
+        db.drop_collection("dados")
+        db.drop_collection("metadados")
+    else:
+        client = mongomock.MongoClient()
+        db = client["DiarioRepublica"]
+    collection_dados, collection_metadados = db["dados"], db["metadados"]
+
+    dados, metadados = [], []
+    for i, doc in enumerate(documents):
+        data_id = ObjectId(doc["db_ID"])
+        dados.append({
+            "_id": data_id,
+            "TipoLegislacao": doc.get("TipoLegislacao"),
+            "Content": contents[i] if contents else f"{doc['Titulo']}\n{doc['Sumario']}"
+        })
+        metadados.append({key: value for key, value in doc.items() if key not in ("_id", "db_ID", "TipoLegislacao")}
+                         | {"_id": ObjectId(doc["_id"]), "db_ID": data_id})
+    collection_dados.insert_many(dados)
+    collection_metadados.insert_many(metadados)
+    return client, db, collection_dados, collection_metadados
+
+
+class _StubServer:
+    handler_class = None
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, payload, status=200, extra_headers=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class _ElasticHandler(_JSONHandler):
+    def _send(self, payload, status=200):
+        # The Python client refuses to talk to servers that do not identify as Elasticsearch
+        self._send_json(payload, status, {"X-Elastic-Product": "Elasticsearch"})
+
+    def _path_parts(self):
+        return [part for part in self.path.split("?")[0].split("/") if part]
+
+    def do_GET(self):
+        parts = self._path_parts()
+        if not parts:
+            self._send({"version": {"number": "8.15.0", "build_flavor": "default"}, "tagline": "You Know, for Search"})
+        elif parts[-1] in ("_search", "_msearch"):
+            self.do_POST()
+        else:
+            self._send({"error": "not found"}, 404)
+
+    def do_HEAD(self):
+        parts = self._path_parts()
+        self._send(None, 200 if parts and parts[0] in self.server.stub.indices else 404)
+
+    def do_PUT(self):
+        parts = self._path_parts()
+        if parts and parts[-1].startswith("_"):
+            # e.g. the client sends _bulk as PUT
+            self.do_POST()
+            return
+        self._body()
+        self.server.stub.indices.setdefault(parts[0], {})
+        self._send({"acknowledged": True, "index": parts[0]})
+
+    def do_DELETE(self):
+        parts = self._path_parts()
+        self.server.stub.indices.pop(parts[0], None)
+        self._send({"acknowledged": True})
+
+    def do_POST(self):
+        stub = self.server.stub
+        parts = self._path_parts()
+        body = self._body()
+        if stub.latency_s:
+            time.sleep(stub.latency_s)
+
+        endpoint = parts[-1] if parts else ""
+        if endpoint == "_search":
+            self._send(stub.search(parts[0] if len(parts) > 1 else None, json.loads(body or b"{}")))
+        elif endpoint == "_msearch":
+            lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+            responses = [
+                stub.search(header.get("index", parts[0] if len(parts) > 1 else None), request)
+                for header, request in zip(lines[0::2], lines[1::2])
+            ]
+            self._send({"took": 1, "responses": responses})
+        elif endpoint == "_bulk":
+            self._send(stub.bulk(body))
+        elif endpoint == "_refresh":
+            self._send({"_shards": {"total": 1, "successful": 1, "failed": 0}})
+        else:
+            self._send({"error": f"unsupported endpoint {endpoint}"}, 400)
+
+
+class FakeElasticsearch(_StubServer):
+    """
+    Minimal single-node Elasticsearch stand-in. Documents are scored by the number of query
+    tokens found in 'Titulo' and 'Sumario' ('Sumario' counts double, like the real query).
+    """
+    handler_class = _ElasticHandler
+
+    def __init__(self, documents=(), index_name="dr_metadados", latency_s=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_s = latency_s
+        self.indices = {index_name: {}}
+        self._lock = threading.Lock()
+        for doc in documents:
+            self.indices[index_name][str(doc["_id"])] = {
+                "db_ID": str(doc["db_ID"]), "Titulo": doc.get("Titulo", ""), "Sumario": doc.get("Sumario", "")
+            }
+
+    def search(self, index_name, request):
+        query = request.get("query", {}).get("multi_match", {}).get("query", "")
+        size = request.get("size", 10)
+        source_fields = request.get("_source")
+        query_tokens = Counter(_TOKEN_PATTERN.findall(query.lower()))
+
+        hits = []
+        for doc_id, source in self.indices.get(index_name, {}).items():
+            titulo = set(_TOKEN_PATTERN.findall((source.get("Titulo") or "").lower()))
+            sumario = set(_TOKEN_PATTERN.findall((source.get("Sumario") or "").lower()))
+            score = sum(count * ((token in titulo) + 2 * (token in sumario)) for token, count in query_tokens.items())
+            if score:
+                hits.append((score, doc_id, source))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+
+        return {
+            "took": 1,
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "hits": [
+                    {
+                        "_index": index_name,
+                        "_id": doc_id,
+                        "_score": float(score),
+                        "_source": {key: value for key, value in source.items() if not source_fields or key in source_fields}
+                    }
+                    for score, doc_id, source in hits[:size]
+                ]
+            }
+        }
+
+    def bulk(self, body):
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        items = []
+        with self._lock:
+            for action, source in zip(lines[0::2], lines[1::2]):
+                op, meta = next(iter(action.items()))
+                self.indices.setdefault(meta["_index"], {})[meta["_id"]] = source
+                items.append({op: {"_index": meta["_index"], "_id": meta["_id"], "status": 201, "result": "created"}})
+        return {"took": 1, "errors": False, "items": items}
+
+
+class _LLMHandler(_JSONHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        request = json.loads(self._body() or b"{}")
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request.get("messages", []))
+        completion_tokens = stub.completion_tokens
+
+        # Time to first token plus generation at the configured rate
+        time.sleep(stub.latency_s + completion_tokens / stub.tokens_per_second)
+
+        self._send_json({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(["resumo"] * completion_tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+
+class FakeLLM(_StubServer):
+    """OpenAI-compatible chat completions stub; every POST path answers as /v1/chat/completions."""
+    handler_class = _LLMHandler
+
+    def __init__(self, latency_s=0.5, tokens_per_second=50.0, completion_tokens=200, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_s = latency_s
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
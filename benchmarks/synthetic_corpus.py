@@ -0,0 +1,171 @@
+from datetime import date, timedelta
+import numpy as np
+
+# Vocabulary shaped like 'Titulo'/'Sumario' of consolidated legislation
+LEGAL_TERMS = [
+    "aprova", "altera", "revoga", "regime", "jurídico", "regulamento", "código", "trabalho", "fiscal",
+    "imposto", "rendimento", "pessoas", "singulares", "coletivas", "segurança", "social", "saúde",
+    "serviço", "nacional", "educação", "ensino", "superior", "básico", "secundário", "ambiente",
+    "energia", "transportes", "rodoviária", "contratação", "pública", "autarquias", "locais",
+    "administração", "funcionários", "carreiras", "remuneração", "pensões", "reforma", "subsídio",
+    "desemprego", "família", "menores", "proteção", "dados", "pessoais", "consumidor", "arrendamento",
+    "urbano", "habitação", "urbanismo", "edificação", "florestas", "agricultura", "pescas", "mar",
+    "turismo", "cultura", "património", "desporto", "eleições", "partidos", "políticos", "tribunais",
+    "processo", "penal", "civil", "administrativo", "registos", "notariado", "sociedades", "comerciais",
+    "insolvência", "banca", "seguros", "valores", "mobiliários", "concorrência", "telecomunicações",
+    "comunicação", "estrangeiros", "asilo", "nacionalidade", "defesa", "militar", "proteção", "civil",
+    "incêndios", "resíduos", "água", "licenciamento", "atividade", "empresarial", "ordens", "profissionais",
+    "medicamentos", "farmácias", "veterinária", "animais", "caça", "armas", "estatuto", "orgânica",
+    "organização", "funcionamento", "procedimento", "contraordenações", "coimas", "taxas", "orçamento",
+    "estado", "governo", "ministério", "direção", "geral", "instituto", "público", "diretiva", "europeia",
+    "transpõe", "ordem", "jurídica", "interna", "condições", "acesso", "exercício", "medidas",
+    "excecionais", "temporárias", "apoio", "empresas", "trabalhadores", "independentes", "cidadãos",
+]
+FILLER_WORDS = ["de", "do", "da", "dos", "das", "e", "a", "o", "no", "na", "para", "em", "que", "ao", "à"]
+LEGISLATION_TYPES = ["Lei", "Decreto-Lei", "Decreto Regulamentar", "Portaria", "Resolução", "Decreto Legislativo Regional"]
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_documents(n_docs, seed=42, min_words=8, max_words=40):
+    """
+    Generates 'metadados'-like documents (without database ids) with Zipf-distributed legal terms.
+
+    Returns:
+        list[dict]: Documents with '_id', 'db_ID', 'Titulo', 'Sumario', 'TipoLegislacao',
+        'Modificacao' and 'Data_ultima_modificacao'.
+    """
+    rng = np.random.default_rng(seed)
+    terms = np.array(LEGAL_TERMS)
+    weights = _zipf_weights(len(terms))
+    start = date(1976, 1, 1)
+    n_days = (date(2025, 1, 1) - start).days
+
+    documents = []
+    lengths = rng.integers(min_words, max_words + 1, size=n_docs)
+    for i in range(n_docs):
+        words = list(rng.choice(terms, size=lengths[i], p=weights))
+        for position in rng.integers(0, len(words), size=len(words) // 3):
+            words.insert(int(position), FILLER_WORDS[rng.integers(len(FILLER_WORDS))])
+        legislation_type = LEGISLATION_TYPES[rng.integers(len(LEGISLATION_TYPES))]
+        published = start + timedelta(days=int(rng.integers(n_days)))
+
+        documents.append({
+            "_id": f"{i:024x}",
+            "db_ID": f"{i + n_docs:024x}",
+            "Titulo": f"{legislation_type} n.º {i % 999 + 1}/{published.year}",
+            "Sumario": " ".join(words).capitalize() + ".",
+            "TipoLegislacao": legislation_type,
+            "Modificacao": "Alterado" if rng.random() < 0.3 else None,
+            "Data_ultima_modificacao": published.isoformat()
+        })
+    return documents
+
+
+def to_ir_documents(documents):
+    """Same shape as `IRSystem._preprocess_documents`."""
+    return [
+        {
+            "id": str(doc["_id"]),
+            "db_ID": str(doc["db_ID"]),
+            "search_content": (doc.get("Sumario") or "").strip() or (doc.get("Titulo") or "").strip()
+        }
+        for doc in documents
+    ]
+
+
+def generate_queries(n_queries, seed=7, min_terms=1, max_terms=4):
+    """Generates lists of search terms, like the output of `preprocess_query`."""
+    rng = np.random.default_rng(seed)
+    terms = np.array(LEGAL_TERMS)
+    weights = _zipf_weights(len(terms), exponent=0.8)
+    return [
+        [str(term) for term in rng.choice(terms, size=rng.integers(min_terms, max_terms + 1), replace=False, p=weights)]
+        for _ in range(n_queries)
+    ]
+
+
+def write_stand_in_vectors(path, vector_size=50, seed=3):
+    """
+    Saves small random KeyedVectors over the synthetic vocabulary, standing in for the
+    pretrained Wikipedia vectors used by `WikiWord2VecRetriever`.
+    """
+    from gensim.models import KeyedVectors
+
+    rng = np.random.default_rng(seed)
+    vocabulary = sorted(set(LEGAL_TERMS))
+    vectors = KeyedVectors(vector_size=vector_size)
+    vectors.add_vectors(vocabulary, rng.standard_normal((len(vocabulary), vector_size)).astype(np.float32))
+    vectors.save(path)
+    return path
+
+
+def generate_contents(documents, seed=11, min_articles=1, max_articles=30, min_words=20, max_words=400, vocabulary=None):
+    """
+    Generates a 'dados.Content'-like body for each document: a preamble that repeats the
+    summary, then articles headed "Artigo N.º", each with a Zipf-distributed legal text.
+
+    Args:
+        vocabulary (list[str]): Words of the articles, most frequent first, e.g. the keys of
+            `generate_vocabulary`; the legal terms alone by default.
+    """
+    rng = np.random.default_rng(seed)
+    terms = np.array(vocabulary if vocabulary is not None else LEGAL_TERMS)
+    # Inverse-CDF sampling, since rng.choice with p rescans a large vocabulary on every call
+    cumulative = np.cumsum(_zipf_weights(len(terms), exponent=0.9))
+
+    contents = []
+    for doc in documents:
+        articles = [doc.get("Sumario") or ""]
+        for number in range(1, int(rng.integers(min_articles, max_articles + 1)) + 1):
+            draws = rng.random(int(rng.integers(min_words, max_words + 1))) * cumulative[-1]
+            words = terms[np.minimum(np.searchsorted(cumulative, draws), len(terms) - 1)]
+            articles.append(f"Artigo {number}.º\n" + " ".join(words).capitalize() + ".")
+        contents.append("\n".join(articles))
+    return contents
+
+
+def generate_vocabulary(n_words, seed=13, min_syllables=2, max_syllables=5):
+    """
+    Generates a {word: occurrences} vocabulary of `n_words` Portuguese-looking words (the legal
+    terms plus words built from syllables), with Zipf-distributed occurrences.
+    """
+    rng = np.random.default_rng(seed)
+    onsets = ["", "b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "br", "cr", "pr", "tr", "ch", "lh", "nh"]
+    nuclei = ["a", "e", "i", "o", "u", "á", "é", "ã", "ão", "ç", "ei", "ou"]
+    codas = ["", "", "", "s", "r", "l", "m", "n"]
+
+    words = list(dict.fromkeys(LEGAL_TERMS))
+    seen = set(words)
+    while len(words) < n_words:
+        word = "".join(
+            onsets[rng.integers(len(onsets))] + nuclei[rng.integers(len(nuclei))] + codas[rng.integers(len(codas))]
+            for _ in range(int(rng.integers(min_syllables, max_syllables + 1)))
+        )
+        if len(word) > 2 and word not in seen:
+            seen.add(word)
+            words.append(word)
+    words = words[:n_words]
+    occurrences = np.maximum((_zipf_weights(len(words)) * len(words) * 50).astype(np.int64), 1)
+    return {word: int(count) for word, count in zip(words, occurrences)}
+
+
+def misspell(word, n_edits, rng, alphabet="abcdefghijlmnopqrstuvxzáâãçéêíóôõú"):
+    """Applies `n_edits` random deletions, insertions, substitutions or adjacent transpositions to `word`."""
+    for _ in range(n_edits):
+        position = int(rng.integers(len(word)))
+        edit = rng.integers(4) if len(word) > 1 else 1
+        letter = alphabet[rng.integers(len(alphabet))]
+        if edit == 0:
+            word = word[:position] + word[position + 1:]
+        elif edit == 1:
+            word = word[:position] + letter + word[position:]
+        elif edit == 2:
+            word = word[:position] + letter + word[position + 1:]
+        else:
+            position = min(position, len(word) - 2)
+            word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word
@@ -6,11 +6,17 @@ from IR import module as ir_module
 from GR import module as gr_module
 
 from utils.retriever.model_type import ModelType
+from utils.retriever.suggest_index import get_suggest_index
+from utils.retriever.spell_correction import get_spell_index
 from utils.json_file_handler import JSONFileHandler
 from utils.progress_messenger import ProgressMessenger
+from utils.metrics import stage_timer, metrics_response
+from utils.request_profiler import request_profile, should_profile, is_admin, profile_path, profile_as_text
 
 import threading
 import time
+import uuid
+import os
 
 app = Flask(__name__, template_folder='Interface/templates')
 app.config["REDIS_URL"] = "redis://localhost"
@@ -19,52 +25,98 @@ app.register_blueprint(sse, url_prefix='/stream')
 
 current_messenger = None
 
+# Loaded at startup rather than by the first search (see `python -m utils.retriever.spell_correction`)
+get_spell_index()
+
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics():
+    body, content_type = metrics_response()
+    return Response(body, mimetype=content_type)
+
+@app.route('/profiles/<request_id>')
+def download_profile(request_id):
+    # ?format=text returns a pstats report instead of the binary .prof file
+    if not is_admin(request.headers.get("X-Profile-Token") or request.args.get("token")):
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        path = profile_path(request_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not os.path.exists(path):
+        return jsonify({"error": "profile not found"}), 404
+
+    if request.args.get("format") == "text":
+        return Response(profile_as_text(request_id, request.args.get("sort", "cumulative")), mimetype="text/plain")
+    with open(path, "rb") as file:
+        return Response(file.read(), mimetype="application/octet-stream",
+                        headers={"Content-Disposition": f"attachment; filename={request_id}.prof"})
+
+@app.route('/suggest')
+@stage_timer("server", "suggest")
+def suggest():
+    # The index is built by the first search; until then there is nothing to suggest
+    index = get_suggest_index()
+    k = min(max(request.args.get("k", 8, type=int), 1), 20)
+    return jsonify({"suggestions": index.suggest(request.args.get("q", ""), k) if index else []})
+
 @app.route('/send', methods=['POST'])
+@stage_timer("server", "send")
 def send():
     global current_messenger
 
     data = request.get_json()
     request_data = comm_req.QueryRequest(**data)
+    request_id = uuid.uuid4().hex
+    profile_enabled = should_profile(request)
 
     input_note = f"You sent: {request_data.text}. Models: {', '.join(request_data.models)}. Docs: {request_data.n_docs}. Auto Select: {request_data.auto_select_keywords}"
 
     # Initialize the ProgressMessenger for IR
     #current_messenger = ProgressMessenger(module_name="IR")
 
-    # IR Module
-    IR_Module = ir_module.IRSystem() #mess=current_messenger
-    results = IR_Module.search(
-        user_query=request_data.text,
-        user_models=request_data.models,
-        user_nres=request_data.n_docs,
-        user_autokeywords=request_data.auto_select_keywords
-    )
-    
-    list_ids = IR_Module.get_result_ids(results)
-
-
-    file_handler = JSONFileHandler("IR_analysis/parl_europeu/final_results.json")
-    file_handler.delete_results()
-    file_handler.save_results(results=results)
-
-    """ 
-    # GR Module (commented out for now)
-    GR_Module = gr_module.GRSystem(list_doc_ids=list_ids)
-    summary_response = GR_Module.get_summaries(user_query=request_data.text)
-
-    file_handler = JSONFileHandler("GR/results/temp_results.json")
-    file_handler.delete_results()
-    file_handler.save_results(results=summary_response)
-
-    return jsonify(comm_req.QueryResponse(answer=summary_response).model_dump())
-    """
-
-    return jsonify(comm_req.QueryResponse(answer=input_note).model_dump())
+    # IR and GR calls made within this block are profiled when profiling is enabled for the request
+    with request_profile(request_id, profile_enabled):
+        # IR Module
+        IR_Module = ir_module.IRSystem() #mess=current_messenger
+        results = IR_Module.search(
+            user_query=request_data.text,
+            user_models=request_data.models,
+            user_nres=request_data.n_docs,
+            user_autokeywords=request_data.auto_select_keywords,
+            user_themes=request_data.themes,
+            user_filters=request_data.filters.model_dump(exclude_none=True) if request_data.filters else None
+        )
+
+        list_ids = IR_Module.get_result_ids(results)
+
+
+        with stage_timer("server", "json_dump"):
+            file_handler = JSONFileHandler("IR_analysis/parl_europeu/final_results.json")
+            file_handler.delete_results()
+            file_handler.save_results(results=results)
+
+        """ 
+        # GR Module (commented out for now)
+        GR_Module = gr_module.GRSystem(list_doc_ids=list_ids)
+        summary_response = GR_Module.get_summaries(user_query=request_data.text)
+
+        file_handler = JSONFileHandler("GR/results/temp_results.json")
+        file_handler.delete_results()
+        file_handler.save_results(results=summary_response)
+
+        return jsonify(comm_req.QueryResponse(answer=summary_response).model_dump())
+        """
+
+    response = jsonify(comm_req.QueryResponse(answer=input_note).model_dump())
+    response.headers["X-Request-Id"] = request_id
+    if profile_enabled:
+        response.headers["X-Profile-Id"] = request_id
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, threaded=True)
@@ -0,0 +1,159 @@
+from elasticsearch import helpers
+from dotenv import load_dotenv
+from itertools import islice
+import argparse
+import os
+
+from utils.json_file_handler import JSONFileHandler
+from utils.mongo_conn import connect_to_mongo
+from utils.IR_direct_querying.elastic_client import get_elastic_client, get_index_name
+
+CHECKPOINT_FILE = "./IR/models/elastic_sync_checkpoint.json"
+
+INDEX_SETTINGS = {
+    "analysis": {
+        "filter": {
+            "portuguese_stop": {"type": "stop", "stopwords": "_portuguese_"},
+            "portuguese_stemmer": {"type": "stemmer", "language": "light_portuguese"}
+        },
+        "analyzer": {
+            "portuguese_legal": {
+                "type": "custom",
+                "tokenizer": "standard",
+                "filter": ["lowercase", "portuguese_stop", "asciifolding", "portuguese_stemmer"]
+            }
+        }
+    }
+}
+
+INDEX_MAPPINGS = {
+    "properties": {
+        "Titulo": {
+            "type": "text",
+            "analyzer": "portuguese_legal",
+            "fields": {"raw": {"type": "keyword", "ignore_above": 512}}
+        },
+        "Sumario": {"type": "text", "analyzer": "portuguese_legal"},
+        "db_ID": {"type": "keyword"},
+        "ID": {"type": "keyword"},
+        "Url": {"type": "keyword"},
+        "Modificacao": {"type": "keyword"},
+        "Data_ultima_modificacao": {"type": "date", "ignore_malformed": True},
+        "db_modification_date": {"type": "date", "ignore_malformed": True}
+    }
+}
+
+INDEXED_FIELDS = ["db_ID", "ID", "Url", "Titulo", "Sumario", "Modificacao", "Data_ultima_modificacao", "db_modification_date"]
+
+
+def ensure_index(es, index_name, recreate=False):
+    """Creates the index with the Portuguese analyzer mapping if it does not exist yet."""
+    if recreate and es.indices.exists(index=index_name):
+        es.indices.delete(index=index_name)
+    if not es.indices.exists(index=index_name):
+        es.indices.create(index=index_name, settings=INDEX_SETTINGS, mappings=INDEX_MAPPINGS)
+        print(f"[ElasticIndexer] Created index '{index_name}'.")
+
+
+def _to_action(doc, index_name):
+    source = {field: doc.get(field) for field in INDEXED_FIELDS if doc.get(field) is not None}
+    if "db_ID" in source:
+        source["db_ID"] = str(source["db_ID"])
+    return {"_op_type": "index", "_index": index_name, "_id": str(doc["_id"]), "_source": source}
+
+
+def iter_metadados(collection_metadados, since=None):
+    """Streams 'metadados' in db_modification_date order, starting at `since` (inclusive)."""
+    query = {"db_modification_date": {"$gte": since}} if since else {}
+    projection = {field: 1 for field in INDEXED_FIELDS}
+    return collection_metadados.find(query, projection, no_cursor_timeout=True).sort("db_modification_date", 1)
+
+
+def index_documents(es, documents, index_name, thread_count=4, chunk_size=500):
+    """
+    Indexes an iterable of 'metadados'-shaped documents with parallel chunked bulk requests.
+
+    Returns:
+        tuple[int, int, str]: (indexed, failed, latest db_modification_date seen).
+    """
+    latest_date = None
+
+    def track(docs):
+        nonlocal latest_date
+        for doc in docs:
+            date = doc.get("db_modification_date")
+            if date and (latest_date is None or date > latest_date):
+                latest_date = date
+            yield _to_action(doc, index_name)
+
+    indexed, failed = 0, 0
+    for ok, item in helpers.parallel_bulk(es, track(documents), thread_count=thread_count, chunk_size=chunk_size, raise_on_error=False, raise_on_exception=False):
+        if ok:
+            indexed += 1
+        else:
+            failed += 1
+            if failed <= 5:
+                print(f"[ElasticIndexer] Failed to index document: {item}")
+    return indexed, failed, latest_date
+
+
+def sync_index(collection_metadados, es=None, index_name=None, checkpoint_file=CHECKPOINT_FILE, full=False,
+               thread_count=4, chunk_size=500, batch_size=10000):
+    """
+    Brings the Elasticsearch index in sync with 'metadados'.
+
+    Only documents whose db_modification_date is at or after the stored checkpoint are sent. The
+    checkpoint is advanced after every fully indexed batch of `batch_size` documents, so an
+    interrupted sync resumes from the last complete batch.
+    """
+    # Bulk requests are much slower than searches, so they get a longer timeout
+    es = (es or get_elastic_client()).options(request_timeout=120)
+    index_name = index_name or get_index_name()
+    ensure_index(es, index_name)
+
+    checkpoint_handler = JSONFileHandler(checkpoint_file)
+    checkpoint = {} if full else (checkpoint_handler.read_results() or {})
+    since = checkpoint.get(index_name)
+    print(f"[ElasticIndexer] Syncing '{index_name}' from {since or 'the beginning'}...")
+
+    cursor = iter_metadados(collection_metadados, since)
+    total_indexed, total_failed = 0, 0
+    try:
+        while True:
+            batch = list(islice(cursor, batch_size))
+            if not batch:
+                break
+            indexed, failed, latest_date = index_documents(es, batch, index_name, thread_count, chunk_size)
+            total_indexed += indexed
+            total_failed += failed
+            if failed:
+                print(f"[ElasticIndexer] {failed} documents failed; checkpoint kept at {since}.")
+                break
+            if latest_date:
+                since = latest_date
+                checkpoint[index_name] = since
+                checkpoint_handler.save_results(checkpoint)
+    finally:
+        cursor.close()
+
+    es.indices.refresh(index=index_name)
+    print(f"[ElasticIndexer] Indexed {total_indexed} documents ({total_failed} failed).")
+    return total_indexed, total_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the Elasticsearch index with the 'metadados' collection.")
+    parser.add_argument("--full", action="store_true", help="Ignore the checkpoint and re-index every document.")
+    parser.add_argument("--recreate", action="store_true", help="Drop and recreate the index before syncing.")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client, db, collection_dados, collection_metadados = connect_to_mongo(os.getenv("MONGO_USER"), os.getenv("MONGO_PASSWORD"))
+    if client:
+        es = get_elastic_client()
+        index_name = get_index_name()
+        ensure_index(es, index_name, recreate=args.recreate)
+        sync_index(collection_metadados, es, index_name, full=args.full or args.recreate,
+                   thread_count=args.threads, chunk_size=args.chunk_size)
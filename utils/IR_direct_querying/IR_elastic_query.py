@@ -1,6 +1,34 @@
-from elasticsearch import Elasticsearch
-from dotenv import load_dotenv
-import os
+from utils.IR_direct_querying.elastic_client import get_elastic_client, get_index_name
+
+SOURCE_FIELDS = ["db_ID", "Titulo", "Sumario"]
+
+
+def _build_query(search_terms):
+    # Join all search terms into a single string for multi_match
+    search_query = " ".join(search_terms)
+
+    return {
+        "multi_match": {
+            "query": search_query,
+            "fields": ["Titulo", "Sumario^2"],
+            "fuzziness": "AUTO",
+            "type": "best_fields"
+        }
+    }
+
+
+def _parse_hits(response):
+    results = []
+    for hit in response["hits"]["hits"]:
+        source = hit["_source"]
+        results.append({
+            "id": hit["_id"],
+            "db_ID": str(source.get("db_ID", "")),
+            "Titulo": source.get("Titulo", ""),
+            "Sumario": source.get("Sumario", ""),
+            "score": hit["_score"]
+        })
+    return results
 
 
 def elastic_query_search(search_terms, n_docs):
@@ -15,38 +43,53 @@ def elastic_query_search(search_terms, n_docs):
     Returns:
         List[dict]: Matching documents (with id, db_ID, Titulo, Sumario, score).
     """
-    load_dotenv()
-    api_key = os.getenv("ELASTIC_API_KEY")
-    cloud_id = os.getenv("ELASTIC_CLOUD_ID")
-    index_name = os.getenv("ELASTICSEARCH_INDEXNAME")
+    try:
+        es = get_elastic_client()
+        response = es.search(index=get_index_name(), query=_build_query(search_terms), size=n_docs, source=SOURCE_FIELDS)
+        return _parse_hits(response)
+    except Exception as e:
+        print(f"[ElasticQuery] Error during Elasticsearch search: {e}")
+        return []
 
-    es = Elasticsearch(cloud_id=cloud_id, api_key=api_key)
 
-    # Join all search terms into a single string for multi_match
-    search_query = " ".join(search_terms)
+def elastic_query_msearch(list_search_terms, n_docs, batch_size=200):
+    """
+    Run the same search as `elastic_query_search` for many sets of terms, sending up to
+    `batch_size` searches per `msearch` request. Meant for offline evaluations; the comparative
+    search of `IRSystem` sends one query per request, which `elastic_query_search` already
+    serves in a single round trip.
 
-    query = {
-        "multi_match": {
-            "query": search_query,
-            "fields": ["Titulo", "Sumario^2"],
-            "fuzziness": "AUTO",
-            "type": "best_fields"
-        }
-    }
+    Args:
+        list_search_terms (list[list[str]]): One list of search terms per query.
+        n_docs (int): Max number of documents to return per query.
+        batch_size (int): Searches per msearch request.
 
-    try:
-        response = es.search(index=index_name, query=query, size=n_docs)
-        results = []
-        for hit in response["hits"]["hits"]:
-            source = hit["_source"]
-            results.append({
-                "id": hit["_id"],
-                "db_ID": str(source.get("db_ID", "")),
-                "Titulo": source.get("Titulo", ""),
-                "Sumario": source.get("Sumario", ""),
-                "score": hit["_score"]
-            })
-        return results
-    except Exception as e:
-        print(f"[ElasticQuery] Error during Elasticsearch search: {e}")
-        return []
\ No newline at end of file
+    Returns:
+        List[List[dict]]: Results for each query, in the input order ([] for failed queries).
+    """
+    es = get_elastic_client()
+    index_name = get_index_name()
+    all_results = []
+
+    for start in range(0, len(list_search_terms), batch_size):
+        batch = list_search_terms[start:start + batch_size]
+        searches = []
+        for search_terms in batch:
+            searches.append({"index": index_name})
+            searches.append({"query": _build_query(search_terms), "size": n_docs, "_source": SOURCE_FIELDS})
+
+        try:
+            response = es.msearch(searches=searches)
+        except Exception as e:
+            print(f"[ElasticQuery] Error during Elasticsearch msearch: {e}")
+            all_results.extend([] for _ in batch)
+            continue
+
+        for item in response["responses"]:
+            if "error" in item:
+                print(f"[ElasticQuery] Error in msearch item: {item['error']}")
+                all_results.append([])
+            else:
+                all_results.append(_parse_hits(item))
+
+    return all_results
@@ -35,7 +35,7 @@ def mongo_regex_search(collection_metadados, search_terms, n_docs):
 def mongo_text_search(collection_metadados, search_terms, n_docs):
     """
     Perform a full-text search using MongoDB text indexes.
-    Automatically creates a text index on 'Titulo' and 'Sumario' if it doesn't exist.
+    The text index on 'Titulo' and 'Sumario' is created at startup by `utils.mongo_indexes`.
 
     Args:
         collection_metadados: MongoDB collection object.
@@ -45,25 +45,6 @@ def mongo_text_search(collection_metadados, search_terms, n_docs):
     Returns:
         List of matching documents with relevance scores.
     """
-    # Ensure text index exists
-    index_exists = False
-    for index in collection_metadados.list_indexes():
-        if index.get("weights") == {"Titulo": 1, "Sumario": 1} and index.get("key", {}).get("_fts") == "text":
-            index_exists = True
-            break
-
-    if not index_exists:
-        try:
-            collection_metadados.create_index(
-                [("Titulo", "text"), ("Sumario", "text")],
-                name="text_search_index",
-                default_language="portuguese",  # Optional: improve stemming/stopword handling
-                weights={"Titulo": 10, "Sumario": 2}  # Optional: boost title matches
-            )
-        except Exception as e:
-            print(f"[MongoTextSearch] Failed to create text index: {e}")
-            return []
-
     # Convert list of search terms to a single space-separated string
     if isinstance(search_terms, list):
         search_string = " ".join(search_terms)
@@ -0,0 +1,149 @@
+from collections import defaultdict
+import numpy as np
+import unicodedata
+import threading
+import joblib
+import os
+
+TRIGRAM_INDEX_FILE = "./IR/models/trigram_index.pkl"
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def fold_text(text):
+    """Lowercases and strips accents, so 'Código' and 'codigo' match."""
+    normalized = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigrams to documents of a 'metadados' snapshot.
+
+    A substring query is resolved by intersecting the posting lists of its trigrams, smallest
+    first, and verifying the few remaining candidates, instead of scanning every document.
+    """
+
+    def __init__(self, index_file=TRIGRAM_INDEX_FILE):
+        self.index_file = index_file
+        self.documents = []
+        self.folded_texts = []
+        self.postings = {}
+
+    def build(self, documents):
+        """Builds the index from documents with '_id', 'db_ID', 'Titulo' and 'Sumario'."""
+        self.documents = [
+            {
+                "id": str(doc["_id"]),
+                "db_ID": str(doc.get("db_ID", "")),
+                "Titulo": doc.get("Titulo", ""),
+                "Sumario": doc.get("Sumario", "")
+            }
+            for doc in documents
+        ]
+        # Fields are separated by a newline, which never appears in a search term
+        self.folded_texts = [fold_text(f"{doc['Sumario'] or ''}\n{doc['Titulo'] or ''}") for doc in self.documents]
+
+        postings = defaultdict(list)
+        for doc_index, text in enumerate(self.folded_texts):
+            for trigram in _trigrams(text):
+                postings[trigram].append(doc_index)
+        self.postings = {trigram: np.array(doc_indices, dtype=np.uint32) for trigram, doc_indices in postings.items()}
+        print(f"[TrigramIndex] Indexed {len(self.documents)} documents, {len(self.postings)} trigrams.")
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            joblib.dump((self.documents, self.folded_texts, self.postings), self.index_file)
+            print(f"[TrigramIndex] Index saved to {self.index_file}.")
+        except Exception as e:
+            print(f"[TrigramIndex] Error saving index: {e}")
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            self.documents, self.folded_texts, self.postings = joblib.load(self.index_file)
+            return True
+        except Exception as e:
+            print(f"[TrigramIndex] Error loading index: {e}")
+            return False
+
+    def find_term(self, term):
+        """Returns the sorted indices of the documents containing `term` (case and accent insensitive)."""
+        folded_term = fold_text(term)
+        if len(folded_term) < 3:
+            return np.array([i for i, text in enumerate(self.folded_texts) if folded_term in text], dtype=np.uint32)
+
+        posting_lists = []
+        for trigram in _trigrams(folded_term):
+            posting = self.postings.get(trigram)
+            if posting is None:
+                return np.array([], dtype=np.uint32)
+            posting_lists.append(posting)
+
+        posting_lists.sort(key=len)
+        candidates = posting_lists[0]
+        for posting in posting_lists[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                break
+
+        # Trigrams can match out of order, so candidates are checked for the whole substring
+        return np.array([i for i in candidates if folded_term in self.folded_texts[i]], dtype=np.uint32)
+
+    def search(self, search_terms, n_docs):
+        matches = [self.find_term(term) for term in search_terms if term]
+        if not matches:
+            return []
+        doc_indices = np.unique(np.concatenate(matches))[:n_docs]
+        return [dict(self.documents[i]) for i in doc_indices]
+
+
+def build_trigram_index(collection_metadados, index_file=TRIGRAM_INDEX_FILE):
+    """Snapshots 'metadados' into a trigram index and saves it."""
+    documents = collection_metadados.find({}, {"_id": 1, "db_ID": 1, "Titulo": 1, "Sumario": 1})
+    index = TrigramIndex(index_file)
+    index.build(documents)
+    index.save()
+    return index
+
+
+def get_trigram_index(collection_metadados=None, index_file=TRIGRAM_INDEX_FILE):
+    """Loads the saved index once per process, building it from `collection_metadados` if it is missing."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = TrigramIndex(index_file)
+                if not index.load():
+                    if collection_metadados is None:
+                        raise FileNotFoundError(f"Trigram index {index_file} does not exist.")
+                    index = build_trigram_index(collection_metadados, index_file)
+                _index = index
+    return _index
+
+
+def trigram_regex_search(collection_metadados, search_terms, n_docs):
+    """
+    Drop-in replacement for `mongo_regex_search`, answered from the local trigram index
+    (case and accent insensitive substring match on 'Sumario' or 'Titulo').
+
+    Args:
+        collection_metadados: MongoDB collection, only used to build the index when no snapshot exists.
+        search_terms: List of search terms (strings).
+        n_docs: Maximum number of documents to retrieve.
+
+    Returns:
+        List of matching documents (dicts).
+    """
+    try:
+        return get_trigram_index(collection_metadados).search(search_terms, n_docs)
+    except Exception as e:
+        print(f"[TrigramQuery] Error during trigram search: {e}")
+        return []
@@ -0,0 +1,49 @@
+from elasticsearch import Elasticsearch
+from dotenv import load_dotenv
+import threading
+import os
+
+load_dotenv()
+ELASTICSEARCH_INDEXNAME = os.getenv("ELASTICSEARCH_INDEXNAME")
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def connect_to_elastic(request_timeout=10, max_retries=3):
+    """
+    Creates a new client for Elastic Cloud, or for the host in ELASTIC_URL when set (e.g. a local
+    single-node instance at http://localhost:9200 used for testing).
+    """
+    api_key = os.getenv("ELASTIC_API_KEY") or None
+    options = {
+        "api_key": api_key,
+        "request_timeout": request_timeout,
+        "max_retries": max_retries,
+        "retry_on_timeout": True,
+        "retry_on_status": (429, 502, 503, 504)
+    }
+    url = os.getenv("ELASTIC_URL")
+    if url:
+        return Elasticsearch(url, **options)
+    return Elasticsearch(cloud_id=os.getenv("ELASTIC_CLOUD_ID"), **options)
+
+
+def get_elastic_client():
+    """
+    Returns the process-wide Elasticsearch client.
+
+    The client keeps a pool of persistent connections, so it is created once and shared by every
+    query instead of paying connection setup per search.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = connect_to_elastic()
+    return _client
+
+
+def get_index_name():
+    """Index name from ELASTICSEARCH_INDEXNAME, read once at import rather than per query."""
+    return ELASTICSEARCH_INDEXNAME
@@ -51,13 +51,15 @@ data = {
     "Cidadania": 9
 }
 
-sorted_data = dict(sorted(data.items(), key=lambda item: item[1], reverse=True))
 
-# Print the sorted dictionary
-for key, value in sorted_data.items():
-    print(f"{key}: {value}")
+if __name__ == "__main__":
+    sorted_data = dict(sorted(data.items(), key=lambda item: item[1], reverse=True))
 
-output_file = f"./utils/db_theme_selection/results/DRs_given_topics.txt"
-with open(output_file, "w", encoding="utf-8") as f:
+    # Print the sorted dictionary
     for key, value in sorted_data.items():
-        f.write(f"{key}: {value}\n")
\ No newline at end of file
+        print(f"{key}: {value}")
+
+    output_file = f"./utils/db_theme_selection/results/DRs_given_topics.txt"
+    with open(output_file, "w", encoding="utf-8") as f:
+        for key, value in sorted_data.items():
+            f.write(f"{key}: {value}\n")
\ No newline at end of file
@@ -1,16 +1,32 @@
 import os
 import pandas as pd
+import numpy as np
+import scipy.sparse as sp
 import spacy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import NMF, LatentDirichletAllocation
-from sklearn.cluster import KMeans
+import joblib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.decomposition import NMF, LatentDirichletAllocation, MiniBatchNMF
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import normalize
 from nltk.corpus import stopwords
 from dotenv import load_dotenv
 from utils.mongo_conn import connect_to_mongo
 
 
-# Load spaCy model for Portuguese
-nlp = spacy.load("pt_core_news_md")
+RESULTS_DIR = "./utils/db_theme_selection/results"
+
+# spaCy model for Portuguese, loaded on first use (worker processes never need it)
+nlp = None
+
+def _get_nlp():
+    global nlp
+    if nlp is None:
+        nlp = spacy.load("pt_core_news_md")
+    return nlp
 
 # Load stopwords in Portuguese
 stop_words = stopwords.words("portuguese")
@@ -34,7 +50,7 @@ class LegalDocumentTopicModeling:
     # Preprocess the documents: lowercase, remove punctuation, and stopwords
     def preprocess_text(self, text):
         text = text.lower()
-        doc = nlp(text)
+        doc = _get_nlp()(text)
         tokens = [token.text for token in doc if token.text not in stop_words and not token.is_stop]
         return " ".join(tokens)
 
@@ -64,20 +80,7 @@ class LegalDocumentTopicModeling:
         else:
             raise ValueError("model_type must be 'LDA', 'NMF', or 'KMeans'")
 
-        model.fit(X)
-        
-        # Display the topics
-        output_lines = []
-        for topic_idx, topic in enumerate(topics):
-            top_terms = [feature_names[i] for i in topic.argsort()[:-11:-1]]
-            topic_str = f"Topic {topic_idx + 1}: " + " ".join(top_terms)
-            output_lines.append(topic_str)
-
-        os.makedirs("results", exist_ok=True)
-        output_file = f"./utils/db_theme_selection/results/{model_type}_{n_topics}topics.txt"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("\n".join(output_lines))
-        print(f"\nTopics saved to {output_file}")
+        save_topics(topics, feature_names, n_topics, model_type)
 
 
     def run(self, n_topics=5, model_type='LDA'):
@@ -90,6 +93,220 @@ class LegalDocumentTopicModeling:
         self.topic_modeling(documents, n_topics, model_type)
 
 
+def save_topics(topics, feature_names, n_topics, model_type, results_dir=RESULTS_DIR):
+    # Display the topics
+    output_lines = []
+    for topic_idx, topic in enumerate(topics):
+        top_terms = [feature_names[i] for i in topic.argsort()[:-11:-1]]
+        topic_str = f"Topic {topic_idx + 1}: " + " ".join(top_terms)
+        output_lines.append(topic_str)
+
+    os.makedirs(results_dir, exist_ok=True)
+    output_file = f"{results_dir}/{model_type}_{n_topics}topics.txt"
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(output_lines))
+    print(f"\nTopics saved to {output_file}")
+    return output_file
+
+
+def _iter_lines(corpus_file, chunk_size):
+    chunk = []
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        for line in f:
+            chunk.append(line.rstrip("\n"))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _fit_candidate(corpus_file, vocabulary_file, n_topics, model_type, chunk_size, passes, results_dir, model_file):
+    """Fits one online topic model over the preprocessed corpus file and saves it. Runs in a worker process."""
+    vocabulary, idf, n_documents = joblib.load(vocabulary_file)
+    vectorizer = CountVectorizer(vocabulary=vocabulary, ngram_range=(1, 2))
+    idf_diagonal = sp.diags(idf, format="csr")
+
+    if model_type == 'LDA':
+        model = LatentDirichletAllocation(n_components=n_topics, learning_method="online",
+                                          total_samples=n_documents, random_state=42)
+    elif model_type == 'NMF':
+        model = MiniBatchNMF(n_components=n_topics, batch_size=chunk_size, random_state=42)
+    elif model_type == 'KMeans':
+        model = MiniBatchKMeans(n_clusters=n_topics, batch_size=chunk_size, n_init=1, random_state=42)
+    else:
+        raise ValueError("model_type must be 'LDA', 'NMF', or 'KMeans'")
+
+    for _ in range(passes):
+        for chunk in _iter_lines(corpus_file, chunk_size):
+            X = normalize(vectorizer.transform(chunk) @ idf_diagonal)
+            if model_type == 'KMeans' and X.shape[0] < n_topics:
+                # MiniBatchKMeans cannot start (or update) on fewer samples than clusters
+                continue
+            model.partial_fit(X)
+
+    joblib.dump(model, model_file)
+    topics = model.cluster_centers_ if model_type == 'KMeans' else model.components_
+    return save_topics(topics, vectorizer.get_feature_names_out(), n_topics, model_type, results_dir)
+
+
+def _prune_rare_terms(document_frequencies, min_df, max_terms):
+    """Drops terms with df below a cut-off, starting at min_df and raised until at most `max_terms` remain."""
+    cutoff = min_df
+    while len(document_frequencies) > max_terms:
+        document_frequencies = Counter({term: df for term, df in document_frequencies.items() if df >= cutoff})
+        cutoff += 1
+    return document_frequencies
+
+
+class StreamingLegalDocumentTopicModeling(LegalDocumentTopicModeling):
+    """
+    Topic discovery over the whole archive in bounded memory.
+
+    Documents are streamed from MongoDB and preprocessed in batches with `nlp.pipe` into a text
+    file (one cleaned document per line). A first pass over that file builds the unigram/bigram
+    vocabulary and IDF; the models (online LDA, MiniBatchNMF, MiniBatchKMeans) are then fitted
+    chunk by chunk with `partial_fit`, one process per `n_topics` candidate.
+
+    USAGE:
+    modeling = StreamingLegalDocumentTopicModeling()
+    modeling.run_candidates([10, 20, 30], model_type='NMF')
+    """
+
+    def __init__(self, work_dir=f"{RESULTS_DIR}/streaming", chunk_size=2000, max_features=50000):
+        super().__init__()
+        self.work_dir = work_dir
+        self.chunk_size = chunk_size
+        self.max_features = max_features
+        self.corpus_file = f"{work_dir}/clean_corpus.txt"
+        # _id of the document on the same line of corpus_file
+        self.ids_file = f"{work_dir}/doc_ids.txt"
+        self.vocabulary_file = f"{work_dir}/vocabulary.pkl"
+
+    def model_file(self, n_topics, model_type):
+        return f"{self.work_dir}/{model_type}_{n_topics}topics_model.pkl"
+
+    def iter_documents(self):
+        """Yields (text, _id) pairs."""
+        query = {"Titulo": {"$exists": True}, "Sumario": {"$exists": True}}
+        projection = {"Titulo": 1, "Sumario": 1}
+        for doc in self.collection_metadados.find(query, projection, batch_size=self.chunk_size):
+            yield f"{doc.get('Titulo') or ''} {doc.get('Sumario') or ''}".lower(), str(doc["_id"])
+
+    def preprocess_to_file(self, n_process=None):
+        """Same cleaning as `preprocess_text`, batched and spread over `n_process` processes (all CPUs by default)."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        stop_set = set(stop_words)
+        nlp_model = _get_nlp()
+        n_documents = 0
+        with open(self.corpus_file, "w", encoding="utf-8") as f, open(self.ids_file, "w", encoding="utf-8") as ids:
+            # token.text and is_stop come from the tokenizer, so the other components are skipped
+            for doc, doc_id in nlp_model.pipe(self.iter_documents(), as_tuples=True, batch_size=self.chunk_size,
+                                              n_process=n_process or os.cpu_count() or 1, disable=nlp_model.pipe_names):
+                tokens = [token.text for token in doc if token.text not in stop_set and not token.is_stop]
+                f.write(" ".join(tokens).replace("\n", " ") + "\n")
+                ids.write(doc_id + "\n")
+                n_documents += 1
+        print(f"Preprocessed {n_documents} documents into {self.corpus_file}")
+        return n_documents
+
+    def build_vocabulary(self, min_df=2, max_df=0.95, max_tracked_terms=2000000):
+        """
+        First pass: document frequencies of unigrams and bigrams, pruned like the TfidfVectorizer of `topic_modeling`.
+
+        Args:
+            max_tracked_terms (int): Bound on the terms counted at once. Whenever a chunk leaves more,
+                the rarest terms (df below min_df first, then higher cut-offs) are dropped until half
+                remain; a dropped term that reappears is counted from zero again, so only terms that
+                are rare within the chunks seen so far can lose counts.
+        """
+        analyzer = TfidfVectorizer(ngram_range=(1, 2)).build_analyzer()
+        document_frequencies = Counter()
+        n_documents = 0
+        for chunk in _iter_lines(self.corpus_file, self.chunk_size):
+            for line in chunk:
+                document_frequencies.update(set(analyzer(line)))
+            n_documents += len(chunk)
+            if len(document_frequencies) > max_tracked_terms:
+                document_frequencies = _prune_rare_terms(document_frequencies, min_df, max_tracked_terms // 2)
+
+        max_count = max_df * n_documents
+        kept = [(term, df) for term, df in document_frequencies.items() if min_df <= df <= max_count]
+        kept = sorted(kept, key=lambda item: item[1], reverse=True)[:self.max_features]
+        kept.sort()
+        vocabulary = {term: i for i, (term, _) in enumerate(kept)}
+        # Smoothed IDF, as computed by TfidfVectorizer
+        idf = np.log((1 + n_documents) / (1 + np.array([df for _, df in kept], dtype=np.float64))) + 1
+
+        joblib.dump((vocabulary, idf, n_documents), self.vocabulary_file)
+        print(f"Vocabulary of {len(vocabulary)} terms over {n_documents} documents saved to {self.vocabulary_file}")
+        return vocabulary
+
+    def run_candidates(self, n_topics_list, model_type='LDA', passes=1, max_workers=None, reuse_corpus=False):
+        """
+        Preprocesses the archive once, then fits one model per `n_topics` candidate in parallel processes.
+
+        Returns:
+            dict: n_topics -> topics file.
+        """
+        if not (reuse_corpus and os.path.exists(self.corpus_file) and os.path.exists(self.vocabulary_file)):
+            self.preprocess_to_file()
+            self.build_vocabulary()
+
+        results = {}
+        with ProcessPoolExecutor(max_workers=max_workers or min(len(n_topics_list), os.cpu_count() or 1)) as executor:
+            futures = {
+                n_topics: executor.submit(_fit_candidate, self.corpus_file, self.vocabulary_file, n_topics,
+                                          model_type, self.chunk_size, passes, RESULTS_DIR,
+                                          self.model_file(n_topics, model_type))
+                for n_topics in n_topics_list
+            }
+            for n_topics, future in futures.items():
+                results[n_topics] = future.result()
+        return results
+
+    def assign_themes(self, n_topics, model_type='NMF', topic_labels=None, field="Tema"):
+        """
+        Stores each document's dominant topic in 'metadados', so searches can be restricted to a theme.
+
+        Args:
+            n_topics (int): Candidate fitted by `run_candidates`.
+            model_type (str): 'LDA', 'NMF' or 'KMeans'.
+            topic_labels (dict): Topic number (1-based, as in the topics file) -> theme name, ideally
+                one of the curated themes of `selection_themes.data`. Unlabelled topics are stored as 'Topic <n>'.
+
+        Returns:
+            Counter: documents per theme.
+        """
+        from utils.db_theme_selection.selection_themes import data as curated_themes
+
+        topic_labels = topic_labels or {}
+        unknown = [label for label in topic_labels.values() if label not in curated_themes]
+        if unknown:
+            print(f"[WARN] Themes not in the curated list: {unknown}")
+
+        vocabulary, idf, _ = joblib.load(self.vocabulary_file)
+        vectorizer = CountVectorizer(vocabulary=vocabulary, ngram_range=(1, 2))
+        idf_diagonal = sp.diags(idf, format="csr")
+        model = joblib.load(self.model_file(n_topics, model_type))
+
+        counts = Counter()
+        with open(self.ids_file, "r", encoding="utf-8") as ids:
+            for chunk in _iter_lines(self.corpus_file, self.chunk_size):
+                chunk_ids = [next(ids).strip() for _ in chunk]
+                X = normalize(vectorizer.transform(chunk) @ idf_diagonal)
+                topics = model.predict(X) if model_type == 'KMeans' else model.transform(X).argmax(axis=1)
+                labels = [topic_labels.get(int(topic) + 1, f"Topic {int(topic) + 1}") for topic in topics]
+                self.collection_metadados.bulk_write(
+                    [UpdateOne({"_id": ObjectId(doc_id)}, {"$set": {field: label}}) for doc_id, label in zip(chunk_ids, labels)],
+                    ordered=False
+                )
+                counts.update(labels)
+
+        print(f"Assigned themes to {sum(counts.values())} documents: {dict(counts.most_common())}")
+        return counts
+
+
 # Example usage
 if __name__ == "__main__":
     legal_document_modeling = LegalDocumentTopicModeling()
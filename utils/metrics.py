@@ -0,0 +1,38 @@
+from prometheus_client import Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+
+# From sub-millisecond lookups up to multi-minute LLM answers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "dr_stage_duration_seconds",
+    "Duration of each stage of the IR/GR pipeline.",
+    ["module", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+MODEL_LOAD_SECONDS = Gauge(
+    "dr_model_load_seconds",
+    "Time taken by the last load (or build) of each retrieval model.",
+    ["model"]
+)
+
+CORPUS_DOCUMENTS = Gauge(
+    "dr_corpus_documents",
+    "Number of documents fetched from 'metadados' by the last IRSystem."
+)
+
+
+def stage_timer(module, stage):
+    """
+    Times a pipeline stage into the `dr_stage_duration_seconds` histogram.
+
+    USAGE:
+    with stage_timer("IR", "fusion"):
+        ...
+    """
+    return STAGE_SECONDS.labels(module=module, stage=stage).time()
+
+
+def metrics_response():
+    """Returns (body, content type) of the Prometheus text exposition of every metric."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,147 @@
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+import threading
+import argparse
+import os
+
+from utils.mongo_conn import connect_to_mongo
+
+# Indexes the application relies on, per collection
+REQUIRED_INDEXES = {
+    "metadados": [
+        {
+            "keys": [("Titulo", "text"), ("Sumario", "text")],
+            "name": "text_search_index",
+            "default_language": "portuguese",
+            "weights": {"Titulo": 10, "Sumario": 2}
+        },
+        {"keys": [("Url", 1)], "name": "url_unique", "unique": True},
+        {"keys": [("db_ID", 1)], "name": "db_id"},
+        {"keys": [("db_modification_date", 1)], "name": "db_modification_date"}
+    ],
+    "dados": [
+        {"keys": [("db_modification_date", 1)], "name": "db_modification_date"}
+    ]
+}
+
+_ensured = False
+_ensure_lock = threading.Lock()
+
+
+def _index_signature(keys):
+    """Text indexes are stored as {'_fts': 'text', '_ftsx': 1}, so they are compared by their fields instead."""
+    if any(direction == "text" for _, direction in keys):
+        return ("text",)
+    return tuple((field, direction) for field, direction in keys)
+
+
+def _existing_signatures(collection):
+    signatures = set()
+    for index in collection.list_indexes():
+        key = list(index["key"].items())
+        signatures.add(_index_signature([(field, "text" if field == "_fts" else direction) for field, direction in key]))
+    return signatures
+
+
+def ensure_indexes(collection_dados, collection_metadados):
+    """
+    Creates every missing index from REQUIRED_INDEXES. Existing indexes are left untouched.
+
+    Returns:
+        dict: collection name -> list of created index names.
+    """
+    collections = {"dados": collection_dados, "metadados": collection_metadados}
+    created = {}
+
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        collection = collections[collection_name]
+        existing = _existing_signatures(collection)
+        created[collection_name] = []
+
+        for spec in specs:
+            if _index_signature(spec["keys"]) in existing:
+                continue
+            options = {key: value for key, value in spec.items() if key != "keys"}
+            try:
+                collection.create_index(spec["keys"], **options)
+                created[collection_name].append(spec["name"])
+                print(f"[MongoIndexes] Created index '{spec['name']}' on '{collection_name}'.")
+            except OperationFailure as e:
+                # e.g. duplicated Urls prevent the unique index from being built
+                print(f"[MongoIndexes] Could not create index '{spec['name']}' on '{collection_name}': {e}")
+
+    return created
+
+
+def ensure_indexes_once(collection_dados, collection_metadados):
+    """Runs `ensure_indexes` only the first time it is called in the process."""
+    global _ensured
+    if _ensured:
+        return
+    with _ensure_lock:
+        if not _ensured:
+            try:
+                ensure_indexes(collection_dados, collection_metadados)
+            except Exception as e:
+                print(f"[MongoIndexes] Error checking indexes: {e}")
+            _ensured = True
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def diagnose_query_plans(collection_dados, collection_metadados):
+    """
+    Explains the queries issued by the crawler, IR and GR modules and reports any that
+    needs a collection scan.
+
+    Returns:
+        list[dict]: One entry per query with its winning plan stages and a 'collscan' flag.
+    """
+    sample = collection_metadados.find_one({}, {"Url": 1, "db_ID": 1, "db_modification_date": 1}) or {}
+    queries = [
+        ("metadados", "crawler Url lookup", collection_metadados, {"Url": sample.get("Url", "")}, None),
+        ("metadados", "db_ID lookup", collection_metadados, {"db_ID": sample.get("db_ID")}, None),
+        ("metadados", "incremental sync", collection_metadados,
+         {"db_modification_date": {"$gte": sample.get("db_modification_date", "")}}, [("db_modification_date", 1)]),
+        ("metadados", "text search", collection_metadados, {"$text": {"$search": "lei"}}, None),
+        ("dados", "GR content fetch", collection_dados, {"_id": sample.get("db_ID")}, None),
+    ]
+
+    report = []
+    for collection_name, description, collection, query, sort in queries:
+        try:
+            cursor = collection.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = [stage for stage in _plan_stages(plan) if stage]
+            entry = {"collection": collection_name, "query": description, "stages": stages, "collscan": "COLLSCAN" in stages}
+        except Exception as e:
+            entry = {"collection": collection_name, "query": description, "stages": [], "collscan": None, "error": str(e)}
+        report.append(entry)
+
+        status = "COLLSCAN" if entry["collscan"] else ("ERROR" if entry["collscan"] is None else "ok")
+        print(f"[MongoIndexes] {status:8} {collection_name}: {description} -> {' <- '.join(entry['stages'])}")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the required MongoDB indexes and check query plans.")
+    parser.add_argument("--diagnose", action="store_true", help="Explain the application queries and report collection scans.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client, db, collection_dados, collection_metadados = connect_to_mongo(os.getenv("MONGO_USER"), os.getenv("MONGO_PASSWORD"))
+    if client:
+        ensure_indexes(collection_dados, collection_metadados)
+        if args.diagnose:
+            diagnose_query_plans(collection_dados, collection_metadados)
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+import functools
+import cProfile
+import random
+import pstats
+import hmac
+import io
+import os
+import re
+
+load_dotenv()
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Admin token that enables profiling through the X-Profile-Token header or ?profile=<token>
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Fraction of requests profiled without being asked to, e.g. 0.01
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+_REQUEST_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_SORT_KEYS = {key.value for key in pstats.SortKey}
+_current_profile = ContextVar("current_profile", default=None)
+
+
+class _RequestProfile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.labels = []
+        self.depth = 0
+
+
+def is_admin(token):
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(str(token or ""), PROFILE_TOKEN)
+
+
+def should_profile(request):
+    """Profiles requests carrying the admin token, plus a random PROFILE_SAMPLE_RATE share of the others."""
+    if is_admin(request.headers.get("X-Profile-Token") or request.args.get("profile")):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def request_profile(request_id, enabled=True):
+    """
+    Collects the profile of every `profiled` call made in this context and saves it as
+    PROFILE_DIR/<request_id>.prof. When `enabled` is False nothing is profiled.
+
+    USAGE:
+    with request_profile(request_id, should_profile(request)):
+        ...
+    """
+    if not enabled:
+        yield None
+        return
+
+    profile = _RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        if profile.labels:
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profile.profiler.dump_stats(profile_path(request_id))
+                print(f"[Profiler] Saved profile of {', '.join(profile.labels)} for request {request_id}.")
+            except Exception as e:
+                print(f"[Profiler] Error saving profile for request {request_id}: {e}")
+
+
+def profiled(label):
+    """
+    Decorator that profiles the function while a `request_profile` is active; otherwise the only
+    cost is one context variable lookup.
+
+    On Python 3.12+ cProfile is built on sys.monitoring, which allows one active profiler per
+    process: enabling it while another request is being profiled raises ValueError ("Another
+    profiling tool is already active"). Such a call runs unprofiled instead of failing.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return function(*args, **kwargs)
+
+            # Nested profiled calls are already covered by the outer one
+            if profile.depth == 0:
+                try:
+                    profile.profiler.enable()
+                except ValueError as e:
+                    print(f"[Profiler] {label} runs unprofiled: {e}")
+                    return function(*args, **kwargs)
+                profile.labels.append(label)
+            profile.depth += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile.depth == 1:
+                    profile.profiler.disable()
+                profile.depth -= 1
+        return wrapper
+    return decorator
+
+
+def profile_path(request_id):
+    if not _REQUEST_ID_PATTERN.match(request_id or ""):
+        raise ValueError(f"Invalid request id: {request_id}")
+    return os.path.join(PROFILE_DIR, f"{request_id}.prof")
+
+
+def profile_as_text(request_id, sort_by="cumulative", limit=60):
+    """
+    Returns the saved profile of a request as a pstats report. A `sort_by` that is not a
+    pstats.SortKey value (it comes from the ?sort= query string) falls back to "cumulative".
+    """
+    if sort_by not in _SORT_KEYS:
+        sort_by = "cumulative"
+    output = io.StringIO()
+    stats = pstats.Stats(profile_path(request_id), stream=output)
+    stats.strip_dirs().sort_stats(sort_by).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,122 @@
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from datetime import date
+import numpy as np
+import os
+
+from utils.mongo_conn import connect_to_mongo
+
+CATEGORICAL_FIELDS = ("TipoLegislacao", "Modificacao", "Tema")
+NO_DATE = -1
+
+
+def _normalize_value(value):
+    return str(value).strip().casefold() if value is not None else None
+
+
+def _date_ordinal(value):
+    """Days since year 1 of an ISO date or datetime ('2024-05-01' or '2024-05-01T10:00:00+00:00')."""
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+class MetadataBitmapIndex:
+    """
+    Bitmaps over the documents of an IRSystem, in the same order, for metadata filters.
+
+    Every value of 'TipoLegislacao', 'Modificacao' and 'Tema' gets a bitmap packed to one bit
+    per document; 'Data_ultima_modificacao' is kept as a day-number column for range queries.
+    Filters are combined with bitwise AND on the packed bitmaps and unpacked once into a boolean
+    mask, which retrievers apply to their score vectors before the top-n selection.
+
+    Values are matched case-insensitively.
+    """
+
+    def __init__(self, documents):
+        self.n_documents = len(documents)
+        self.bitmaps = {field: self._build_bitmaps([doc.get(field) for doc in documents]) for field in CATEGORICAL_FIELDS}
+        self.dates = np.array([_date_ordinal(doc.get("Data_ultima_modificacao")) for doc in documents], dtype=np.int32)
+
+    @staticmethod
+    def _build_bitmaps(values):
+        normalized = np.array([_normalize_value(value) or "" for value in values], dtype=object)
+        if not len(normalized):
+            return {}
+        uniques, inverse = np.unique(normalized, return_inverse=True)
+        return {value: np.packbits(inverse == i) for i, value in enumerate(uniques) if value}
+
+    def _empty(self):
+        return np.zeros((self.n_documents + 7) // 8, dtype=np.uint8)
+
+    def values(self, field):
+        return sorted(self.bitmaps[field])
+
+    def match(self, field, values):
+        """Packed bitmap of the documents whose `field` is any of `values`."""
+        bitmap = self._empty()
+        for value in values:
+            value_bitmap = self.bitmaps[field].get(_normalize_value(value))
+            if value_bitmap is not None:
+                bitmap |= value_bitmap
+        return bitmap
+
+    def date_range(self, date_from=None, date_to=None):
+        """Packed bitmap of the documents modified within [date_from, date_to]; undated documents never match."""
+        selected = self.dates != NO_DATE
+        if date_from is not None:
+            selected &= self.dates >= _date_ordinal(date_from)
+        if date_to is not None:
+            selected &= self.dates <= _date_ordinal(date_to)
+        return np.packbits(selected)
+
+    def mask(self, date_from=None, date_to=None, tipo_legislacao=None, modificacao=None, themes=None):
+        """
+        Boolean mask over the documents matching every given filter, or None when no filter is set.
+
+        Args:
+            date_from, date_to: Bounds (inclusive) on 'Data_ultima_modificacao'.
+            tipo_legislacao, modificacao, themes: Accepted values of 'TipoLegislacao', 'Modificacao' and 'Tema'.
+        """
+        bitmaps = []
+        if date_from is not None or date_to is not None:
+            bitmaps.append(self.date_range(date_from, date_to))
+        for field, values in (("TipoLegislacao", tipo_legislacao), ("Modificacao", modificacao), ("Tema", themes)):
+            if values:
+                bitmaps.append(self.match(field, values))
+        if not bitmaps:
+            return None
+
+        combined = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            combined = combined & bitmap
+        return np.unpackbits(combined, count=self.n_documents).astype(bool)
+
+
+def backfill_legislation_types(collection_dados, collection_metadados, batch_size=1000):
+    """
+    Copies 'TipoLegislacao' from 'dados' into 'metadados' for documents ingested before the
+    crawler stored it in both, so the IR module does not have to join the collections.
+    """
+    updates, n_updated = [], 0
+    for doc in collection_metadados.find({"TipoLegislacao": {"$exists": False}}, {"db_ID": 1}):
+        data = collection_dados.find_one({"_id": doc.get("db_ID")}, {"TipoLegislacao": 1})
+        if data and data.get("TipoLegislacao") is not None:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"TipoLegislacao": data["TipoLegislacao"]}}))
+        if len(updates) >= batch_size:
+            n_updated += collection_metadados.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        n_updated += collection_metadados.bulk_write(updates, ordered=False).modified_count
+    print(f"[MetadataIndex] Backfilled 'TipoLegislacao' on {n_updated} documents.")
+    return n_updated
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    client, db, collection_dados, collection_metadados = connect_to_mongo(os.getenv("MONGO_USER"), os.getenv("MONGO_PASSWORD"))
+    if client:
+        backfill_legislation_types(collection_dados, collection_metadados)
@@ -0,0 +1,304 @@
+from utils.retriever.retriever_passage import iter_contents, tokenize
+from functools import lru_cache
+from dotenv import load_dotenv
+import numpy as np
+import threading
+import joblib
+import time
+import zlib
+import re
+import os
+
+load_dotenv()
+# Estimated Jaccard similarity of word shingles above which two texts are near-duplicates; 0 disables it
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("IR_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+SHINGLE_SIZE = 5
+# Shorter texts (e.g. a bare title when 'Content' is missing) are too generic to be called duplicates
+MIN_SHINGLES = 20
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+BANDS = 16
+
+# Shingles hashed at a time; small blocks keep the temporaries in cache
+_BLOCK = 256
+# Amendment link blocks differ between otherwise identical versions of a text
+AMENDMENT_LINE = re.compile(r"^\s*VER ALTERAÇÕES.*$", re.MULTILINE | re.IGNORECASE)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@lru_cache(maxsize=2**20)
+def _token_hash(token):
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """Distinct 32-bit hashes of the `size`-word shingles of `text`, combined from cached token hashes."""
+    tokens = tokenize(AMENDMENT_LINE.sub(" ", text or ""))
+    token_hashes = np.fromiter((_token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+    n_shingles = max(len(tokens) - size + 1, 1) if tokens else 0
+    combined = np.zeros(n_shingles, dtype=np.uint64)
+    for offset in range(min(size, len(tokens))):
+        combined = (combined * np.uint64(1000003) + token_hashes[offset:offset + n_shingles]) & np.uint64(0xFFFFFFFF)
+    return np.unique(combined)
+
+
+class MinHasher:
+    """
+    MinHash signatures from `num_perm` multiply-shift hash functions of the 32-bit shingle
+    hashes: the high 32 bits of (a * x + b) mod 2**64, with odd a. uint64 arithmetic wraps, so
+    no modulo is needed.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 2**64 - 1, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.b = rng.integers(0, 2**64 - 1, size=num_perm, dtype=np.uint64, endpoint=True)
+
+    def signature(self, text):
+        """Returns the signature of `text` and its number of shingles."""
+        hashes = shingle_hashes(text)
+        signature = np.full(len(self.a), 2**32 - 1, dtype=np.uint64)
+        for start in range(0, len(hashes), _BLOCK):
+            block = np.multiply(hashes[start:start + _BLOCK, None], self.a)
+            block += self.b
+            block >>= np.uint64(32)
+            np.minimum(signature, block.min(axis=0), out=signature)
+        return signature.astype(np.uint32), len(hashes)
+
+
+def estimated_similarity(signature_a, signature_b):
+    return float(np.mean(signature_a == signature_b))
+
+
+def lsh_clusters(signatures, threshold, bands=BANDS, eligible=None):
+    """
+    Groups rows of `signatures` into near-duplicate clusters: rows sharing a band bucket are
+    candidates, and candidates whose estimated similarity reaches `threshold` are merged.
+    Rows outside `eligible` stay in clusters of their own.
+
+    Returns:
+        np.ndarray: Cluster label of each row (the smallest row of its cluster).
+    """
+    n_rows, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    parent = np.arange(n_rows)
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows_per_band))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        is_candidate = counts[bucket] > 1
+        if eligible is not None:
+            is_candidate &= eligible
+        candidates = np.flatnonzero(is_candidate)
+        if not len(candidates):
+            continue
+        # Each candidate is compared with the first row of its bucket
+        order = candidates[np.argsort(bucket[candidates], kind="stable")]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = bucket[order[1:]] != bucket[order[:-1]]
+        leaders = order[first][np.cumsum(first) - 1]
+        similar = (signatures[order] == signatures[leaders]).mean(axis=1) >= threshold
+        for row, leader in zip(order[similar & ~first], leaders[similar & ~first]):
+            root_row, root_leader = find(row), find(leader)
+            if root_row != root_leader:
+                parent[max(root_row, root_leader)] = min(root_row, root_leader)
+
+    return np.array([find(row) for row in range(n_rows)])
+
+
+class NearDuplicateIndex:
+    """
+    Near-duplicate clusters of the corpus, from MinHash signatures of the full 'Content'.
+
+    Each cluster is represented by its longest text; retrievers index the representatives
+    only and results carry the ids of the duplicates they stand for. Signatures are computed
+    once per document version ('content_hash') and persisted, so an update only reads the
+    contents of new or changed documents.
+
+    USAGE:
+    index = NearDuplicateIndex()
+    index.load()
+    if index.update(documents, collection_dados) != "unchanged":
+        index.save()
+    index_documents = index.representatives(documents)
+    """
+
+    def __init__(self, model_file="./IR/models/near_duplicates.pkl", threshold=NEAR_DUPLICATE_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        self.model_file = model_file
+        self.signatures_file = f"{os.path.splitext(model_file)[0]}_signatures.pkl"
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        # document id -> id of its cluster's representative
+        self.representative = {}
+        # document id -> 'content_hash' the clusters were computed with
+        self.document_hashes = {}
+        # document id -> (signature, number of shingles, 'content_hash')
+        self.signatures = None
+        self._saved_threshold = None
+        # (id, 'content_hash') of each document of the last update
+        self._versions = None
+        # Ids of the documents `_rows` was computed for, and the row of each one's representative
+        self._rows_ids = None
+        self._rows = None
+
+    def update(self, documents, collection_dados=None):
+        """
+        Brings the clusters up to date with `documents`, the whole current corpus.
+
+        Returns:
+            str: 'built', 'updated' or 'unchanged'.
+        """
+        ids = [doc["id"] for doc in documents]
+        versions = [(doc["id"], doc.get("content_hash")) for doc in documents]
+        if self.threshold == self._saved_threshold and (versions == self._versions or (self.representative and dict(versions) == self.document_hashes)):
+            self._versions = versions
+            return "unchanged"
+
+        status = "updated" if self.representative else "built"
+        start = time.perf_counter()
+        known = self.signatures if self.signatures is not None else self._load_signatures()
+        new_documents = []
+        for doc in documents:
+            entry = known.get(doc["id"])
+            if entry is None or (len(entry) > 2 and entry[2] != doc.get("content_hash")):
+                new_documents.append(doc)
+            elif len(entry) == 2:
+                # Signatures saved without a hash are taken to match the current content
+                known[doc["id"]] = (*entry, doc.get("content_hash"))
+        for doc, content in zip(new_documents, iter_contents(collection_dados, new_documents)):
+            known[doc["id"]] = (*self.hasher.signature(content), doc.get("content_hash"))
+        self.signatures = {doc_id: known[doc_id] for doc_id in ids}
+
+        n_shingles = np.array([self.signatures[doc_id][1] for doc_id in ids])
+        labels = lsh_clusters(np.vstack([self.signatures[doc_id][0] for doc_id in ids]), self.threshold, self.bands,
+                              eligible=n_shingles >= MIN_SHINGLES)
+        best = {}
+        for doc_id, label in zip(ids, labels):
+            if label not in best or self.signatures[doc_id][1] > self.signatures[best[label]][1]:
+                best[label] = doc_id
+        self.representative = {doc_id: best[label] for doc_id, label in zip(ids, labels)}
+        self.document_hashes = dict(versions)
+        self._saved_threshold = self.threshold
+        self._versions = versions
+        self._rows_ids = None
+
+        print(f"[NearDuplicates] {len(ids)} documents in {len(best)} clusters "
+              f"({len(new_documents)} new or changed signatures) in {time.perf_counter() - start:.1f}s.")
+        return status
+
+    def representatives(self, documents):
+        """The documents that represent their cluster, in their original order."""
+        rows = self.representative_rows(documents)
+        return [documents[row] for row in np.flatnonzero(rows == np.arange(len(rows)))]
+
+    def representative_rows(self, documents):
+        """Row in `documents` of each document's representative, cached for the same list of ids."""
+        ids = [doc["id"] for doc in documents]
+        if ids != self._rows_ids:
+            row_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._rows = np.array([row_by_id.get(self.representative.get(doc_id, doc_id), row) for row, doc_id in enumerate(ids)],
+                                  dtype=np.int64)
+            self._rows_ids = ids
+        return self._rows
+
+    def collapse(self, results, documents_by_id):
+        """
+        Keeps the first result of each cluster (results are expected best first) and lists the
+        'db_ID' of the rest of its cluster under 'duplicates'.
+        """
+        members = {}
+        for doc_id, representative in self.representative.items():
+            if doc_id != representative:
+                members.setdefault(representative, []).append(doc_id)
+
+        collapsed, seen = [], set()
+        for result in results:
+            representative = self.representative.get(result["id"], result["id"])
+            if representative in seen:
+                continue
+            seen.add(representative)
+            cluster = [representative] + members.get(representative, [])
+            result["duplicates"] = [documents_by_id[doc_id]["db_ID"] for doc_id in cluster if doc_id != result["id"] and doc_id in documents_by_id]
+            collapsed.append(result)
+        return collapsed
+
+    def _load_signatures(self):
+        if not os.path.exists(self.signatures_file):
+            return {}
+        try:
+            return joblib.load(self.signatures_file)
+        except Exception as e:
+            print(f"[NearDuplicates] Error loading signatures: {e}")
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.model_file), exist_ok=True)
+            joblib.dump({"threshold": self.threshold, "representative": self.representative, "document_hashes": self.document_hashes}, self.model_file)
+            if self.signatures is not None:
+                joblib.dump(self.signatures, self.signatures_file)
+            print(f"[NearDuplicates] Clusters saved to {self.model_file}.")
+        except Exception as e:
+            print(f"[NearDuplicates] Error saving clusters: {e}")
+
+    def load(self):
+        """Loads the clusters; the signatures are only read when an update needs them."""
+        self._saved_threshold = None
+        if not os.path.exists(self.model_file):
+            return
+        try:
+            state = joblib.load(self.model_file)
+            self.representative = state["representative"]
+            self.document_hashes = state.get("document_hashes", {})
+            self._saved_threshold = state["threshold"]
+        except Exception as e:
+            print(f"[NearDuplicates] Error loading clusters: {e}")
+
+
+def refresh_near_duplicate_index(documents, collection_dados=None, model_file="./IR/models/near_duplicates.pkl"):
+    """
+    Loads the clusters once per process and brings them up to date with `documents`; signatures
+    (and 'Content') are only fetched when documents were added or changed since the last call.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex(model_file)
+            _index.load()
+        if _index.update(documents, collection_dados) != "unchanged":
+            _index.save()
+        _index.representative_rows(documents)
+    return _index
+
+
+def drop_near_duplicate_texts(texts, threshold=NEAR_DUPLICATE_THRESHOLD, num_perm=NUM_PERM):
+    """
+    Keeps the first of each group of near-duplicate texts, in order. Meant for short lists,
+    such as the documents sent to the LLM; every pair is compared.
+
+    Returns:
+        list[int]: Indices of the texts kept.
+    """
+    if not threshold:
+        return list(range(len(texts)))
+    hasher = MinHasher(num_perm)
+    kept, kept_signatures = [], []
+    for i, text in enumerate(texts):
+        signature, n_shingles = hasher.signature(text)
+        if n_shingles < MIN_SHINGLES:
+            kept.append(i)
+        elif all(estimated_similarity(signature, other) < threshold for other in kept_signatures):
+            kept.append(i)
+            kept_signatures.append(signature)
+    return kept
@@ -1,5 +1,6 @@
 from rank_bm25 import BM25Okapi
 from collections import defaultdict
+import numpy as np
 import joblib
 import json
 import os
@@ -40,8 +41,43 @@ class BM25Retriever:
             except Exception as e:
                 print(f"Error loading model: {e}")
 
-    def calculate_similarities(self, search_terms, top_n):
-        """Calculates similarities between the query and the BM25 model."""
+    def corpus_statistics(self):
+        """Returns (document frequency of each term, number of documents, total document length)."""
+        document_frequencies = defaultdict(int)
+        for frequencies in self.model.doc_freqs:
+            for word in frequencies:
+                document_frequencies[word] += 1
+        return dict(document_frequencies), self.model.corpus_size, int(sum(self.model.doc_len))
+
+    def set_corpus_statistics(self, document_frequencies, n_documents, total_length):
+        """
+        Replaces IDF and average document length with those of a larger corpus, so the raw
+        scores of a shard are the scores the unsharded model would give.
+        """
+        shard_size = self.model.corpus_size
+        # BM25Okapi computes IDF from corpus_size, which get_scores also uses as the number of rows
+        self.model.corpus_size = n_documents
+        self.model.idf = {}
+        self.model._calc_idf(document_frequencies)
+        self.model.corpus_size = shard_size
+        self.model.avgdl = total_length / n_documents
+
+    def score_rows(self, search_terms, row_mask=None):
+        """Returns the rows of `self.documents` selected by `row_mask` and their raw BM25 scores."""
+        if row_mask is None:
+            scores = self.model.get_scores(search_terms)
+            return np.arange(len(scores)), scores
+        # Only the selected rows are scored, so a filter cuts the scoring cost proportionally
+        rows = np.flatnonzero(row_mask)
+        if not len(rows):
+            return rows, np.array([])
+        return rows, np.asarray(self.model.get_batch_scores(search_terms, rows.tolist()))
+
+    def calculate_similarities(self, search_terms, top_n, row_mask=None):
+        """
+        Calculates similarities between the query and the BM25 model. Rows outside `row_mask`
+        (a boolean array over `self.documents`) are excluded before normalization and top-n selection.
+        """
         if self.model is None or self.documents is None:
             print("Model is not built or loaded.")
             return []
@@ -52,7 +88,9 @@ class BM25Retriever:
         #if isinstance(search_terms, str): #a string an not a list of
         #    tokenized_query = tokenized_query.split()
 
-        scores = self.model.get_scores(tokenized_query)
+        rows, scores = self.score_rows(tokenized_query, row_mask)
+        if not len(rows):
+            return []
 
         # Normalization of results - 0 to 1
         min_score, max_score = min(scores), max(scores)
@@ -66,24 +104,24 @@ class BM25Retriever:
 
         return [
                 {
-                    "id": self.documents[idx]["id"],
-                    "db_ID": self.documents[idx]["db_ID"],
-                    "text": self.documents[idx]["search_content"],
+                    "id": self.documents[rows[idx]]["id"],
+                    "db_ID": self.documents[rows[idx]]["db_ID"],
+                    "text": self.documents[rows[idx]]["search_content"],
                     "similarity_score": normalized_scores[idx],
                     "terms": tokenized_query
                 }
                 for idx in top_indices
             ]
 
-    def find_most_similar(self, search_terms, top_n):
-        """Finds the most similar documents for the given search terms."""
+    def find_most_similar(self, search_terms, top_n, row_mask=None):
+        """Finds the most similar documents for the given search terms, among the rows of `row_mask` when given."""
         self.n_terms = len(search_terms)
 
         if self.model is None or self.documents is None:
             print("Model is not built or loaded.")
             return []
 
-        query_results = self.calculate_similarities(search_terms, top_n)
+        query_results = self.calculate_similarities(search_terms, top_n, row_mask)
 
         print("Results obtained for BM25.")
 
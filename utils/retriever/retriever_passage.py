@@ -0,0 +1,368 @@
+from bson.objectid import ObjectId
+from utils.json_file_handler import JSONFileHandler
+import numpy as np
+import joblib
+import time
+import sys
+import re
+import os
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+# Articles start on their own line, e.g. "Artigo 12.º" or "Artigo 3.º-A"
+ARTICLE_PATTERN = re.compile(r"\n(?=Artigo\s+\d+)")
+MAX_PASSAGE_WORDS = 300
+MIN_PASSAGE_WORDS = 20
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def split_passages(content, max_words=MAX_PASSAGE_WORDS, min_words=MIN_PASSAGE_WORDS):
+    """
+    Splits a 'Content' text into article-sized passages: one per article, long articles cut into
+    windows of `max_words`, and fragments shorter than `min_words` joined to the previous passage.
+
+    Returns:
+        list[list[str]]: Tokens of each passage.
+    """
+    passages = []
+    for article in ARTICLE_PATTERN.split(content or ""):
+        tokens = tokenize(article)
+        for start in range(0, len(tokens), max_words):
+            window = tokens[start:start + max_words]
+            if passages and len(window) < min_words and len(passages[-1]) + len(window) <= max_words + min_words:
+                passages[-1].extend(window)
+            else:
+                passages.append(window)
+    return passages
+
+
+def iter_contents(collection_dados, documents, batch_size=500):
+    """
+    Yields the 'Content' of each IR document, fetched from 'dados' in batches. Falls back to the
+    search content for documents without one, or for all of them without a collection.
+    """
+    if collection_dados is None:
+        yield from (doc["search_content"] for doc in documents)
+        return
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        contents = {
+            str(data["_id"]): data.get("Content") or ""
+            for data in collection_dados.find({"_id": {"$in": [ObjectId(doc["db_ID"]) for doc in batch]}}, {"Content": 1})
+        }
+        for doc in batch:
+            yield contents.get(doc["db_ID"]) or doc["search_content"]
+
+
+def encode_varints(values):
+    """LEB128 encoding of non-negative integers: 7 bits per byte, high bit set on all but the last byte."""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        n_bytes += rest > 0
+        rest >>= np.uint64(7)
+
+    encoded = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    starts = np.cumsum(n_bytes) - n_bytes
+    for k in range(int(n_bytes.max(initial=0))):
+        selected = n_bytes > k
+        low_bits = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (n_bytes[selected] - 1 > k).astype(np.uint64) << np.uint64(7)
+        encoded[starts[selected] + k] = (low_bits | more).astype(np.uint8)
+    return encoded, n_bytes
+
+
+def decode_varints(encoded):
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if not len(encoded):
+        return np.array([], dtype=np.int64)
+    is_last = encoded < 0x80
+    value_index = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    shifts = 7 * (np.arange(len(encoded)) - value_starts[value_index])
+    # Posting values stay far below 2**53, so float64 sums are exact
+    weights = (encoded & 0x7F).astype(np.float64) * np.exp2(shifts)
+    return np.bincount(value_index, weights=weights).astype(np.int64)
+
+
+def _encode_postings(term_ids, passage_ids, frequencies, last_passage):
+    """
+    Encodes postings sorted by (term, passage) as varints of (gap, frequency) pairs. Each term's
+    first gap is taken from `last_passage`, the last passage already encoded for it (-1 if none),
+    so postings of later passages can be appended to it.
+
+    Returns:
+        tuple: (encoded bytes, encoded size of each term).
+    """
+    previous = np.empty(len(passage_ids), dtype=np.int64)
+    previous[1:] = passage_ids[:-1]
+    first = np.ones(len(term_ids), dtype=bool)
+    first[1:] = term_ids[1:] != term_ids[:-1]
+    previous[first] = last_passage[term_ids[first]]
+
+    pairs = np.empty(2 * len(passage_ids), dtype=np.int64)
+    pairs[0::2] = passage_ids - previous
+    pairs[1::2] = frequencies
+    encoded, n_bytes = encode_varints(pairs)
+    sizes = np.bincount(term_ids, weights=n_bytes[0::2] + n_bytes[1::2], minlength=len(last_passage)).astype(np.int64)
+    return encoded, sizes
+
+
+class PassageRetriever:
+    """
+    BM25 over article-sized passages of the full 'dados.Content', returning each document with
+    the score of its best passage.
+
+    Passage texts are not kept. The index holds, for each term, the gaps between the ids of the
+    passages containing it interleaved with the term frequencies, as one varint byte array, plus
+    a passage -> document map and passage lengths. New documents are appended without re-reading
+    the others; removed ones are masked until the index is rebuilt.
+    """
+
+    def __init__(self, collection_dados=None, model_file="./IR/models/passage_index.pkl", k1=1.2, b=0.75):
+        self.collection_dados = collection_dados
+        self.model_file = model_file
+        self.k1 = k1
+        self.b = b
+        # term -> term id; None until the index is built or loaded
+        self.model = None
+        self.documents = None
+        self.alive = None
+        self.postings = None
+        self.term_offsets = None
+        self.document_frequencies = None
+        self.last_passage = None
+        self.passage_doc = None
+        self.passage_lengths = None
+
+    def _index_passages(self, documents, contents, first_row):
+        """Splits and counts the passages of `documents`. Returns their postings, document rows and lengths."""
+        term_ids, passage_ids, frequencies, passage_doc, passage_lengths = [], [], [], [], []
+        passage_id = 0 if self.passage_doc is None else len(self.passage_doc)
+        for row, content in enumerate(contents, start=first_row):
+            for tokens in split_passages(content):
+                ids = np.fromiter((self.model.setdefault(token, len(self.model)) for token in tokens), dtype=np.int64, count=len(tokens))
+                unique_ids, counts = np.unique(ids, return_counts=True)
+                term_ids.append(unique_ids)
+                frequencies.append(counts)
+                passage_ids.append(np.full(len(unique_ids), passage_id, dtype=np.int64))
+                passage_doc.append(row)
+                passage_lengths.append(len(tokens))
+                passage_id += 1
+
+        if not term_ids:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, empty, np.array([], dtype=np.int32), np.array([], dtype=np.uint16)
+        term_ids, passage_ids, frequencies = np.concatenate(term_ids), np.concatenate(passage_ids), np.concatenate(frequencies)
+        order = np.lexsort((passage_ids, term_ids))
+        return (term_ids[order], passage_ids[order], frequencies[order],
+                np.array(passage_doc, dtype=np.int32), np.array(passage_lengths, dtype=np.uint16))
+
+    def build_model(self, documents, contents=None):
+        """
+        Builds the index over `contents` (by default the 'Content' of each document in 'dados').
+        """
+        start = time.perf_counter()
+        self.model = {}
+        self.documents = []
+        self.alive = np.array([], dtype=bool)
+        self.postings = np.array([], dtype=np.uint8)
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.document_frequencies = np.array([], dtype=np.int64)
+        self.last_passage = np.array([], dtype=np.int64)
+        self.passage_doc = None
+        self.passage_lengths = np.array([], dtype=np.uint16)
+        self.add_documents(documents, contents)
+        print(f"[Passage] Indexed {len(self.passage_doc)} passages of {len(documents)} documents "
+              f"({self.postings.nbytes / 2**20:.1f}MB of postings) in {time.perf_counter() - start:.1f}s.")
+
+    def add_documents(self, documents, contents=None):
+        """Appends documents; their passages get the next passage ids, so existing postings are only extended."""
+        contents = contents if contents is not None else iter_contents(self.collection_dados, documents)
+        term_ids, passage_ids, frequencies, passage_doc, passage_lengths = self._index_passages(documents, contents, len(self.documents))
+
+        n_terms = len(self.model)
+        last_passage = np.full(n_terms, -1, dtype=np.int64)
+        last_passage[:len(self.last_passage)] = self.last_passage
+        encoded, new_sizes = _encode_postings(term_ids, passage_ids, frequencies, last_passage)
+
+        # Each term's new postings go right after its existing ones
+        old_sizes = np.zeros(n_terms, dtype=np.int64)
+        old_sizes[:len(self.term_offsets) - 1] = np.diff(self.term_offsets)
+        offsets = np.concatenate(([0], np.cumsum(old_sizes + new_sizes)))
+        postings = np.empty(offsets[-1], dtype=np.uint8)
+        old_starts = np.repeat(offsets[:-1] - np.pad(self.term_offsets[:-1], (0, n_terms - len(self.term_offsets) + 1)), old_sizes)
+        postings[np.arange(len(self.postings)) + old_starts] = self.postings
+        new_starts = np.repeat(offsets[:-1] + old_sizes - np.concatenate(([0], np.cumsum(new_sizes)[:-1])), new_sizes)
+        postings[np.arange(len(encoded)) + new_starts] = encoded
+
+        self.postings = postings
+        self.term_offsets = offsets
+        self.document_frequencies = np.pad(self.document_frequencies, (0, n_terms - len(self.document_frequencies))) + np.bincount(term_ids, minlength=n_terms)
+        if len(term_ids):
+            # Postings are sorted by (term, passage), so the last entry of each term is its last passage
+            is_last = np.ones(len(term_ids), dtype=bool)
+            is_last[:-1] = term_ids[1:] != term_ids[:-1]
+            last_passage[term_ids[is_last]] = passage_ids[is_last]
+        self.last_passage = last_passage
+        self.passage_doc = passage_doc if self.passage_doc is None else np.concatenate([self.passage_doc, passage_doc])
+        self.passage_lengths = np.concatenate([self.passage_lengths, passage_lengths])
+        self.documents.extend(documents)
+        self.alive = np.concatenate([self.alive, np.ones(len(documents), dtype=bool)])
+
+    def update_model(self, documents, rebuild_ratio=0.2):
+        """
+        Brings the index up to date with `documents`, the whole current corpus: new documents are
+        appended and missing ones masked. A document whose 'content_hash' changed (its page was
+        re-crawled under the same id) is masked and appended again. Once more than
+        `rebuild_ratio` of the indexed documents are masked, the index is rebuilt.
+
+        Returns:
+            str: 'built', 'rebuilt', 'updated' or 'unchanged'.
+        """
+        if self.model is None:
+            self.build_model(documents)
+            return "built"
+
+        current = {doc["id"]: doc.get("content_hash") for doc in documents}
+        indexed = {doc["id"]: row for row, doc in enumerate(self.documents) if self.alive[row]}
+        removed = [
+            row for doc_id, row in indexed.items()
+            if doc_id not in current or self.documents[row].get("content_hash") != current[doc_id]
+        ]
+        stale = set(removed)
+        new_documents = [doc for doc in documents if doc["id"] not in indexed or indexed[doc["id"]] in stale]
+        if not new_documents and not removed:
+            return "unchanged"
+
+        self.alive[removed] = False
+        if (~self.alive).sum() > rebuild_ratio * len(self.alive):
+            self.build_model(documents)
+            return "rebuilt"
+        if new_documents:
+            self.add_documents(new_documents)
+        print(f"[Passage] Added {len(new_documents)} new or changed documents, removed {len(removed)}.")
+        return "updated"
+
+    def _term_postings(self, term_id):
+        values = decode_varints(self.postings[self.term_offsets[term_id]:self.term_offsets[term_id + 1]])
+        return np.cumsum(values[0::2]) - 1, values[1::2]
+
+    def calculate_similarities(self, search_terms, top_n, row_mask=None):
+        """
+        Scores every passage containing a query token with BM25 and each document with its best
+        passage. Rows outside `row_mask` (a boolean array over `self.documents`) are excluded.
+        Scores are divided by the best one, so the top document scores 1.
+        """
+        if self.model is None or not self.documents:
+            print("Model is not built or loaded.")
+            return []
+
+        query_tokens = dict.fromkeys(token for term in search_terms for token in tokenize(term))
+        term_ids = [self.model[token] for token in query_tokens if token in self.model]
+        if not term_ids:
+            return []
+
+        n_passages = len(self.passage_doc)
+        average_length = self.passage_lengths.mean()
+        passage_scores = np.zeros(n_passages, dtype=np.float32)
+        for term_id in term_ids:
+            passages, frequencies = self._term_postings(term_id)
+            document_frequency = self.document_frequencies[term_id]
+            idf = np.log(1 + (n_passages - document_frequency + 0.5) / (document_frequency + 0.5))
+            length_norm = 1 - self.b + self.b * self.passage_lengths[passages] / average_length
+            passage_scores[passages] += idf * frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm)
+
+        matched = np.flatnonzero(passage_scores)
+        document_scores = np.zeros(len(self.documents), dtype=np.float32)
+        np.maximum.at(document_scores, self.passage_doc[matched], passage_scores[matched])
+        allowed = self.alive if row_mask is None else self.alive & row_mask
+        document_scores[~allowed] = 0
+
+        candidates = np.flatnonzero(document_scores)
+        if not len(candidates):
+            return []
+        top = candidates[np.argsort(-document_scores[candidates], kind="stable")[:top_n]]
+        best_score = float(document_scores[top[0]])
+        return [
+            {
+                "id": self.documents[row]["id"],
+                "db_ID": self.documents[row]["db_ID"],
+                "text": self.documents[row]["search_content"],
+                "similarity_score": float(document_scores[row]) / best_score,
+                "terms": search_terms
+            }
+            for row in top
+        ]
+
+    def find_most_similar(self, search_terms, top_n, row_mask=None):
+        """Finds the documents with the best matching passages, among the rows of `row_mask` when given."""
+        query_results = self.calculate_similarities(search_terms, top_n, row_mask)
+
+        print("Results obtained for Passage.")
+
+        output_file = "IR_analysis/parl_europeu" #IR/results
+        file_handler = JSONFileHandler(f"{output_file}/passage_results.json")
+        file_handler.delete_results()
+        file_handler.save_results(results=query_results)
+
+        return query_results
+
+    def memory_usage(self):
+        """Bytes held by the index arrays, the vocabulary dict (with its keys and values) and the document list."""
+        arrays = (self.postings, self.term_offsets, self.document_frequencies, self.last_passage, self.passage_doc, self.passage_lengths, self.alive)
+        vocabulary = self.model or {}
+        documents = self.documents or []
+        return {
+            "arrays": sum(array.nbytes for array in arrays if array is not None),
+            "vocabulary": sys.getsizeof(vocabulary) + sum(sys.getsizeof(term) + sys.getsizeof(term_id) for term, term_id in vocabulary.items()),
+            "documents": sys.getsizeof(documents) + sum(
+                sys.getsizeof(doc) + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in doc.items())
+                for doc in documents
+            )
+        }
+
+    def index_size(self):
+        """Total bytes of `memory_usage`."""
+        return sum(self.memory_usage().values())
+
+    def save_model(self):
+        try:
+            os.makedirs(os.path.dirname(self.model_file), exist_ok=True)
+            state = {
+                "vocabulary": self.model,
+                "documents": self.documents,
+                "alive": self.alive,
+                "postings": self.postings,
+                "term_offsets": self.term_offsets,
+                "document_frequencies": self.document_frequencies,
+                "last_passage": self.last_passage,
+                "passage_doc": self.passage_doc,
+                "passage_lengths": self.passage_lengths
+            }
+            joblib.dump(state, self.model_file)
+            print(f"Model saved to {self.model_file}.")
+        except Exception as e:
+            print(f"Error saving model: {e}")
+
+    def load_model(self):
+        if not os.path.exists(self.model_file):
+            print(f"Model file {self.model_file} does not exist. A new model will be created.")
+            return
+        try:
+            state = joblib.load(self.model_file)
+            self.model = state["vocabulary"]
+            self.documents = state["documents"]
+            self.alive = state["alive"]
+            self.postings = state["postings"]
+            self.term_offsets = state["term_offsets"]
+            self.document_frequencies = state["document_frequencies"]
+            self.last_passage = state["last_passage"]
+            self.passage_doc = state["passage_doc"]
+            self.passage_lengths = state["passage_lengths"]
+            print(f"Model and documents loaded from {self.model_file}.")
+        except Exception as e:
+            print(f"Error loading model: {e}")
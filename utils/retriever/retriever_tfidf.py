@@ -1,30 +1,168 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from utils.json_file_handler import JSONFileHandler
 from collections import defaultdict
+import scipy.sparse as sp
+import numpy as np
 import joblib
 import os
 
+# Columns of the hashed term space; collisions are negligible at this size for 'Sumario' texts
+N_FEATURES = 2 ** 20
+
+
+def _scale_columns(matrix, weights):
+    """Multiplies each stored value of a CSR matrix by the weight of its column, touching only the nonzeros."""
+    scaled = matrix.copy()
+    scaled.data *= weights[scaled.indices]
+    return scaled
+
+
 class TfidfRetriever:
-    def __init__(self, model_file="./IR/models/tfidf_model.pkl"):
+    """
+    TF-IDF over hashed term counts.
+
+    The vocabulary is a fixed hashing space, so documents can be appended without refitting:
+    their counts are stacked onto the count matrix, document frequencies are updated, and IDF
+    (smoothed, as in TfidfVectorizer) is recomputed from the stored counts. Replaced or removed
+    documents are masked until `compact` drops their rows.
+    """
+
+    def __init__(self, model_file="./IR/models/tfidf_model.pkl", n_features=N_FEATURES):
         self.model_file = model_file
+        self.n_features = n_features
         self.model = None
         self.tfidf_matrix = None
         self.documents = None
         self.corpus = None
+        self.counts = None
+        self.document_frequencies = None
+        self.alive = None
+        self.row_by_id = {}
+
+    def _vectorizer(self):
+        # Same tokenization as TfidfVectorizer; raw counts, weighted later with the current IDF
+        return HashingVectorizer(n_features=self.n_features, alternate_sign=False, norm=None)
 
     def build_model(self, documents):
         """Builds the TF-IDF model using the provided documents."""
-        self.documents = documents
-        self.corpus = [doc["search_content"] for doc in documents]
-        self.model = TfidfVectorizer()
-        self.tfidf_matrix = self.model.fit_transform(self.corpus)
+        self.model = self._vectorizer()
+        self.documents = []
+        self.counts = sp.csr_matrix((0, self.n_features), dtype=np.float64)
+        self.document_frequencies = np.zeros(self.n_features, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_by_id = {}
+        self.add_documents(documents)
+
+    def add_documents(self, documents):
+        """Vectorizes only `documents` and stacks them onto the index; documents already indexed are replaced."""
+        if not documents:
+            return
+        self._remove_rows([self.row_by_id[doc["id"]] for doc in documents if doc["id"] in self.row_by_id])
+
+        new_counts = self.model.transform([doc["search_content"] for doc in documents])
+        first_row = len(self.documents)
+        self.counts = sp.vstack([self.counts, new_counts], format="csr")
+        # Each row holds a term at most once, so counting column occurrences gives document frequencies
+        self.document_frequencies += np.bincount(new_counts.indices, minlength=self.n_features)
+        self.alive = np.concatenate([self.alive, np.ones(len(documents), dtype=bool)])
+        self.documents.extend(documents)
+        for offset, doc in enumerate(documents):
+            self.row_by_id[doc["id"]] = first_row + offset
+        self._reweight()
+
+    def remove_documents(self, doc_ids):
+        self._remove_rows([self.row_by_id[doc_id] for doc_id in doc_ids if doc_id in self.row_by_id])
+        self._reweight()
+
+    def _remove_rows(self, rows):
+        for row in rows:
+            if not self.alive[row]:
+                continue
+            self.alive[row] = False
+            self.document_frequencies[self.counts.indices[self.counts.indptr[row]:self.counts.indptr[row + 1]]] -= 1
+            self.row_by_id.pop(self.documents[row]["id"], None)
+
+    def _reweight(self):
+        """Recomputes IDF from the stored counts and re-weights the matrix, without re-tokenizing any document."""
+        self._apply_idf(self.document_frequencies, int(self.alive.sum()))
+
+    def _apply_idf(self, document_frequencies, n_documents):
+        self.idf = np.log((1 + n_documents) / (1 + document_frequencies)) + 1
+        weighted = _scale_columns(self.counts, self.idf)
+        if not self.alive.all():
+            # Dead rows are zeroed, value by value
+            weighted.data *= np.repeat(self.alive, np.diff(weighted.indptr))
+        self.tfidf_matrix = normalize(weighted)
+
+    def corpus_statistics(self):
+        """Returns (document frequencies, number of documents) of the live rows."""
+        return self.document_frequencies, int(self.alive.sum())
+
+    def set_corpus_statistics(self, document_frequencies, n_documents):
+        """
+        Re-weights the matrix with IDF from statistics of a larger corpus. A shard weighted with
+        corpus-wide statistics gives the same scores as the unsharded index.
+        """
+        self._apply_idf(document_frequencies, n_documents)
+
+    def compact(self):
+        """Drops the rows of replaced or removed documents."""
+        keep = np.flatnonzero(self.alive)
+        self.counts = self.counts[keep]
+        self.documents = [self.documents[row] for row in keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.row_by_id = {doc["id"]: row for row, doc in enumerate(self.documents)}
+        self._reweight()
+        print(f"[TF-IDF] Compacted index to {len(keep)} documents.")
+
+    def update_model(self, documents, compact_ratio=0.1):
+        """
+        Brings the index up to date with `documents`, the whole current corpus: new or changed
+        documents are appended and missing ones removed. The index is compacted once more than
+        `compact_ratio` of its rows are dead.
+
+        Returns:
+            str: 'built', 'updated' or 'unchanged'.
+        """
+        if self.model is None:
+            self.build_model(documents)
+            return "built"
+
+        current_ids = {doc["id"] for doc in documents}
+        changed = [
+            doc for doc in documents
+            if doc["id"] not in self.row_by_id or self.documents[self.row_by_id[doc["id"]]]["search_content"] != doc["search_content"]
+        ]
+        removed = [doc_id for doc_id in self.row_by_id if doc_id not in current_ids]
+        if not changed and not removed:
+            return "unchanged"
+
+        self._remove_rows([self.row_by_id[doc_id] for doc_id in removed])
+        self.add_documents(changed)
+        if not changed:
+            self._reweight()
+        print(f"[TF-IDF] Indexed {len(changed)} new or changed documents, removed {len(removed)}.")
+
+        if len(self.alive) and 1 - self.alive.mean() > compact_ratio:
+            self.compact()
+        return "updated"
 
     def save_model(self):
-        """Saves the TF-IDF model and associated data to a file."""
+        """Saves the term counts, document frequencies and documents to a file."""
         try:
             os.makedirs(os.path.dirname(self.model_file), exist_ok=True)
-            joblib.dump((self.model, self.tfidf_matrix, self.documents), self.model_file)
+            # Most of the hashed columns are never used, so only the nonzero frequencies are stored
+            terms = np.flatnonzero(self.document_frequencies)
+            joblib.dump({
+                "n_features": self.n_features,
+                "counts": self.counts,
+                "document_frequency_terms": terms,
+                "document_frequency_values": self.document_frequencies[terms],
+                "alive": self.alive,
+                "documents": self.documents
+            }, self.model_file)
             print(f"Model saved to {self.model_file}.")
         except Exception as e:
             print(f"Error saving model: {e}")
@@ -36,19 +174,50 @@ class TfidfRetriever:
             return
         else:
             try:
-                self.model, self.tfidf_matrix, self.documents = joblib.load(self.model_file)
+                state = joblib.load(self.model_file)
+                if not isinstance(state, dict):
+                    # Fitted TfidfVectorizer from before the hashed index; leaving the model unset rebuilds it
+                    print(f"Model file {self.model_file} uses an old format. A new model will be created.")
+                    return
+                self.n_features = state["n_features"]
+                self.counts = state["counts"]
+                if "document_frequencies" in state:
+                    self.document_frequencies = state["document_frequencies"]
+                else:
+                    self.document_frequencies = np.zeros(self.n_features, dtype=np.int64)
+                    self.document_frequencies[state["document_frequency_terms"]] = state["document_frequency_values"]
+                self.alive = state["alive"]
+                self.documents = state["documents"]
+                self.row_by_id = {doc["id"]: row for row, doc in enumerate(self.documents) if self.alive[row]}
+                self.model = self._vectorizer()
+                self._reweight()
                 print(f"Model and documents loaded from {self.model_file}.")
             except Exception as e:
                 print(f"Error loading model: {e}")
 
-    def calculate_similarities(self, query_vector, top_n, search_terms):
-        """Calculates similarities between the query vector and the TF-IDF matrix."""
+    def calculate_similarities(self, query_vector, top_n, search_terms, row_mask=None):
+        """
+        Calculates similarities between the query vector and the TF-IDF matrix. Rows outside
+        `row_mask` (a boolean array over `self.documents`) are excluded before the top-n selection.
+        """
         if self.tfidf_matrix is None or self.documents is None:
             print("Model is not built or loaded.")
             return []
 
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix)[0]
-        top_indices = similarities.argsort()[-top_n:][::-1]
+        if row_mask is None:
+            similarities = cosine_similarity(query_vector, self.tfidf_matrix)[0]
+            # Rows of replaced or removed documents are never returned
+            similarities[~self.alive] = -1
+            top_indices = [idx for idx in similarities.argsort()[-top_n:][::-1] if self.alive[idx]]
+        else:
+            # Only the selected rows of the matrix are scored, so a filter cuts the scoring cost proportionally
+            rows = np.flatnonzero(self.alive & row_mask)
+            if not len(rows):
+                return []
+            row_similarities = cosine_similarity(query_vector, self.tfidf_matrix[rows])[0]
+            top = row_similarities.argsort()[-top_n:][::-1]
+            top_indices = rows[top]
+            similarities = dict(zip(top_indices, row_similarities[top]))
         return [
             {
                 "id": self.documents[idx]["id"],
@@ -104,19 +273,20 @@ class TfidfRetriever:
         balanced.sort(key=lambda x: x["similarity_score"], reverse=True)
         return balanced
 
-    def find_most_similar(self, search_terms, top_n):
-        """Finds the most similar documents for the given search terms."""
+    def query_vector(self, search_terms):
+        full_query = " ".join(search_terms)
+        full_query = " ".join(dict.fromkeys(full_query.split()))
+        return normalize(_scale_columns(self.model.transform([full_query]), self.idf))
+
+    def find_most_similar(self, search_terms, top_n, row_mask=None):
+        """Finds the most similar documents for the given search terms, among the rows of `row_mask` when given."""
         self.n_terms = len(search_terms)
 
         if self.model is None or self.tfidf_matrix is None or self.documents is None:
             print("Model is not built or loaded.")
             return []
 
-        full_query = " ".join(search_terms)
-        full_query = " ".join(dict.fromkeys(full_query.split()))
-
-        query_vector = self.model.transform([full_query])
-        query_results = self.calculate_similarities(query_vector, top_n, search_terms)
+        query_results = self.calculate_similarities(self.query_vector(search_terms), top_n, search_terms, row_mask)
 
         #query_results = self._balance_results(full_results)
 
@@ -8,8 +8,8 @@ import numpy as np
 import os
 
 class WikiWord2VecRetriever:
-    def __init__(self, model_file="./IR/models/model_300_20_sg.wv"):
-        self.nlp = spacy.load("pt_core_news_md")
+    def __init__(self, model_file="./IR/models/model_300_20_sg.wv", nlp=None):
+        self.nlp = nlp if nlp is not None else spacy.load("pt_core_news_md")
         self.model_file = model_file
         self.model = None
         self.documents = None
@@ -110,7 +110,7 @@ class WikiWord2VecRetriever:
         balanced.sort(key=lambda x: x["similarity_score"], reverse=True)
         return balanced
 
-    def calculate_similarity_for_query(self, query_text, top_n):
+    def calculate_similarity_for_query(self, query_text, top_n, row_mask=None):
         if self.model is None or not self.document_vectors:
             print("Model or document vectors not initialized.")
             return []
@@ -123,15 +123,22 @@ class WikiWord2VecRetriever:
         query_vector = np.mean(valid_tokens, axis=0).reshape(1, -1)
         query_vector = normalize(query_vector)
 
-        doc_ids = list(self.document_vectors.keys())
+        if row_mask is None:
+            doc_ids = list(self.document_vectors.keys())
+        else:
+            # `row_mask` is aligned with self.documents
+            doc_ids = [doc["id"] for doc, keep in zip(self.documents, row_mask) if keep and doc["id"] in self.document_vectors]
+            if not doc_ids:
+                return []
         doc_matrix = np.array([self.document_vectors[doc_id] for doc_id in doc_ids])
         doc_matrix = normalize(doc_matrix)
 
         similarity_scores = cosine_similarity(query_vector, doc_matrix)[0]
 
+        documents_by_id = {doc["id"]: doc for doc in self.documents}
         similarities = []
         for i, score in enumerate(similarity_scores):
-            doc = next(doc for doc in self.documents if doc["id"] == doc_ids[i])
+            doc = documents_by_id[doc_ids[i]]
             similarities.append({
                 "id": doc["id"],
                 "db_ID": doc["db_ID"],
@@ -143,7 +150,7 @@ class WikiWord2VecRetriever:
         return sorted(similarities, key=lambda x: x["similarity_score"], reverse=True)[:top_n]
 
 
-    def find_most_similar(self, search_terms, documents, top_n):
+    def find_most_similar(self, search_terms, documents, top_n, row_mask=None):
         self.n_terms = len(search_terms)
         self.documents = documents
 
@@ -156,7 +163,7 @@ class WikiWord2VecRetriever:
         full_query = " ".join(search_terms)
         full_query = " ".join(dict.fromkeys(full_query.split()))
 
-        results = self.calculate_similarity_for_query(full_query, top_n)
+        results = self.calculate_similarity_for_query(full_query, top_n, row_mask)
                 
 
         #balanced = self._balance_results(query_results)
@@ -3,52 +3,237 @@ from sklearn.preprocessing import normalize
 from utils.json_file_handler import JSONFileHandler
 from collections import defaultdict
 from gensim.models import Word2Vec
+from datetime import datetime
 import spacy
+import time
 import os
 import numpy as np
 import logging
 
+# Below this many documents, starting tokenizer processes costs more than it saves
+MIN_DOCS_PER_PROCESS = 5000
+
 class Word2VecRetriever:
-    def __init__(self, model_file="./IR/models/word2vec_model.model"):
-        self.nlp = spacy.load("pt_core_news_md")
+    def __init__(self, model_file="./IR/models/word2vec_model.model", nlp=None):
+        self.nlp = nlp if nlp is not None else spacy.load("pt_core_news_md")
         self.model_file = model_file
         self.model = None
         self.documents = None
         self.corpus = None
+        base_file = os.path.splitext(model_file)[0]
+        # Tokenized corpus in gensim's LineSentence format: one document per line
+        self.corpus_file = f"{base_file}_corpus.txt"
+        # Document matrix and the ids of its rows, saved with the model
+        self.vectors_file = f"{base_file}_doc_vectors.npy"
+        self.ids_file = f"{base_file}_doc_ids.npy"
+        # 'content_hash' of each row's document when its vector was computed ("" when unknown)
+        self.hashes_file = f"{base_file}_doc_hashes.npy"
+        self.meta_file = f"{base_file}_meta.json"
+        self.meta = {}
         self.document_vectors = {}
+        self.document_hashes = {}
+
+    @staticmethod
+    def _keep(token):
+        return token.is_alpha and not token.is_stop
 
     def _tokenize(self, text):
-        """Tokenizes text using spaCy's Portuguese model."""
-        doc = self.nlp(text.lower())
-        return [token.text for token in doc if token.is_alpha and not token.is_stop]
+        """Tokenizes text using spaCy's Portuguese tokenizer (is_alpha and is_stop need no pipeline component)."""
+        doc = self.nlp.make_doc(text.lower())
+        return [token.text for token in doc if self._keep(token)]
 
-    def build_model(self, documents, vector_size=25, window=3, min_count=1, workers=4):
+    def iter_tokenized(self, texts, batch_size=1000, n_process=None):
+        """
+        Tokenizes texts in batches with `nlp.pipe`, across `n_process` processes (by default all
+        CPUs for large corpora), yielding one token list per text in order.
+        """
+        texts = [text.lower() for text in texts]
+        if n_process is None:
+            n_process = min(os.cpu_count() or 1, max(1, len(texts) // MIN_DOCS_PER_PROCESS))
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=self.nlp.pipe_names):
+            yield [token.text for token in doc if self._keep(token)]
+
+    def write_corpus_file(self, texts, batch_size=1000, n_process=None):
+        """Streams the tokenized texts to `self.corpus_file`. Returns the number of tokens written."""
+        os.makedirs(os.path.dirname(self.corpus_file) or ".", exist_ok=True)
+        n_tokens = 0
+        with open(self.corpus_file, "w", encoding="utf-8") as file:
+            for tokens in self.iter_tokenized(texts, batch_size, n_process):
+                file.write(" ".join(tokens) + "\n")
+                n_tokens += len(tokens)
+        return n_tokens
+
+    def append_corpus_file(self, tokenized_documents):
+        with open(self.corpus_file, "a", encoding="utf-8") as file:
+            for tokens in tokenized_documents:
+                file.write(" ".join(tokens) + "\n")
+
+    def iter_corpus_file(self):
+        with open(self.corpus_file, "r", encoding="utf-8") as file:
+            for line in file:
+                yield line.split()
+
+    def build_model(self, documents, vector_size=25, window=3, min_count=1, workers=None, epochs=20):
+        """
+        Tokenizes the documents once into `self.corpus_file` and trains from that file, which lets
+        gensim use every worker thread without the Python iterator becoming the bottleneck.
+        """
         logging.basicConfig(format="%(asctime)s : %(levelname)s : %(message)s", level=logging.INFO)
         self.documents = documents
         self.corpus = [doc["search_content"] for doc in documents]
-        tokenized_corpus = [self._tokenize(doc) for doc in self.corpus]
+        workers = workers or os.cpu_count() or 1
+
+        start = time.perf_counter()
+        n_tokens = self.write_corpus_file(self.corpus)
+        print(f"[Word2Vec] Tokenized {len(self.corpus)} documents ({n_tokens} tokens) in {time.perf_counter() - start:.1f}s.")
+
         self.model = Word2Vec(
-            sentences=tokenized_corpus,
             sg=0,
             vector_size=vector_size,
             min_count=min_count,
             workers=workers,
             window=window,
-            epochs=20,
+            epochs=epochs,
             compute_loss=True
         )
-        self._cache_document_vectors()
+        self.model.build_vocab(corpus_file=self.corpus_file)
 
-    def _cache_document_vectors(self):
-        """Precompute and store document vectors."""
+        start = time.perf_counter()
+        _, raw_words = self.model.train(
+            corpus_file=self.corpus_file,
+            total_words=self.model.corpus_total_words,
+            epochs=self.model.epochs,
+            compute_loss=True
+        )
+        elapsed = time.perf_counter() - start
+        print(f"[Word2Vec] Trained {self.model.epochs} epochs on {workers} workers in {elapsed:.1f}s "
+              f"({raw_words / elapsed if elapsed else 0:,.0f} words/s).")
+
+        self._cache_document_vectors(self.iter_corpus_file())
+        self.meta = {
+            "full_build": {"date": datetime.now().isoformat(), "n_documents": len(documents), "n_tokens": n_tokens},
+            "documents_since_full_build": 0,
+            "updates": []
+        }
+
+    def update_model(self, documents, full_retrain_threshold=0.2):
+        """
+        Brings a loaded model up to date with `documents`, the whole current corpus.
+
+        Only documents without a vector, or whose 'content_hash' changed since it was computed,
+        are tokenized; the vocabulary is extended with
+        build_vocab(update=True), training continues on those documents alone and their vectors
+        are appended to the document matrix. Once the documents added since the last full build
+        exceed `full_retrain_threshold` of that build, the model is rebuilt from scratch instead.
+
+        Returns:
+            str: 'built', 'rebuilt', 'updated' or 'unchanged'.
+        """
+        if self.model is None:
+            self.build_model(documents)
+            return "built"
+
+        known_vectors = self.document_vectors or self._load_persisted_vectors()
+        known_hashes = self.document_hashes or self._load_persisted_hashes()
+        new_documents = [doc for doc in documents if self._is_stale(doc, known_vectors, known_hashes)]
+        if not new_documents:
+            self.documents = documents
+            self.document_vectors = {doc["id"]: known_vectors[doc["id"]] for doc in documents}
+            self.document_hashes = {doc["id"]: doc.get("content_hash") or "" for doc in documents}
+            return "unchanged"
+
+        full_build_size = self.meta.get("full_build", {}).get("n_documents") or len(known_vectors)
+        since_full_build = self.meta.get("documents_since_full_build", 0) + len(new_documents)
+        if since_full_build > full_retrain_threshold * max(full_build_size, 1):
+            print(f"[Word2Vec] {since_full_build} documents added since the last full build, retraining from scratch...")
+            self.build_model(documents)
+            return "rebuilt"
+
+        start = time.perf_counter()
+        tokenized = list(self.iter_tokenized(doc["search_content"] for doc in new_documents))
+        vocab_size = len(self.model.wv)
+        self.model.build_vocab(tokenized, update=True)
+        self.model.train(tokenized, total_examples=len(tokenized), epochs=self.model.epochs, compute_loss=True)
+        if os.path.exists(self.corpus_file):
+            self.append_corpus_file(tokenized)
+
+        new_vectors = {doc["id"]: self._document_vector(tokens) for doc, tokens in zip(new_documents, tokenized)}
+        self.documents = documents
+        self.document_vectors = {doc["id"]: new_vectors.get(doc["id"], known_vectors.get(doc["id"])) for doc in documents}
+        self.document_hashes = {doc["id"]: doc.get("content_hash") or "" for doc in documents}
+
+        n_tokens = sum(len(tokens) for tokens in tokenized)
+        self.meta["documents_since_full_build"] = since_full_build
+        self.meta.setdefault("updates", []).append({
+            "date": datetime.now().isoformat(),
+            "n_documents": len(new_documents),
+            "n_tokens": n_tokens,
+            "new_words": len(self.model.wv) - vocab_size
+        })
+        print(f"[Word2Vec] Updated with {len(new_documents)} new or changed documents ({n_tokens} tokens, "
+              f"{len(self.model.wv) - vocab_size} new words) in {time.perf_counter() - start:.1f}s.")
+        return "updated"
+
+    @staticmethod
+    def _is_stale(doc, vectors, hashes):
+        """Whether the document has no vector, or one computed from content with another hash. Unknown hashes count as current."""
+        if doc["id"] not in vectors:
+            return True
+        return doc["id"] in hashes and hashes[doc["id"]] != (doc.get("content_hash") or "")
+
+    def _document_vector(self, tokens):
+        vectors = [self.model.wv[token] for token in tokens if token in self.model.wv]
+        return np.mean(vectors, axis=0) if vectors else np.zeros(self.model.vector_size)
+
+    def _cache_document_vectors(self, tokenized_documents=None):
+        """
+        Precompute and store document vectors, from already tokenized documents when given.
+        Otherwise vectors saved with the model are reused and only the missing documents are tokenized.
+        """
         if self.model is None or self.documents is None:
             return
-        self.document_vectors = {
-            doc["id"]: np.mean(
-                [self.model.wv[token] for token in self._tokenize(doc["search_content"]) if token in self.model.wv] or [np.zeros(self.model.vector_size)],
-                axis=0
-            ) for doc in self.documents
+        self.document_hashes = {doc["id"]: doc.get("content_hash") or "" for doc in self.documents}
+        if tokenized_documents is not None:
+            self.document_vectors = {
+                doc["id"]: self._document_vector(tokens) for doc, tokens in zip(self.documents, tokenized_documents)
+            }
+            return
+
+        persisted, persisted_hashes = self._load_persisted_vectors(), self._load_persisted_hashes()
+        missing = [doc for doc in self.documents if self._is_stale(doc, persisted, persisted_hashes)]
+        computed = {
+            doc["id"]: self._document_vector(tokens)
+            for doc, tokens in zip(missing, self.iter_tokenized(doc["search_content"] for doc in missing))
         }
+        self.document_vectors = {doc["id"]: computed.get(doc["id"], persisted.get(doc["id"])) for doc in self.documents}
+
+    def _load_persisted_vectors(self):
+        if not (os.path.exists(self.vectors_file) and os.path.exists(self.ids_file)):
+            return {}
+        try:
+            ids = np.load(self.ids_file)
+            vectors = np.load(self.vectors_file)
+            return dict(zip(ids.tolist(), vectors))
+        except Exception as e:
+            print(f"Error loading document vectors: {e}")
+            return {}
+
+    def _load_persisted_hashes(self):
+        if not (os.path.exists(self.hashes_file) and os.path.exists(self.ids_file)):
+            return {}
+        try:
+            return dict(zip(np.load(self.ids_file).tolist(), np.load(self.hashes_file).tolist()))
+        except Exception as e:
+            print(f"Error loading document hashes: {e}")
+            return {}
+
+    def _save_document_vectors(self):
+        if not self.document_vectors:
+            return
+        np.save(self.ids_file, np.array(list(self.document_vectors.keys())))
+        np.save(self.hashes_file, np.array([self.document_hashes.get(doc_id, "") for doc_id in self.document_vectors]))
+        np.save(self.vectors_file, np.vstack(list(self.document_vectors.values())).astype(np.float32))
+        JSONFileHandler(self.meta_file).save_results(self.meta)
 
     def model_evaluation(self, show_examples=True):
         if self.model is None or self.corpus is None:
@@ -61,7 +246,7 @@ class Word2VecRetriever:
             vocab_size = len(self.model.wv)
             print(f"Vocabulary Size: {vocab_size} tokens")
 
-            tokenized_corpus = [self._tokenize(doc) for doc in self.corpus]
+            tokenized_corpus = self.iter_corpus_file() if os.path.exists(self.corpus_file) else self.iter_tokenized(self.corpus)
             all_tokens = set(token for doc in tokenized_corpus for token in doc)
             in_vocab = [token for token in all_tokens if token in self.model.wv]
             coverage = len(in_vocab) / len(all_tokens) * 100 if all_tokens else 0
@@ -99,6 +284,7 @@ class Word2VecRetriever:
         try:
             os.makedirs(os.path.dirname(self.model_file), exist_ok=True)
             self.model.save(self.model_file)
+            self._save_document_vectors()
             print(f"Model saved to {self.model_file}.")
         except Exception as e:
             print(f"Error saving model: {e}")
@@ -109,6 +295,8 @@ class Word2VecRetriever:
             return
         try:
             self.model = Word2Vec.load(self.model_file)
+            if os.path.exists(self.meta_file):
+                self.meta = JSONFileHandler(self.meta_file).read_results() or {}
             print(f"Model loaded from {self.model_file}.")
             if self.documents:
                 self._cache_document_vectors()
@@ -147,7 +335,7 @@ class Word2VecRetriever:
 
         return sorted(similarities, key=lambda x: x["similarity_score"], reverse=True)[:top_n]
     
-    def calculate_similarity_for_query(self, query_text, top_n):
+    def calculate_similarity_for_query(self, query_text, top_n, row_mask=None):
         """
         Calculate cosine similarities between query vector and all document vectors.
         `query_text` is expected to be a string containing multiple terms.
@@ -164,15 +352,22 @@ class Word2VecRetriever:
         query_vector = np.mean(valid_tokens, axis=0).reshape(1, -1)
         query_vector = normalize(query_vector)
 
-        doc_ids = list(self.document_vectors.keys())
+        if row_mask is None:
+            doc_ids = list(self.document_vectors.keys())
+        else:
+            # `row_mask` is aligned with self.documents
+            doc_ids = [doc["id"] for doc, keep in zip(self.documents, row_mask) if keep and doc["id"] in self.document_vectors]
+            if not doc_ids:
+                return []
         doc_matrix = np.array([self.document_vectors[doc_id] for doc_id in doc_ids])
         doc_matrix = normalize(doc_matrix)
 
         similarity_scores = cosine_similarity(query_vector, doc_matrix)[0]
 
+        documents_by_id = {doc["id"]: doc for doc in self.documents}
         similarities = []
         for i, score in enumerate(similarity_scores):
-            doc = next(doc for doc in self.documents if doc["id"] == doc_ids[i])
+            doc = documents_by_id[doc_ids[i]]
             similarities.append({
                 "id": doc["id"],
                 "db_ID": doc["db_ID"],
@@ -223,7 +418,7 @@ class Word2VecRetriever:
         balanced.sort(key=lambda x: x["similarity_score"], reverse=True)
         return balanced
 
-    def find_most_similar(self, search_terms, documents, top_n):
+    def find_most_similar(self, search_terms, documents, top_n, row_mask=None):
         self.n_terms = len(search_terms)
         
         if self.documents is None:
@@ -242,7 +437,7 @@ class Word2VecRetriever:
 
         full_query = " ".join(search_terms)
         full_query = " ".join(dict.fromkeys(full_query.split()))
-        results = self.calculate_similarity_for_query(full_query, top_n)
+        results = self.calculate_similarity_for_query(full_query, top_n, row_mask)
 
         
         print("Results obtained for Word2Vec.")
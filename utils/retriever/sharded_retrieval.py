@@ -0,0 +1,283 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from itertools import islice
+from dotenv import load_dotenv
+import multiprocessing
+import threading
+import heapq
+import numpy as np
+import os
+
+from utils.retriever.model_type import ModelType
+from utils.retriever.retriever_tfidf import TfidfRetriever
+from utils.retriever.retriever_bm25 import BM25Retriever
+from utils.retriever.retriever_word2vec import Word2VecRetriever
+from utils.retriever.retriever_wiki_word2vec import WikiWord2VecRetriever
+
+load_dotenv()
+# Number of worker processes the corpus is split into; 0 or 1 keeps retrieval in the request thread
+IR_SHARDS = int(os.getenv("IR_SHARDS", "0"))
+# "rows" splits the corpus into contiguous row ranges, "TipoLegislacao" keeps each legislation type in one shard
+IR_SHARD_BY = os.getenv("IR_SHARD_BY", "rows")
+SHARD_MODEL_DIR = "./IR/models/shards"
+
+# Files the unsharded retrievers write their results to
+RESULT_FILES = {
+    ModelType.TF_IDF: "tfidf_results.json",
+    ModelType.BM25: "bm25_results.json",
+    ModelType.WORD2VEC: "word2vec_results.json",
+    ModelType.WIKI_WORD2VEC: "wiki_word2vec_results.json"
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# State of the shard held by a worker process
+_shard = {}
+
+
+def partition_rows(documents, n_shards, shard_by="rows"):
+    """
+    Splits the rows of `documents` into `n_shards` sorted row arrays.
+
+    With shard_by="rows" the shards are contiguous row ranges of equal size. Otherwise documents
+    are grouped by their `shard_by` field and whole groups are assigned, largest first, to the
+    smallest shard; shards can be empty when there are fewer groups than shards.
+    """
+    if shard_by == "rows":
+        return np.array_split(np.arange(len(documents)), n_shards)
+
+    groups = defaultdict(list)
+    for row, doc in enumerate(documents):
+        groups[doc.get(shard_by)].append(row)
+    shards = [[] for _ in range(n_shards)]
+    for rows in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(rows)
+    return [np.array(sorted(rows), dtype=np.int64) for rows in shards]
+
+
+def _document_versions(documents):
+    """(id, content hash) per row; a page re-crawled with new content keeps its id but not its hash."""
+    return [(doc["id"], doc.get("content_hash")) for doc in documents]
+
+
+def _full_query(search_terms):
+    return " ".join(dict.fromkeys(" ".join(search_terms).split()))
+
+
+def _init_shard(shard_id, documents, model_dir):
+    _shard.update(id=shard_id, documents=documents, model_dir=model_dir, retrievers={},
+                  row_by_id={doc["id"]: row for row, doc in enumerate(documents)})
+
+
+def _load_shard_retriever(model_type):
+    documents, model_dir = _shard["documents"], _shard["model_dir"]
+    if model_type == ModelType.TF_IDF:
+        retriever = TfidfRetriever(f"{model_dir}/tfidf_model.pkl")
+        retriever.load_model()
+        if retriever.update_model(documents) != "unchanged":
+            retriever.save_model()
+    elif model_type == ModelType.BM25:
+        retriever = BM25Retriever(f"{model_dir}/bm25_model.pkl")
+        retriever.load_model()
+        if retriever.model is None or retriever.documents != documents:
+            retriever.build_model(documents)
+            retriever.save_model()
+    elif model_type == ModelType.WORD2VEC:
+        # The model is trained on the whole corpus by the coordinator; a shard holds its document vectors only
+        retriever = Word2VecRetriever()
+        retriever.load_model()
+        retriever.documents = documents
+        retriever._cache_document_vectors()
+    elif model_type == ModelType.WIKI_WORD2VEC:
+        retriever = WikiWord2VecRetriever()
+        retriever.load_model()
+        retriever.documents = documents
+        retriever._cache_document_vectors()
+    else:
+        raise ValueError(f"Cannot handle model {model_type}")
+    return retriever
+
+
+def _shard_prepare(model_value):
+    """Loads (or builds) the shard's index for a model. Returns its corpus statistics, if the model has any."""
+    model_type = ModelType(model_value)
+    if model_type not in _shard["retrievers"]:
+        _shard["retrievers"][model_type] = _load_shard_retriever(model_type)
+        print(f"[Shard {_shard['id']}] {model_type.value} ready for {len(_shard['documents'])} documents.")
+    retriever = _shard["retrievers"][model_type]
+    return retriever.corpus_statistics() if hasattr(retriever, "corpus_statistics") else None
+
+
+def _shard_set_statistics(model_value, statistics):
+    _shard["retrievers"][ModelType(model_value)].set_corpus_statistics(*statistics)
+
+
+def _align_mask(retriever_documents, row_mask):
+    """Maps a mask over the shard's documents onto the rows of the retriever's own document list."""
+    if row_mask is None or retriever_documents is _shard["documents"]:
+        return row_mask
+    rows = np.fromiter((_shard["row_by_id"].get(doc["id"], -1) for doc in retriever_documents),
+                       dtype=np.int64, count=len(retriever_documents))
+    return (rows >= 0) & row_mask[rows]
+
+
+def _shard_search(model_value, search_terms, top_n, row_mask):
+    """
+    Returns the shard's top-n results, best first, and for BM25 the (min, max) of its raw
+    scores, which the coordinator needs to normalize scores across shards.
+    """
+    model_type = ModelType(model_value)
+    retriever = _shard["retrievers"][model_type]
+
+    if model_type == ModelType.TF_IDF:
+        row_mask = _align_mask(retriever.documents, row_mask)
+        return retriever.calculate_similarities(retriever.query_vector(search_terms), top_n, search_terms, row_mask), None
+
+    if model_type == ModelType.BM25:
+        rows, scores = retriever.score_rows(search_terms, _align_mask(retriever.documents, row_mask))
+        if not len(rows):
+            return [], None
+        top = np.argsort(-scores, kind="stable")[:top_n]
+        results = [
+            {
+                "id": retriever.documents[rows[i]]["id"],
+                "db_ID": retriever.documents[rows[i]]["db_ID"],
+                "text": retriever.documents[rows[i]]["search_content"],
+                "similarity_score": float(scores[i]),
+                "terms": search_terms
+            }
+            for i in top
+        ]
+        return results, (float(scores.min()), float(scores.max()))
+
+    # The Word2Vec retrievers hold the shard's documents in the shard's own order
+    return retriever.calculate_similarity_for_query(_full_query(search_terms), top_n, row_mask), None
+
+
+def _combine_statistics(model_type, statistics):
+    if model_type == ModelType.TF_IDF:
+        return sum(frequencies for frequencies, _ in statistics), sum(n for _, n in statistics)
+
+    document_frequencies = defaultdict(int)
+    for shard_frequencies, _, _ in statistics:
+        for word, count in shard_frequencies.items():
+            document_frequencies[word] += count
+    return dict(document_frequencies), sum(n for _, n, _ in statistics), sum(length for _, _, length in statistics)
+
+
+def merge_shard_results(shard_results, top_n, row_by_id):
+    """
+    Merges the best-first result lists of the shards with a heap, keeping the global top-n.
+    Equal scores are ordered by the documents' global rows (`row_by_id`), as the unsharded
+    retrievers order them, whichever shards they come from.
+
+    BM25 shards return raw scores and their (min, max); the merged scores are min-max normalized
+    over all shards, as the unsharded retriever normalizes over the whole corpus.
+    """
+    def key(result):
+        return -result["similarity_score"], row_by_id[result["id"]]
+
+    results = list(islice(heapq.merge(*(sorted(results, key=key) for results, _ in shard_results), key=key), top_n))
+
+    score_ranges = [score_range for _, score_range in shard_results if score_range is not None]
+    if score_ranges:
+        min_score = min(low for low, _ in score_ranges)
+        max_score = max(high for _, high in score_ranges)
+        for result in results:
+            score = result["similarity_score"]
+            result["similarity_score"] = 1.0 if max_score == min_score else (score - min_score) / (max_score - min_score)
+    return results
+
+
+class ShardPool:
+    """
+    One worker process per shard of the corpus, each holding the indexes of its shard only.
+
+    A query is scattered to every shard in parallel and the per-shard top-n lists are gathered
+    and merged. TF-IDF and BM25 shards are weighted with corpus-wide statistics, and the
+    Word2Vec shards share one model trained on the whole corpus, so merged scores match those
+    of the unsharded retrievers.
+
+    USAGE:
+    pool = ShardPool(documents, n_shards=4)
+    results = pool.find_most_similar(ModelType.BM25, search_terms, top_n=10)
+    """
+
+    def __init__(self, documents, n_shards, shard_by="rows", model_dir=SHARD_MODEL_DIR):
+        self.documents = documents
+        # In row order, since the shards' rows and the request masks depend on it
+        self.versions = _document_versions(documents)
+        self.row_by_id = {doc["id"]: row for row, doc in enumerate(documents)}
+        self.shard_rows = [rows for rows in partition_rows(documents, n_shards, shard_by) if len(rows)]
+        # spawn, since forking a process that runs request threads and MongoDB clients is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard,
+                initargs=(shard_id, [documents[row] for row in rows], f"{model_dir}/{shard_by}_{n_shards}/{shard_id}")
+            )
+            for shard_id, rows in enumerate(self.shard_rows)
+        ]
+        self.prepared = set()
+        self._lock = threading.Lock()
+        print(f"[ShardPool] Started {len(self.executors)} shards by {shard_by}: {[len(rows) for rows in self.shard_rows]} documents.")
+
+    def _scatter(self, function, shard_args):
+        futures = [executor.submit(function, *args) for executor, args in zip(self.executors, shard_args)]
+        return [future.result() for future in futures]
+
+    def prepare(self, model_type):
+        """Loads the shards' indexes for `model_type`, once per pool."""
+        model_type = ModelType(model_type)
+        with self._lock:
+            if model_type in self.prepared:
+                return
+            if model_type == ModelType.WORD2VEC:
+                # Training needs the whole corpus, so the shared model is brought up to date here first
+                retriever = Word2VecRetriever()
+                retriever.load_model()
+                if retriever.update_model(self.documents) != "unchanged":
+                    retriever.save_model()
+
+            statistics = self._scatter(_shard_prepare, [(model_type.value,)] * len(self.executors))
+            if statistics and statistics[0] is not None:
+                combined = _combine_statistics(model_type, statistics)
+                self._scatter(_shard_set_statistics, [(model_type.value, combined)] * len(self.executors))
+            self.prepared.add(model_type)
+
+    def find_most_similar(self, model_type, search_terms, top_n, row_mask=None):
+        """
+        Args:
+            row_mask (np.ndarray): Optional boolean mask over `self.documents`; only its rows are scored.
+        """
+        model_type = ModelType(model_type)
+        self.prepare(model_type)
+        shard_args = [
+            (model_type.value, search_terms, top_n, None if row_mask is None else row_mask[rows])
+            for rows in self.shard_rows
+        ]
+        return merge_shard_results(self._scatter(_shard_search, shard_args), top_n, self.row_by_id)
+
+    def shutdown(self):
+        # Requests already submitted still complete
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+
+
+def get_shard_pool(documents, n_shards=IR_SHARDS, shard_by=IR_SHARD_BY):
+    """
+    Starts the shard workers once per process, restarting them when a document is added, removed
+    or changed. Ids and content hashes are compared instead of the texts, which would be read in
+    full on every request.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (documents is _pool.documents or _pool.versions == _document_versions(documents)):
+            return _pool
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ShardPool(documents, n_shards, shard_by)
+    return _pool
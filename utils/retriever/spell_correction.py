@@ -0,0 +1,291 @@
+from collections import Counter
+from dotenv import load_dotenv
+import numpy as np
+import threading
+import joblib
+import time
+import zlib
+import os
+
+from utils.mongo_conn import connect_to_mongo
+from utils.retriever.retriever_passage import tokenize
+
+load_dotenv()
+SPELL_INDEX_FILE = "./IR/models/spell_index.pkl"
+# Largest edit distance corrected; 0 disables spelling correction
+SPELL_MAX_DISTANCE = int(os.getenv("IR_SPELL_MAX_DISTANCE", "2"))
+# Corpus words a misspelled term is expanded with (the most frequent at the smallest distance)
+SPELL_EXPANSIONS = int(os.getenv("IR_SPELL_EXPANSIONS", "1"))
+# Deletes are generated from the first characters only, which bounds the index size for long words
+PREFIX_LENGTH = 7
+LETTER_BUCKETS = 32
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def auto_distance(term, max_distance=SPELL_MAX_DISTANCE):
+    """Edit distance allowed for `term`, as Elasticsearch's "fuzziness": "AUTO": 0 up to 2 characters, 1 up to 5, then 2."""
+    allowed = 0 if len(term) <= 2 else 1 if len(term) <= 5 else 2
+    return min(allowed, max_distance)
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (an adjacent transposition is one edit), or max_distance + 1
+    as soon as it is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # The shared prefix and suffix do not change the distance
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < min(len(a), len(b)) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return min(max(len(a), len(b)), max_distance + 1)
+
+    # Only cells within max_distance of the diagonal can stay within max_distance
+    over = max_distance + 1
+    before_previous, previous = None, [j if j < over else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char = a[i - 1]
+        current = [over] * (len(b) + 1)
+        current[0] = row_min = i if i < over else over
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1] and before_previous[j - 2] + 1 < value:
+                value = before_previous[j - 2] + 1
+            if value > over:
+                value = over
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return over
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word, max_distance, prefix_length=PREFIX_LENGTH):
+    """The strings obtained by deleting up to `max_distance` characters of the word's prefix, the prefix included."""
+    frontier = {word[:prefix_length]}
+    variants = set(frontier)
+    for _ in range(max_distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier if len(variant) > 1 for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def letter_counts(word):
+    """Occurrences of the word's letters, in LETTER_BUCKETS buckets by code point."""
+    counts = np.zeros(LETTER_BUCKETS, dtype=np.uint8)
+    for char in word:
+        counts[ord(char) % LETTER_BUCKETS] += 1
+    return counts
+
+
+def _hashes(strings):
+    return np.fromiter((zlib.crc32(string.encode("utf-8")) for string in strings), dtype=np.uint32, count=len(strings))
+
+
+def vocabulary(documents):
+    """Occurrences of each word of the documents' 'search_content', tokenized as the retrievers do."""
+    counts = Counter()
+    for doc in documents:
+        counts.update(tokenize(doc["search_content"]))
+    return counts
+
+
+class SymmetricDeleteIndex:
+    """
+    Spelling correction of search terms against the corpus vocabulary (symmetric delete).
+
+    Every word is indexed under the strings obtained by deleting up to `max_distance` characters
+    of its prefix. A term within that edit distance of a word shares at least one delete with
+    it, so the candidates of a term are looked up from the term's own deletes instead of comparing
+    the term with the whole vocabulary; only those candidates are checked with a true edit
+    distance. Deletes are stored as a sorted array of 32-bit hashes next to the row of their word,
+    and hash collisions only add candidates that the check rejects.
+
+    USAGE:
+    index = get_spell_index()
+    index.correct("legislaçao")
+    """
+
+    def __init__(self, index_file=SPELL_INDEX_FILE, max_distance=SPELL_MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.index_file = index_file
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.row_by_word = {}
+        self.frequencies = np.array([], dtype=np.uint32)
+        self.letter_counts = np.zeros((0, LETTER_BUCKETS), dtype=np.uint8)
+        self.delete_hashes = np.array([], dtype=np.uint32)
+        self.delete_rows = np.array([], dtype=np.uint32)
+        # id -> 'content_hash' of the documents the vocabulary was built from
+        self.document_versions = {}
+
+    def build(self, word_counts):
+        """Builds the index from a {word: occurrences} mapping."""
+        start = time.perf_counter()
+        self.words = sorted(word_counts)
+        self.row_by_word = {word: row for row, word in enumerate(self.words)}
+        self.frequencies = np.array([word_counts[word] for word in self.words], dtype=np.uint32)
+        self.letter_counts = self._letter_counts(self.words)
+
+        hashes, rows = [], []
+        for row, word in enumerate(self.words):
+            word_hashes = _hashes(list(deletes(word, self.max_distance, self.prefix_length)))
+            hashes.append(word_hashes)
+            rows.append(np.full(len(word_hashes), row, dtype=np.uint32))
+        hashes = np.concatenate(hashes) if hashes else np.array([], dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        self.delete_hashes = hashes[order]
+        self.delete_rows = np.concatenate(rows)[order] if rows else np.array([], dtype=np.uint32)
+        print(f"[SpellIndex] Indexed {len(self.words)} words under {len(self.delete_hashes)} deletes "
+              f"in {time.perf_counter() - start:.1f}s.")
+
+    @staticmethod
+    def _letter_counts(words):
+        return np.array([letter_counts(word) for word in words], dtype=np.uint8).reshape(-1, LETTER_BUCKETS)
+
+    def lookup(self, term, max_distance=None):
+        """
+        The corpus words closest to `term`, within the edit distance allowed for it (see `auto_distance`).
+
+        Returns:
+            list[tuple[str, int, int]]: (word, distance, occurrences), all at the same distance, most frequent first.
+        """
+        if term in self.row_by_word:
+            return [(term, 0, int(self.frequencies[self.row_by_word[term]]))]
+        distance = auto_distance(term, self.max_distance if max_distance is None else min(max_distance, self.max_distance))
+        if not distance or not len(self.delete_hashes):
+            return []
+
+        hashes = _hashes(list(deletes(term, distance, self.prefix_length)))
+        lo = np.searchsorted(self.delete_hashes, hashes, side="left")
+        hi = np.searchsorted(self.delete_hashes, hashes, side="right")
+        # Positions of all the matching deletes, gathered at once rather than slice by slice
+        sizes = hi - lo
+        positions = np.repeat(lo - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        rows = np.unique(self.delete_rows[positions])
+        # An edit adds at most one letter and removes at most one, so the letters one word has in
+        # excess of the other bound the distance from below; most candidates are ruled out here
+        difference = self.letter_counts[rows].astype(np.int16) - letter_counts(term)
+        bounds = np.maximum(np.maximum(difference, 0).sum(axis=1), np.maximum(-difference, 0).sum(axis=1))
+        order = np.argsort(bounds, kind="stable")
+
+        matches = []
+        for row, bound in zip(rows[order], bounds[order]):
+            if bound > distance:
+                break
+            word_distance = edit_distance(term, self.words[row], distance)
+            if word_distance < distance:
+                # Only closer words are of interest from now on
+                distance, matches = word_distance, []
+            if word_distance <= distance:
+                matches.append((self.words[row], word_distance, int(self.frequencies[row])))
+        matches.sort(key=lambda match: (-match[2], match[0]))
+        return matches
+
+    def correct(self, term, max_distance=None, expansions=SPELL_EXPANSIONS):
+        """
+        The term itself when it is a corpus word or nothing is close to it; otherwise the
+        `expansions` most frequent of the closest corpus words.
+        """
+        matches = self.lookup(term, max_distance)
+        if not matches:
+            return [term]
+        return [word for word, _, _ in matches[:max(expansions, 1)]]
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            joblib.dump({
+                "max_distance": self.max_distance,
+                "prefix_length": self.prefix_length,
+                "words": self.words,
+                "frequencies": self.frequencies,
+                "delete_hashes": self.delete_hashes,
+                "delete_rows": self.delete_rows,
+                "document_versions": self.document_versions
+            }, self.index_file)
+            print(f"[SpellIndex] Index saved to {self.index_file}.")
+        except Exception as e:
+            print(f"[SpellIndex] Error saving index: {e}")
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            state = joblib.load(self.index_file)
+            self.max_distance = state["max_distance"]
+            self.prefix_length = state["prefix_length"]
+            self.words = state["words"]
+            self.frequencies = state["frequencies"]
+            self.delete_hashes = state["delete_hashes"]
+            self.delete_rows = state["delete_rows"]
+            # Indexes saved with ids only are rebuilt by the next refresh
+            self.document_versions = state.get("document_versions", {})
+            self.row_by_word = {word: row for row, word in enumerate(self.words)}
+            self.letter_counts = self._letter_counts(self.words)
+            return True
+        except Exception as e:
+            print(f"[SpellIndex] Error loading index: {e}")
+            return False
+
+
+def get_spell_index(index_file=SPELL_INDEX_FILE):
+    """Loads the saved index once per process; None until it has been built."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SymmetricDeleteIndex(index_file)
+                if index.load():
+                    _index = index
+    return _index
+
+
+def refresh_spell_index(documents, index_file=SPELL_INDEX_FILE, max_distance=SPELL_MAX_DISTANCE):
+    """
+    Rebuilds and saves the index from IR documents ('id', 'search_content', 'content_hash') when
+    documents were added, removed or changed since it was built, so words of newly ingested or
+    edited documents are never corrected away.
+    """
+    global _index
+    versions = {doc["id"]: doc.get("content_hash") for doc in documents}
+    index = get_spell_index(index_file)
+    if index is not None and index.document_versions == versions and index.max_distance == max_distance:
+        return index
+    with _index_lock:
+        if _index is None or _index.document_versions != versions or _index.max_distance != max_distance:
+            index = SymmetricDeleteIndex(index_file, max_distance)
+            index.build(vocabulary(documents))
+            index.document_versions = versions
+            index.save()
+            _index = index
+    return _index
+
+
+if __name__ == "__main__":
+    # Builds the index offline, so the server finds it at startup
+    client, db, collection_dados, collection_metadados = connect_to_mongo(os.getenv("MONGO_USER"), os.getenv("MONGO_PASSWORD"))
+    if client:
+        metadados = collection_metadados.find({}, {"_id": 1, "Titulo": 1, "Sumario": 1, "content_hash": 1})
+        refresh_spell_index([
+            {
+                "id": str(doc["_id"]),
+                "search_content": (doc.get("Sumario") or "").strip() or (doc.get("Titulo") or "").strip(),
+                "content_hash": doc.get("content_hash")
+            }
+            for doc in metadados
+        ])
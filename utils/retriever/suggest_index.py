@@ -0,0 +1,185 @@
+from spacy.lang.pt.stop_words import STOP_WORDS
+from collections import Counter
+from bisect import bisect_left
+import numpy as np
+import threading
+import joblib
+import time
+import os
+
+from utils.IR_direct_querying.IR_trigram_query import fold_text
+from utils.retriever.retriever_passage import tokenize
+
+SUGGEST_INDEX_FILE = "./IR/models/suggest_index.pkl"
+# Word pairs seen in fewer documents are not offered as completions
+MIN_PHRASE_COUNT = 2
+# Prefixes up to this length match most of the index, so their completions are precomputed
+CACHED_PREFIX_LENGTH = 2
+# Upper bound of k served from the precomputed completions
+CACHED_TOP_K = 20
+
+# Sorts after every character, so prefix + _MAX_CHAR bounds all keys starting with prefix
+_MAX_CHAR = "\U0010ffff"
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def document_versions(documents):
+    """'_id' -> 'content_hash' of 'metadados' documents; the hash changes when 'Titulo' or 'Sumario' is edited."""
+    return {str(doc["_id"]): doc.get("content_hash") for doc in documents}
+
+
+def _is_suggestable(token):
+    return len(token) > 2 and not token.isdigit() and token not in STOP_WORDS
+
+
+class SuggestIndex:
+    """
+    Query completions from a 'metadados' snapshot: words of 'Sumario' and 'Titulo' weighted by
+    the number of documents containing them, frequent word pairs, and whole titles.
+
+    Entries are kept in one array sorted by their folded form (lowercase, no accents), so the
+    completions of a prefix are the contiguous range found by binary search; the k heaviest of
+    the range are picked with a partial sort. Prefixes of one or two characters span a large
+    part of the array, and their completions are precomputed.
+
+    USAGE:
+    index = get_suggest_index()
+    index.suggest("regime jurí", k=8)
+    """
+
+    def __init__(self, index_file=SUGGEST_INDEX_FILE):
+        self.index_file = index_file
+        self.keys = []
+        self.phrases = []
+        self.weights = np.array([], dtype=np.int32)
+        self.cached = {}
+        # '_id' -> 'content_hash' of the documents the index was built from
+        self.document_versions = {}
+
+    def build(self, documents):
+        """Builds the index from documents with '_id', 'Titulo' and 'Sumario'."""
+        start = time.perf_counter()
+        # Counted by surface form first, so each distinct form is folded once
+        counts, phrase_counts = Counter(), Counter()
+        for doc in documents:
+            title = " ".join((doc.get("Titulo") or "").split())
+            tokens = tokenize(f"{doc.get('Sumario') or ''}\n{title}")
+            counts.update({token for token in tokens if _is_suggestable(token)})
+            phrase_counts.update({f"{a} {b}" for a, b in zip(tokens, tokens[1:]) if _is_suggestable(a) and _is_suggestable(b)})
+            if title:
+                counts[title] += 1
+        counts.update({phrase: count for phrase, count in phrase_counts.items() if count >= MIN_PHRASE_COUNT})
+
+        weights, surface_forms = Counter(), {}
+        for phrase, count in counts.items():
+            key = fold_text(phrase)
+            weights[key] += count
+            if key not in surface_forms or count > counts[surface_forms[key]]:
+                surface_forms[key] = phrase
+
+        self.keys = sorted(weights)
+        self.phrases = [surface_forms[key] for key in self.keys]
+        self.weights = np.array([weights[key] for key in self.keys], dtype=np.int32)
+        self.document_versions = document_versions(documents)
+        self._cache_short_prefixes()
+        print(f"[SuggestIndex] Indexed {len(self.keys)} completions from {len(self.document_versions)} documents "
+              f"in {time.perf_counter() - start:.1f}s.")
+
+    def _cache_short_prefixes(self):
+        self.cached = {}
+        for length in range(1, CACHED_PREFIX_LENGTH + 1):
+            lo = 0
+            while lo < len(self.keys):
+                prefix = self.keys[lo][:length]
+                hi = bisect_left(self.keys, prefix + _MAX_CHAR, lo)
+                if len(prefix) == length:
+                    self.cached[prefix] = self._top_rows(lo, hi, CACHED_TOP_K)
+                lo = hi
+
+    def _top_rows(self, lo, hi, k):
+        """Rows of the k heaviest entries in [lo, hi), heaviest first; ties keep alphabetical order."""
+        weights = self.weights[lo:hi]
+        top = np.argpartition(-weights, k - 1)[:k] if hi - lo > k else np.arange(hi - lo)
+        top = top[np.lexsort((top, -weights[top]))]
+        return lo + top
+
+    def complete(self, prefix, k=8):
+        """The k heaviest entries whose folded form starts with the folded `prefix`."""
+        prefix = fold_text(prefix)
+        if not prefix or k <= 0:
+            return []
+        if len(prefix) <= CACHED_PREFIX_LENGTH and k <= CACHED_TOP_K:
+            rows = self.cached.get(prefix, [])[:k]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            rows = self._top_rows(lo, bisect_left(self.keys, prefix + _MAX_CHAR, lo), k)
+        return [self.phrases[row] for row in rows]
+
+    def suggest(self, text, k=8):
+        """
+        Completions of the query typed so far: entries starting with the whole text, then, for
+        multi-word text, the typed words followed by completions of the last one.
+        """
+        words = (text or "").split()
+        if not words:
+            return []
+        typed = " ".join(words) + (" " if text[-1].isspace() else "")
+        suggestions = self.complete(typed, k)
+        if len(words) > 1 and not text[-1].isspace() and len(suggestions) < k:
+            head = " ".join(words[:-1])
+            for word in self.complete(words[-1], k):
+                candidate = f"{head} {word}"
+                if candidate not in suggestions:
+                    suggestions.append(candidate)
+        return suggestions[:k]
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            joblib.dump((self.keys, self.phrases, self.weights, self.cached, self.document_versions), self.index_file)
+            print(f"[SuggestIndex] Index saved to {self.index_file}.")
+        except Exception as e:
+            print(f"[SuggestIndex] Error saving index: {e}")
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            self.keys, self.phrases, self.weights, self.cached, self.document_versions = joblib.load(self.index_file)
+            return True
+        except Exception as e:
+            print(f"[SuggestIndex] Error loading index: {e}")
+            return False
+
+
+def get_suggest_index(index_file=SUGGEST_INDEX_FILE):
+    """Loads the saved index once per process; None until an IRSystem has built it."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SuggestIndex(index_file)
+                if index.load():
+                    _index = index
+    return _index
+
+
+def refresh_suggest_index(documents, index_file=SUGGEST_INDEX_FILE):
+    """
+    Rebuilds and saves the index when documents were added, removed or changed ('content_hash')
+    since it was built.
+    """
+    global _index
+    versions = document_versions(documents)
+    index = get_suggest_index(index_file)
+    if index is not None and index.document_versions == versions:
+        return index
+    with _index_lock:
+        if _index is None or _index.document_versions != versions:
+            index = SuggestIndex(index_file)
+            index.build(documents)
+            index.save()
+            _index = index
+    return _index